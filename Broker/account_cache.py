@@ -0,0 +1,59 @@
+import threading
+from time import monotonic
+
+
+class AccountCache:
+    """
+    Account state with the profile fetched once per session and margins refreshed on a TTL.
+    Margins are also refreshed on the next read after invalidate() (order fill or cancel).
+    A failed fetch is not tried again for error_ttl seconds, reads raise its error meanwhile.
+    """
+    def __init__(self, fetch_balance, fetch_profile, ttl, error_ttl):
+        self.fetch_balance = fetch_balance
+        self.fetch_profile = fetch_profile
+        self.ttl = ttl  # Seconds for which margins are served from the cache
+        self.error_ttl = error_ttl  # Seconds before a failed fetch is tried again
+        self.profile = None
+        self.margins = None
+        self.fetched_at = None
+        self.failed_at = None   # Time of the last failed fetch, None once a fetch succeeds
+        self.error = None   # Exception of the last failed fetch
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Forces a margin refresh on the next read
+        """
+        with self.lock:
+            self.fetched_at = None
+
+    def fetch(self, fetch):
+        """
+        Calls fetch unless the last fetch failed less than error_ttl seconds ago, in which case its error is raised again
+        """
+        if self.failed_at != None and monotonic() - self.failed_at < self.error_ttl:
+            raise self.error
+        try:
+            result = fetch()
+        except Exception as e:
+            self.failed_at = monotonic()
+            self.error = e
+            raise
+        self.failed_at = None
+        return result
+
+    def get_account_id(self):
+        with self.lock:
+            if self.profile == None:
+                self.profile = self.fetch(self.fetch_profile)
+            return self.profile['accountId']
+
+    def get_margins(self):
+        """
+        Returns the first margin entry of the account, fetched again if it is older than the TTL
+        """
+        with self.lock:
+            if self.fetched_at == None or monotonic() - self.fetched_at > self.ttl:
+                self.margins = self.fetch(self.fetch_balance)[0]
+                self.fetched_at = monotonic()
+            return self.margins
@@ -0,0 +1,134 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import settings
+from Broker.alice_blue import Broker
+
+
+class AccountManager:
+    """
+    Main broker and the accounts of BROKER_ACCOUNTS_FILE, each with its own session, books and positions,
+    all sharing the websocket feed, ticks and master contracts of the main broker.
+    A marketwatch row is traded on the accounts named in its Accounts cell, positions are shown merged per row.
+    """
+    def __init__(self, broker, credentials=None):
+        """
+        broker : main Broker, owner of the feed
+        credentials : [{"user_id", "api_key"}] of the other accounts, read from BROKER_ACCOUNTS_FILE if not given
+        """
+        self.broker = broker
+        self.logger = broker.logger
+        self.accounts = {}  # {user id: Broker} of the other accounts
+        for x in (credentials if credentials != None else self.load_credentials()):
+            if x['user_id'] in self.accounts:
+                continue
+            self.accounts[x['user_id']] = Broker(credentials=x, market_data=broker)
+            self.logger.info(f"Account {x['user_id']} trading on the shared feed")
+        self.row_accounts = {}  # {row id: [Broker]} accounts the row was executed on
+        self.executor = ThreadPoolExecutor(max_workers=settings.ACCOUNT_DISPATCH_WORKERS)
+        self.lock = threading.Lock()
+
+    def load_credentials(self):
+        try:
+            with open(settings.BROKER_ACCOUNTS_FILE) as file:
+                return json.load(file)
+        except Exception as e:
+            self.logger.error(f"Accounts file {settings.BROKER_ACCOUNTS_FILE} could not be read, trading the main account only, {e}")
+            return []
+
+    def get_all_accounts(self):
+        return [self.broker] + list(self.accounts.values())
+
+    def get_accounts(self, cell):
+        """
+        Returns the brokers of an Accounts cell : blank for the main account, ALL, or user ids separated by commas
+        """
+        if cell in [None, ""]:
+            return [self.broker]
+        names = [x.strip() for x in str(cell).split(",") if x.strip() != ""]
+        if [x.upper() for x in names] == ["ALL"]:
+            return self.get_all_accounts()
+        brokers = []
+        for name in names:
+            if name == self.broker.account_name:
+                broker = self.broker
+            else:
+                broker = self.accounts.get(name)
+            if broker == None:
+                self.logger.error(f"Account {name} not found in {settings.BROKER_ACCOUNTS_FILE}")
+            elif broker not in brokers:
+                brokers.append(broker)
+        return brokers
+
+    def order_management(self, accounts, row_id, action, **order):
+        """
+        Runs the user action of a row on every account in parallel and waits for all of them.
+        Modify, exit and cancel go to the accounts the row was executed on, whatever the Accounts cell says now.
+        """
+        with self.lock:
+            if action == "EXECUTE" or row_id not in self.row_accounts:
+                brokers = self.get_accounts(accounts)
+                self.row_accounts[row_id] = brokers
+            else:
+                brokers = self.row_accounts[row_id]
+        for broker in brokers:
+            broker.reserve_rows(row_id + 1)     # Positions of the row readable before the action runs
+        futures = [self.executor.submit(x.order_management, row_id=row_id, action=action, **order) for x in brokers]
+        for future, broker in zip(futures, brokers):
+            try:
+                future.result()
+            except Exception as e:
+                self.logger.error(f"{action} of row {row_id} failed on account {broker.account_name}, {e}")
+
+    def reserve_rows(self, rows):
+        for broker in self.get_all_accounts():
+            broker.reserve_rows(rows)
+
+    def get_positions(self):
+        """
+        Returns [Entry Action, Order ID, Last Action, Exit Action] of every row. Rows traded on several accounts
+        show "account:value" pairs for the Order ID and Last Action which differ between accounts.
+        """
+        positions = self.broker.get_positions()
+        with self.lock:
+            row_accounts = list(self.row_accounts.items())
+        for row_id, brokers in row_accounts:
+            if brokers == [self.broker] or row_id >= len(positions):
+                continue
+            row_positions = [(x.account_name, x.get_positions()[row_id]) for x in brokers]
+            if not row_positions:
+                continue
+            position = list(row_positions[0][1])
+            for i in [1, 2]:
+                values = [x[1][i] for x in row_positions]
+                if len(set(values)) > 1:
+                    position[i] = ", ".join(f"{name}:{x[i]}" for name, x in row_positions)
+                else:
+                    position[i] = values[0]
+            positions[row_id] = position
+        return positions
+
+    def get_exit_latencies(self):
+        """
+        Returns the slowest exit latency of the accounts of every row
+        """
+        latencies = self.broker.get_exit_latencies()
+        with self.lock:
+            row_accounts = list(self.row_accounts.items())
+        for row_id, brokers in row_accounts:
+            if brokers == [self.broker] or row_id >= len(latencies):
+                continue
+            values = [x.get_exit_latencies()[row_id] for x in brokers]
+            values = [x for x in values if x != None]
+            latencies[row_id] = max(values) if values else None
+        return latencies
+
+    def get_orderbook_rows(self):
+        """
+        Returns the order book rows of all the accounts with their status and account name
+        """
+        rows = []
+        for broker in self.get_all_accounts():
+            rows += [x[:8] + [broker.get_status(x[1]), broker.account_name] for x in broker.get_orderbook()]
+        return rows
@@ -2,11 +2,48 @@ import datetime
 from pya3 import *
 import json
 import logging
-from time import sleep
+from time import sleep, perf_counter
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import settings
+from Broker.instrument_index import InstrumentIndex
+from Broker.instrument_search import InstrumentSearch
+from Broker.contract_cache import MasterContractCache
+from Broker.tick_store import TickStore
+from Broker.tick_decoder import decode_message
+from Broker.trigger_book import TriggerBook
+from Broker.bracket_book import BracketBook
+from Broker.order_status_cache import OrderStatusCache
+from Broker.order_dispatcher import OrderDispatcher
+from Broker.account_cache import AccountCache
+from Broker.subscription_manager import SubscriptionManager
+from Broker.feed_pool import FeedPool
+from Broker.tick_recorder import TickRecorder
+from Broker.simulator import SimulatedExchange
+from Broker.latency_metrics import LatencyMetrics
+from Broker.bar_engine import BarEngine
+from Broker.indicator_engine import IndicatorEngine
+from Broker.option_chain import OptionChain
+from Broker.tick_store import LTP_COLUMN
+
+CONTRACT_TYPES = ["BSE", "NFO", "MCX", "NSE", "CDS", "BFO", "INDICES"]
+DERIVATIVE_CONTRACT_TYPES = ["NFO", "MCX", "BFO", "CDS"]
+CONTRACT_COLUMNS = ['Exch', 'Exchange Segment', "Symbol", "Token", "Instrument Name", "Trading Symbol", "Option Type", "Expiry Date", "Strike Price", "Lot Size"]
+CONTRACT_SUBCOLUMNS = ['Exch', 'Exchange Segment', "Symbol", "Token", "Instrument Name", "Trading Symbol", 'Lot Size']
+CONTRACT_DTYPES = {
+    'Exch': str,
+    'Exchange Segment': str,
+    'Symbol': str,
+    'Token': str,
+    'Instrument Name': str,
+    'Trading Symbol': str,
+    'Option Type': str,
+    'Expiry Date': str,
+    'Strike Price': 'float64',
+    'Lot Size': 'Int64'
+}
 
 class AboveBelowWaitingQueueElement:
     """
@@ -75,57 +112,146 @@ class OpenWaitingQueueElement:
         self.quantity = above_or_waiting_queue_element.quantity
 
 class Broker:
-    def __init__(self):
+    def __init__(self, conn=None, streaming=True, credentials=None, market_data=None):
+        """
+        conn : connection object to use instead of logging in (SimulatedExchange for offline runs)
+        streaming : starts the websocket and the order status thread, False for benchmarks feeding ticks by hand
+        credentials : {"user_id", "api_key"} of the account, read from BROKER_CREDENTIALS_FILE if not given
+        market_data : Broker whose websocket feed, ticks and master contracts are shared, None to load and stream its own
+        """
+        self.credentials = credentials
+        self.account_name = credentials['user_id'] if credentials != None else "MAIN"   # Name of the account in the Accounts column
+
         # Application logger
         self.logger = self.get_logger()
         
         # Broker objects
-        self.__conn = self.do_login()
-        self.instruments = self.load_master_contracts()
-
-        # Live streaming socket objects
-        self.socket_active = False  # Is socket active or not
-        self.subscribed_list = {}  # Dictionary of all the active tickers - {instrument_name: isactive}
-        self.real_time_values = {}  # Dictionary of live streaming values - {instrument_token: [open, high, low, close, ltp, volume, VWAP, best_buy, best_sell, oi]}
+        self.__conn = conn if conn != None else self.do_login(market_data)
+        self.account_cache = AccountCache(self.__conn.get_balance, self.__conn.get_profile, settings.MARGIN_REFRESH_TIME, settings.ACCOUNT_ERROR_RETRY_TIME)
+        self.market_data = market_data if market_data != None else self    # Broker owning the feed
+        self.accounts = [self]  # Brokers whose waiting orders are checked on every tick of the feed
+        if market_data != None:
+            self.share_market_data(market_data)
+        else:
+            self.load_market_data()
 
         # Order management
-        self.stoploss_target_waiting_queue = [] # [StoplossTargetWaitingQueueElement]
-        self.above_below_waiting_queue = []    # [AboveBelowWaitingQueueElement]
+        self.stoploss_target_bracket_book = BracketBook()   # StoplossTargetWaitingQueueElement per token, stoploss and target armed as OCO legs
+        self.above_below_trigger_book = TriggerBook()  # AboveBelowWaitingQueueElement per token, sorted by future price
         self.open_waiting_queue = []  # [OpenWaitingQueueElement]
-        self.all_positions = [[None, None, None, None] for i in range(settings.MAX_TOKENS_IN_MARKETWATCH)] # [Entry Action, Order Id, Last Action, Exit Action]
+        self.all_positions = [[None, None, None, None] for i in range(settings.MAX_TOKENS_IN_MARKETWATCH)] # [Entry Action, Order Id, Last Action, Exit Action], grown by reserve_rows
         self.order_book = []    # [Date, OrderId, transaction type, product type, instrument name, Quantity, price, order type, status]
+        self.order_status_cache = OrderStatusCache()   # Status of placed orders, refreshed in the background
+        self.exit_latencies = [None for i in range(settings.MAX_TOKENS_IN_MARKETWATCH)]  # Stoploss / target trigger to exit order latency (ms) per row
 
         # Thread
         self.thread_lock = threading.Lock()
+        self.order_dispatcher = OrderDispatcher(
+            send_order=self.send_order,
+            logger=self.logger,
+            workers=settings.ORDER_DISPATCH_WORKERS,
+            max_retries=settings.MAX_ORDER_PLACEMENT_RETRIES,
+            base_delay=settings.ORDER_RETRY_BASE_DELAY,
+            max_delay=settings.ORDER_RETRY_MAX_DELAY
+        )
+        self.order_dispatcher.start()
+
+        if market_data != None:
+            market_data.add_account(self)   # Books are ready, ticks of the shared feed can check them
+        if streaming:
+            self.start_streaming()
+
+    def load_market_data(self):
+        """
+        Loads the master contracts and creates the feed, tick and candle objects of this broker
+        """
+        self.instrument_index = None  # InstrumentIndex built once in load_master_contracts
+        self.instrument_search = None     # InstrumentSearch built once in load_master_contracts
+        self.instruments = self.load_master_contracts()
+        self.option_chain = OptionChain(self.instruments)   # Strikes of the underlying and expiry picked on the OptionChain sheet
 
-        # Start websocket in the background
-        self.__conn.start_websocket(
-            socket_open_callback=self.socket_open, 
-            socket_close_callback=self.socket_close,
-                      socket_error_callback=self.socket_error, 
-                      subscription_callback=self.feed_data, 
-                      run_in_background=True,
-                      market_depth=True)
+        # Live streaming socket objects
+        self.socket_active = False  # True while every feed connection is open
+        self.feed_pool = FeedPool(
+            connection=self.__conn,
+            create_connection=self.create_feed_connection,
+            max_tokens=settings.FEED_TOKENS_PER_CONNECTION,
+            max_connections=self.get_feed_max_connections(),
+            logger=self.logger
+        )
+        self.subscription_manager = SubscriptionManager(
+            subscribe=self.subscribe_tokens,
+            unsubscribe=self.unsubscribe_tokens,
+            debounce_time=settings.SUBSCRIPTION_DEBOUNCE_TIME,
+            is_pinned=self.has_pending_orders
+        )
+        self.tick_store = TickStore(settings.MAX_TOKENS_IN_MARKETWATCH)  # Live streaming values - one row per token [open, high, low, close, ltp, volume, VWAP, best_buy, best_sell, oi]
+        self.tick_recorder = None   # Records every tick to disk when RECORD_TICKS is set
+        if settings.RECORD_TICKS == 1:
+            self.tick_recorder = TickRecorder(settings.TICK_RECORDS_DIR, settings.TICK_RECORDER_FLUSH_TIME)
+            self.tick_recorder.start()
+        self.bar_engine = BarEngine(settings.BAR_TIMEFRAMES, settings.BAR_HISTORY_LENGTH, settings.MAX_TOKENS_IN_MARKETWATCH)  # 1m / 5m / 15m candles per token
+        self.indicator_engine = IndicatorEngine(self.bar_engine, settings.INDICATOR_TIMEFRAME, settings.INDICATOR_COLUMNS)
+        self.latency_metrics = LatencyMetrics(settings.LATENCY_METRICS_WINDOW, settings.LATENCY_METRICS_FILE, settings.LATENCY_METRICS_PUBLISH_TIME)
+        self.latency_metrics.start()
+
+    def share_market_data(self, market_data):
+        """
+        Uses the master contracts, indexes, feed, ticks, candles and latency metrics of another broker
+        """
+        self.instrument_index = market_data.instrument_index
+        self.instrument_search = market_data.instrument_search
+        self.instruments = market_data.instruments
+        self.option_chain = market_data.option_chain
+        self.feed_pool = market_data.feed_pool
+        self.subscription_manager = market_data.subscription_manager
+        self.tick_store = market_data.tick_store
+        self.tick_recorder = None
+        self.bar_engine = market_data.bar_engine
+        self.indicator_engine = market_data.indicator_engine
+        self.latency_metrics = market_data.latency_metrics
+
+    def add_account(self, broker):
+        """
+        Adds a broker sharing this feed, its waiting orders are checked on every tick
+        """
+        self.accounts = self.accounts + [broker]    # Replaced, not appended, feed_data may be iterating over it
 
-        while self.socket_active == False:  # Wait for the socket to start
-            self.logger.info("Waiting for socket streaming to start ...")
-            sleep(settings.SLEEP_TIME_BETWEEN_ATTEMPTS) 
+    def start_streaming(self):
+        """
+        Starts the websocket in the background (only for the broker owning the feed) and the order status thread
+        """
+        if self.market_data is self:
+            # Start websocket in the background, connections opened later by the feed pool use the same callbacks
+            self.feed_pool.start(
+                socket_open_callback=self.socket_open, 
+                socket_close_callback=self.socket_close,
+                socket_error_callback=self.socket_error, 
+                subscription_callback=self.feed_data, 
+                run_in_background=True,
+                market_depth=True)
+
+            while self.socket_active == False:  # Wait for the socket to start
+                self.logger.info("Waiting for socket streaming to start ...")
+                sleep(settings.SLEEP_TIME_BETWEEN_ATTEMPTS) 
 
         # ==============================================================================================
         # Threads for order management
-        self.above_below_thread = threading.Thread(target=self.manage_above_below)
-        self.stoploss_target_thread = threading.Thread(target=self.manage_stoploss_target)
-        self.above_below_thread.start()
-        self.stoploss_target_thread.start()
+        self.order_status_thread = threading.Thread(target=self.manage_order_status)
+        self.order_status_thread.start()
     
     def get_logger(self):
         """
-        Creates Alice Blue logger object
+        Creates Alice Blue logger object, one per account
         """
-        logger = logging.getLogger('Alice Blue Logger')
+        if self.credentials == None:
+            logger = logging.getLogger('Alice Blue Logger')
+            file_handler = logging.FileHandler(os.path.join(settings.BROKER_LOGS_FOLDER, "alice_blue.log"))
+        else:
+            logger = logging.getLogger(f'Alice Blue Logger {self.account_name}')
+            file_handler = logging.FileHandler(os.path.join(settings.BROKER_LOGS_FOLDER, f"alice_blue_{self.account_name}.log"))
         logger.setLevel(logging.DEBUG)
         stream_handler = logging.StreamHandler()
-        file_handler = logging.FileHandler(os.path.join(settings.BROKER_LOGS_FOLDER, "alice_blue.log"))
         stream_handler.setLevel(logging.DEBUG)
         file_handler.setLevel(logging.DEBUG)
         stream_format = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
@@ -139,68 +265,129 @@ class Broker:
 
     def load_master_contracts(self):
         """
-        Downlaod and loads all the master contracts files
+        Loads all the master contracts from the local cache if it is fresh, downloads them otherwise
+        """
+        cache = MasterContractCache(settings.MASTER_CONTRACTS_DIR, f"instruments_{settings.BROKER_CONNECTION.lower()}")
+        instruments = None
+        if settings.MASTER_CONTRACTS_CACHE == 1 and settings.FORCE_MASTER_CONTRACTS_REFRESH == 0:
+            instruments = cache.load()
+            if instruments is not None:
+                self.logger.info(f"Master contracts loaded from cache ({len(instruments)} instruments)")
+
+        if instruments is None:
+            instruments = self.download_master_contracts()
+            if settings.MASTER_CONTRACTS_CACHE == 1:
+                try:
+                    cache.save(instruments)
+                    self.logger.info("Master contracts cache updated")
+                except Exception as e:
+                    self.logger.error(f"Master contracts cache could not be saved, {e}")
+
+        self.instrument_index = InstrumentIndex(instruments)
+        self.instrument_search = InstrumentSearch(instruments, settings.SYMBOL_MAX_TYPOS)
+        return instruments
+
+    def download_master_contracts(self):
+        """
+        Downloads all the master contracts files in parallel and merges them in a single concat
         """
         try:
-            contract_types = ["BSE", "NFO", "MCX", "NSE", "CDS", "BFO", "INDICES"]
-            columns = ['Exch', 'Exchange Segment', "Symbol", "Token", "Instrument Name", "Trading Symbol", "Option Type", "Expiry Date", "Strike Price", "Lot Size"]
-            subcolumns = ['Exch', 'Exchange Segment', "Symbol", "Token", "Instrument Name", "Trading Symbol", 'Lot Size']
-            instruments = pd.DataFrame(columns=columns)
-            
-            for contract in contract_types: 
-                self.__conn.get_contract_master(contract)   # Download contract file
-                if os.path.exists(os.path.join(settings.MASTER_CONTRACTS_DIR, f"{contract}.csv")):  # Remove file if exists
-                    os.remove(os.path.join(settings.MASTER_CONTRACTS_DIR, f"{contract}.csv"))
-                os.replace(os.path.join(settings.BASE_DIR, f"{contract}.csv"), os.path.join(settings.MASTER_CONTRACTS_DIR, f"{contract}.csv"))  # Move the file in the directory
-
-                with open(os.path.join(settings.MASTER_CONTRACTS_DIR, f"{contract}.csv")) as file:
-                    contract_data = pd.read_csv(file)
-                    if contract == "INDICES":
-                        contract_data = contract_data.rename({"exch": "Exch", "symbol": "Symbol", "token": "Token"}, axis=1)
-                        contract_data['Instrument Name'] = contract_data['Symbol']
-                        contract_data['Trading Symbol'] = contract_data['Symbol']
-                        contract_data['Exch'] = "INDICES"
-                    else:
-                        if contract in ['NFO', 'MCX', 'BFO', 'CDS']:
-                            contract_data = contract_data[columns]
-                        else:
-                            contract_data = contract_data[subcolumns]
-                    instruments = pd.concat([instruments, contract_data])  
+            start_time = perf_counter()
+            with ThreadPoolExecutor(max_workers=settings.MASTER_CONTRACTS_DOWNLOAD_WORKERS) as executor:
+                frames = list(executor.map(self.load_contract_segment, CONTRACT_TYPES))
+            instruments = pd.concat(frames, ignore_index=True).reindex(columns=CONTRACT_COLUMNS)
+            self.logger.info(f"Master contracts loaded : {len(instruments)} instruments in {perf_counter() - start_time:.2f}s")
         except Exception as e:
-            self.logger.error("MASTER CONTRACT LOADING FAILED")
+            self.logger.error(f"MASTER CONTRACT LOADING FAILED, {e}")
             exit(1)
         return instruments
 
+    def load_contract_segment(self, contract):
+        """
+        Downloads, moves and parses the master contract file of one segment
+        """
+        start_time = perf_counter()
+        self.__conn.get_contract_master(contract)   # Download contract file
+        download_time = perf_counter() - start_time
+
+        contract_file = os.path.join(settings.MASTER_CONTRACTS_DIR, f"{contract}.csv")
+        os.replace(os.path.join(settings.BASE_DIR, f"{contract}.csv"), contract_file)  # Move the file in the directory, replaces old file
+
+        if contract == "INDICES":
+            contract_data = pd.read_csv(contract_file, usecols=["exch", "symbol", "token"], dtype={"exch": str, "symbol": str, "token": str})
+            contract_data = contract_data.rename({"exch": "Exch", "symbol": "Symbol", "token": "Token"}, axis=1)
+            contract_data['Instrument Name'] = contract_data['Symbol']
+            contract_data['Trading Symbol'] = contract_data['Symbol']
+            contract_data['Exch'] = "INDICES"
+        else:
+            usecols = CONTRACT_COLUMNS if contract in DERIVATIVE_CONTRACT_TYPES else CONTRACT_SUBCOLUMNS
+            dtypes = {column: CONTRACT_DTYPES[column] for column in usecols}
+            contract_data = pd.read_csv(contract_file, usecols=usecols, dtype=dtypes)
+
+        self.logger.info(f"Master contract {contract} : {len(contract_data)} rows, download {download_time:.2f}s, parse {perf_counter() - start_time - download_time:.2f}s")
+        return contract_data
+
     def get_instrument_token(self, instrument_name):
         """
         Returns instrument token for the corresponding trading symbol
         """
-        try:
-            return int(self.instruments[self.instruments['Instrument Name'] == instrument_name].iloc[0]['Token'])
-        except:
+        token = self.instrument_index.get_token(instrument_name)
+        if token == None:
             self.logger.error(f"Instrument {instrument_name} cannot be found in the master contracts")
-            return None
+        return token
 
     def get_exch(self, instrument_name):
         """
         Returns Exchange for the corresponding trading symbol
         """
-        try:
-            return self.instruments[self.instruments['Instrument Name'] == instrument_name].iloc[0]['Exch']
-        except:
+        exch = self.instrument_index.get_exch(instrument_name)
+        if exch == None:
             self.logger.error(f"Instrument {instrument_name} cannot be found in the master contracts")
-            return None
+        return exch
 
-    def do_login(self):
+    def get_feed_max_connections(self):
         """
-        Performs broker authentication and returns the client object
+        Returns the number of websocket connections the feed pool may open.
+        pya3 start_websocket invalidates the socket session of the login before creating a new one, a second
+        websocket on the same session would drop the first : the live feed stays on one connection.
         """
-        try:
-            with open(settings.BROKER_CREDENTIALS_FILE) as file:
-                credentials = json.load(file)
-        except Exception as e:
-            self.logger.critical("Broker credentials file not found. Application exiting ..", exc_info=True)
-            exit(1)
+        if settings.BROKER_CONNECTION == "SIMULATOR":
+            return settings.FEED_MAX_CONNECTIONS
+        if settings.FEED_MAX_CONNECTIONS > 1:
+            self.logger.warning("FEED_MAX_CONNECTIONS ignored, the broker allows one websocket per login session")
+        return 1
+
+    def create_feed_connection(self):
+        """
+        Returns a new connection for one more websocket (simulator only, see get_feed_max_connections)
+        """
+        return self.__conn.create_feed()     # Same exchange, prices and orders as the first connection
+
+    def do_login(self, market_data=None):
+        """
+        Performs broker authentication and returns the client object.
+        Returns the offline simulated exchange when BROKER_CONNECTION is SIMULATOR, the one of market_data if given.
+        """
+        if settings.BROKER_CONNECTION == "SIMULATOR" and market_data != None:
+            self.logger.info("Using the simulated exchange of the main account")
+            return market_data.__conn
+        if settings.BROKER_CONNECTION == "SIMULATOR":
+            self.logger.info("Using the simulated exchange, no orders are sent to the broker")
+            return SimulatedExchange(
+                instruments_per_segment=settings.SIMULATOR_INSTRUMENTS_PER_SEGMENT,
+                tick_rate=settings.SIMULATOR_TICK_RATE,
+                fill_latency=settings.SIMULATOR_FILL_LATENCY
+            )
+
+        if self.credentials != None:
+            credentials = self.credentials
+        else:
+            try:
+                with open(settings.BROKER_CREDENTIALS_FILE) as file:
+                    credentials = json.load(file)
+            except Exception as e:
+                self.logger.critical("Broker credentials file not found. Application exiting ..", exc_info=True)
+                exit(1)
 
         LOGIN_RETRY_COUNT = 0
         while LOGIN_RETRY_COUNT < settings.MAX_BROKER_LOGIN_ATTEMPT_COUNT:
@@ -223,65 +410,88 @@ class Broker:
         """
         Returns True if instrument name is valid
         """
-        try:
-            _ = self.instruments[self.instruments['Instrument Name'] == instrument_name].iloc[0]
-            return True
-        except:
-            return False
+        return self.instrument_index.has_instrument(instrument_name)
 
     def check_if_trading_symbol_exists(self, trading_symbol):
         """
         Returns True if trading_symbol is valid
         """
-        try:
-            _ = self.instruments[self.instruments['Trading Symbol'] == trading_symbol].iloc[0]
-            return True
-        except:
-            return False
+        return self.instrument_index.has_trading_symbol(trading_symbol)
 
     def get_instrument_name(self, trading_symbol):
         """
         Returns instrument name for the corresponding trading symbol
         """
-        try:
-            return str(self.instruments[self.instruments['Trading Symbol'] == trading_symbol].iloc[0]['Instrument Name'])
-        except:
+        instrument_name = self.instrument_index.get_instrument_name(trading_symbol)
+        if instrument_name == None:
             self.logger.error(f"Instrument {trading_symbol} cannot be found in the master contracts")
-            return None
+        return instrument_name
 
     def get_trading_symbol(self, instrument_name):
         """
         Returns instrument name for the corresponding trading symbol
         """
-        try:
-            return str(self.instruments[self.instruments['Instrument Name'] == instrument_name].iloc[0]['Trading Symbol'])
-        except:
+        trading_symbol = self.instrument_index.get_trading_symbol(instrument_name)
+        if trading_symbol == None:
             self.logger.error(f"Instrument {instrument_name} cannot be found in the master contracts")
-            return None
+        return trading_symbol
+
+    def get_lot_size(self, trading_symbol):
+        """
+        Returns lot size for the corresponding trading symbol
+        """
+        lot_size = self.instrument_index.get_lot_size(trading_symbol)
+        if lot_size == None:
+            self.logger.error(f"Instrument {trading_symbol} cannot be found in the master contracts")
+        return lot_size
+
+    def search_instruments(self, exchange, prefix, expiry, page, page_size):
+        """
+        Returns (matches, page, rows) of the master contracts of the exchange whose trading symbol starts with prefix
+        and expiring on expiry (any if None). Only the rows (CONTRACT_COLUMNS) of the page are returned, page is clamped to the last one.
+        """
+        rows = self.instrument_search.filter(exchange, prefix, expiry)
+        pages = max(1, -(-len(rows) // page_size))
+        page = min(max(1, page), pages)
+        return len(rows), page, self.instrument_search.get_page(rows, page, page_size, CONTRACT_COLUMNS)
+
+    def get_symbol_suggestions(self, text):
+        """
+        Returns up to SYMBOL_SUGGESTIONS trading symbols close to a symbol which cannot be found in the master contracts
+        """
+        return self.instrument_search.suggest(text, settings.SYMBOL_SUGGESTIONS)
 
     def get_status(self, oid):
-        try:
-            status = self.__conn.get_order_history(oid)
-            if "Emsg" in status.keys():
-                return ""
-            else:
-                s = status['Status']
-                if s == "rejected":
-                    s = f"Rejected due to - {status['RejReason']}"
-            return s
-        except:
-            return ""
+        """
+        Returns status of the order from the order status cache (no broker call)
+        """
+        return self.order_status_cache.get(oid)
+
+    def manage_order_status(self):
+        """
+        Refreshes the status of all open orders with a single order book call every ORDER_STATUS_REFRESH_TIME
+        """
+        while True:
+            order_ids = [x[1] for x in self.get_orderbook()]
+            try:
+                finished = self.order_status_cache.refresh(order_ids, self.__conn.order_data)
+                for oid, status in finished:
+                    self.logger.info(f"Order {oid} {status}")
+                if finished:
+                    self.account_cache.invalidate()     # Fill or cancel changes the margins
+            except Exception as e:
+                self.logger.error(f"Exception caught in refreshing order status, {e}")
+            sleep(settings.ORDER_STATUS_REFRESH_TIME)
 
     def get_margin(self):
         try:
-            margins = self.__conn.get_balance()
-            profile = self.__conn.get_profile()
-            account_id = profile['accountId']
-            cash_margin = margins[0]['cashmarginavailable']
-            credits = margins[0]['credits']
-            exposure_margin = margins[0]['exposuremargin']
-            net = margins[0]['net']
-            gross_exposure_value = margins[0]['grossexposurevalue']
+            account_id = self.account_cache.get_account_id()
+            margins = self.account_cache.get_margins()
+            cash_margin = margins['cashmarginavailable']
+            credits = margins['credits']
+            exposure_margin = margins['exposuremargin']
+            net = margins['net']
+            gross_exposure_value = margins['grossexposurevalue']
         except Exception as e:
             self.logger.error('Exception caught in fetching margin')
             cash_margin = -1
@@ -294,198 +504,268 @@ class Broker:
             
     # =======================================================================================
     # Order Management
-    def manage_above_below(self):
+    def add_above_below(self, element:AboveBelowWaitingQueueElement):
         """
-        Manages all orders which are waiting to reach the stage mentioned in the above below future price
+        Adds an order to the above below trigger book. Fires it immediately if the LTP has already crossed the future price.
+        Returns False if the instrument cannot be found.
         """
-        while True:
+        ins_token = self.get_instrument_token(element.instrument_name)
+        if ins_token == None:
+            return False
+
+        token = str(ins_token)
+        self.above_below_trigger_book.add(token, element)
+        self.check_above_below(token, self.tick_store.get_ltp(token))
+        return True
+
+    def check_above_below(self, token, ltp, tick_time=None):
+        """
+        Sends every order of the token crossed by the ltp to the above below dispatcher.
+        tick_time : receipt time (perf_counter) of the tick, None when not called from feed_data
+        """
+        if ltp == None:
+            return
+        fired = self.above_below_trigger_book.check(token, ltp)
+        if not fired:
+            return
+        trigger_time = perf_counter()
+        self.latency_metrics.record_since("tick_to_trigger", tick_time, trigger_time)
+        for element in fired:
+            self.logger.info(f"Trade with Row ID {element.row_id} triggered at LTP {ltp}")
+            self.execute_above_below(element, tick_time, trigger_time)
+
+    def execute_above_below(self, element:AboveBelowWaitingQueueElement, tick_time=None, trigger_time=None):
+        """
+        Submits the entry order of a triggered above below order to the order dispatcher
+        """
+        if element.stoploss != None or element.target != None:
+            new_element = StoplossTargetWaitingQueueElement()
+        else:
+            new_element = OpenWaitingQueueElement()
+        new_element.transfer_from_above_below(element)
+        self.submit_entry_order(new_element, tick_time, trigger_time)
+
+    def submit_entry_order(self, element, tick_time=None, trigger_time=None):
+        """
+        Submits the entry order of a StoplossTargetWaitingQueueElement or OpenWaitingQueueElement.
+        Row is moved to its waiting queue once the order is placed.
+        """
+        self.thread_lock.acquire()
+        self.all_positions[element.row_id][1] = "WAITING"
+        self.all_positions[element.row_id][2] = "PLACING"
+        self.thread_lock.release()
+
+        future = self.place_order(
+            instrument_name=element.instrument_name,
+            transaction_type=element.transaction_type,
+            product_type=element.product_type,
+            limit_price=element.limit_price,
+            quantity=element.quantity,
+            tick_time=tick_time,
+            trigger_time=trigger_time
+        )
+        future.add_done_callback(lambda future: self.on_entry_order_done(element, future))
+        return future
+
+    def on_entry_order_done(self, element, future):
+        """
+        Called when an entry order is placed or dropped. Arms stoploss and target or moves the trade to the open queue.
+        """
+        if future.exception() != None:
             self.thread_lock.acquire()
-            waiting_queue = self.above_below_waiting_queue.copy()
+            self.all_positions[element.row_id][1] = "FAILED"
+            self.all_positions[element.row_id][2] = "ERROR"
             self.thread_lock.release()
+            return
 
-            for ind in range(len(waiting_queue)):
-                try:
-                    element = waiting_queue[ind] # AboveBelowWaitingQueueElement
-                    ins_token = self.get_instrument_token(element.instrument_name)
-                    if ins_token == None:
-                        self.all_positions[element.row_id][2] = "ERROR"
-                        del waiting_queue[ind]
-                        continue
-
-                    ltp = float(self.real_time_values[str(ins_token)][4])
-                    if element.below_or_above == "ABOVE" and ltp >= element.future_price or element.below_or_above == "BELOW" and ltp <= element.future_price:
-                        order_id = self.place_order(
-                            instrument_name=element.instrument_name,
-                            transaction_type=element.transaction_type,
-                            product_type=element.product_type,
-                            limit_price=element.limit_price,
-                            quantity=element.quantity
-                        )
-                        self.thread_lock.acquire()
-                        self.all_positions[element.row_id][1] = order_id
-                        self.thread_lock.release()
-                        
-                        if element.stoploss != None or element.target != None:
-                            new_element = StoplossTargetWaitingQueueElement()
-                            new_element.transfer_from_above_below(element)
-                        else:
-                            new_element = OpenWaitingQueueElement()
-                            new_element.transfer_from_above_below(element)
-
-                        self.thread_lock.acquire()
-                        if element.stoploss != None or element.target != None:
-                            self.logger.info(f"Trade with Row ID {element.row_id} moved to StoplossTarget Queue")
-                            self.stoploss_target_waiting_queue.append(new_element)
-                            self.all_positions[element.row_id][2] = "WAITING_SL_T"
-                        else:
-                            self.logger.info(f"Trade with Row Id {element.row_id} moved to Open Queue")
-                            self.open_waiting_queue.append(new_element)
-                            self.all_positions[element.row_id][2] = "OPEN" 
-
-                        del waiting_queue[ind]
-                        self.thread_lock.release()
-                except Exception as e:
-                    self.logger.error(f"Exception caught in processing trade with row id : {element.row_id}, {e}")
-            
+        self.thread_lock.acquire()
+        self.all_positions[element.row_id][1] = future.result()    # Assigning Order ID
+        self.thread_lock.release()
+
+        if isinstance(element, StoplossTargetWaitingQueueElement):
+            self.logger.info(f"Trade with Row ID {element.row_id} moved to StoplossTarget Queue")
+            self.add_stoploss_target(element)   # Arm stoploss and target
+        else:
             self.thread_lock.acquire()
-            self.above_below_waiting_queue = waiting_queue
+            self.logger.info(f"Trade with Row Id {element.row_id} moved to Open Queue")
+            self.open_waiting_queue.append(element)
+            self.all_positions[element.row_id][2] = "OPEN" 
             self.thread_lock.release()
 
-            sleep(settings.ABOVE_BELOW_SLEEP_TIME)
+    def on_order_id(self, row_id, future):
+        """
+        Writes the order id of a placed order into the row
+        """
+        self.thread_lock.acquire()
+        self.all_positions[row_id][1] = future.result() if future.exception() == None else "FAILED"
+        self.thread_lock.release()
 
-    def manage_stoploss_target(self):
+    @staticmethod
+    def parse_price(value):
         """
-        Manages all orders which are waiting to close on stoploss or target
+        Returns the price as float, None if the cell is empty or not a number
         """
-        while True:
-            self.thread_lock.acquire()
-            waiting_queue = self.stoploss_target_waiting_queue.copy()
-            self.thread_lock.release()
+        if value in [None, ""]:
+            return None
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
 
-            for ind in range(len(waiting_queue)):
-                try:
-                    element = waiting_queue[ind] # StoplossTargetWaitingQueueElement
-                    ins_token = self.get_instrument_token(element.instrument_name)
-                    if ins_token == None:
-                        self.all_positions[element.row_id][2] = "ERROR"
-                        del waiting_queue[ind]
-                        continue
-
-                    ltp = float(self.real_time_values[str(ins_token)][4])
-                    if element.transaction_type == "BUY" and element.stoploss != None and ltp <= element.stoploss or element.transaction_type == "BUY" and element.target != None and ltp >= element.target:
-                        self.place_order(
-                            instrument_name=element.instrument_name,
-                            transaction_type="BUY" if element.transaction_type == "SELL" else "SELL",
-                            product_type=element.product_type,
-                            limit_price=None,
-                            quantity=element.quantity
-                        )
-                        if element.stoploss != None and ltp <= element.stoploss:
-                            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Stoploss")
-                        else:
-                            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Target")
-
-                        self.thread_lock.acquire()
-                        self.all_positions[element.row_id][2] = "CLOSED"
-                        self.thread_lock.release()
-
-                        del waiting_queue[ind]
-                    
-                    elif element.transaction_type == "SELL" and element.stoploss != None and ltp >= element.stoploss or element.transaction_type == "SELL" and element.target != None and ltp <= element.target:
-                        self.place_order(
-                            instrument_name=element.instrument_name,
-                            transaction_type="BUY" if element.transaction_type == "SELL" else "SELL",
-                            product_type=element.product_type,
-                            limit_price=None,
-                            quantity=element.quantity
-                        )
-                        if element.stoploss != None and ltp >= element.stoploss:
-                            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Stoploss")
-                        else:
-                            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Target")
-
-                        self.thread_lock.acquire()
-                        self.all_positions[element.row_id][2] = "CLOSED"
-                        self.thread_lock.release()
-
-                        del waiting_queue[ind]
-                except Exception as e:
-                    self.logger.error(f"Exception caught in processing trade with row ID {element.row_id}")
+    def add_stoploss_target(self, element:StoplossTargetWaitingQueueElement):
+        """
+        Arms the stoploss and target of an executed order in the bracket book, marks the row as WAITING_SL_T
+        """
+        element.stoploss = self.parse_price(element.stoploss)
+        element.target = self.parse_price(element.target)
+        ins_token = self.get_instrument_token(element.instrument_name)
 
+        self.thread_lock.acquire()
+        self.all_positions[element.row_id][2] = "WAITING_SL_T" if ins_token != None else "ERROR"
+        self.thread_lock.release()
+        if ins_token == None:
+            return False
+
+        token = str(ins_token)
+        self.stoploss_target_bracket_book.add(token, element)
+        self.check_stoploss_target(token, self.tick_store.get_ltp(token))
+        return True
+
+    def check_stoploss_target(self, token, ltp, tick_time=None):
+        """
+        Sends every bracket of the token crossed by the ltp to the stoploss target dispatcher.
+        tick_time : receipt time (perf_counter) of the tick, None when not called from feed_data
+        """
+        if ltp == None:
+            return
+        fired = self.stoploss_target_bracket_book.check(token, ltp)
+        if not fired:
+            return
+        trigger_time = perf_counter()
+        self.latency_metrics.record_since("tick_to_trigger", tick_time, trigger_time)
+        for element, reason in fired:
+            future = self.place_order(
+                instrument_name=element.instrument_name,
+                transaction_type="BUY" if element.transaction_type == "SELL" else "SELL",
+                product_type=element.product_type,
+                limit_price=None,
+                quantity=element.quantity,
+                tick_time=tick_time,
+                trigger_time=trigger_time
+            )
+            future.add_done_callback(lambda future, element=element, reason=reason: self.on_exit_order_done(element, reason, trigger_time, future))
+
+    def on_exit_order_done(self, element, reason, trigger_time, future):
+        """
+        Called when the exit order of a stoploss / target bracket is placed or dropped, records trigger to exit latency
+        """
+        if future.exception() != None:
+            self.logger.critical(f"Exit order of trade with Row ID {element.row_id} could not be placed")
             self.thread_lock.acquire()
-            self.stoploss_target_waiting_queue = waiting_queue
+            self.all_positions[element.row_id][2] = "EXIT_FAILED"
             self.thread_lock.release()
-            sleep(settings.STOPLOSS_TARGET_SLEEP_TIME)
+            return
 
-    def place_order(self, instrument_name, transaction_type, product_type, limit_price, quantity):
+        latency = round((perf_counter() - trigger_time) * 1000, 3)
+        if reason == "STOPLOSS":
+            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Stoploss ({latency} ms)")
+        else:
+            self.logger.info(f"Trade with Row ID {element.row_id} closed on reaching Target ({latency} ms)")
+
+        self.thread_lock.acquire()
+        self.all_positions[element.row_id][2] = "CLOSED"
+        self.exit_latencies[element.row_id] = latency
+        self.thread_lock.release()
+
+    def place_order(self, instrument_name, transaction_type, product_type, limit_price, quantity, tick_time=None, trigger_time=None):
+        """
+        Submits order with the given parameters to the order dispatcher. Returns a Future resolving to the order id.
+        tick_time, trigger_time : receipt time of the tick and detection time of the trigger for triggered orders
+        """
+        submit_time = perf_counter()
+        self.latency_metrics.record_since("trigger_to_submit", trigger_time, submit_time)
+        future = self.order_dispatcher.submit(
+            instrument_name=instrument_name,
+            transaction_type=transaction_type,
+            product_type=product_type,
+            limit_price=limit_price,
+            quantity=quantity
+        )
+        future.add_done_callback(lambda future: self.on_order_ack(future, tick_time, submit_time))
+        return future
+
+    def on_order_ack(self, future, tick_time, submit_time):
         """
-        Places order with the given parameters
+        Records submission to ack and tick to ack latencies of a placed order
+        """
+        if future.exception() != None:
+            return
+        ack_time = perf_counter()
+        self.latency_metrics.record_since("submit_to_ack", submit_time, ack_time)
+        self.latency_metrics.record_since("tick_to_ack", tick_time, ack_time)
+
+    def send_order(self, instrument_name, transaction_type, product_type, limit_price, quantity):
+        """
+        Places order with the given parameters, raises an exception if the broker does not accept it.
+        Called from the order dispatcher workers.
         """
         if limit_price in ["", None, 0]:
             limit_price = 0.0
 
-        ORDER_PLACEMENT_TRY_COUNTER = 0
-        while ORDER_PLACEMENT_TRY_COUNTER < settings.MAX_ORDER_PLACEMENT_RETRIES:
-            ORDER_PLACEMENT_TRY_COUNTER += 1
-            try:
-                order_type = OrderType.Market if limit_price == 0 else OrderType.Limit
-                instrument = self.__conn.get_instrument_by_token(self.get_exch(instrument_name), self.get_instrument_token(instrument_name))
-                trans_type = TransactionType.Buy if transaction_type == "BUY" else TransactionType.Sell
-                prod_matching = {
-                    "MIS": ProductType.Intraday,
-                    "CNC": ProductType.Delivery,
-                    "NRML": ProductType.Normal
-                    }
-                order_id = "PAPER TRADE"
-                if settings.PAPER_TRADE == 0:
-                    order_id = self.__conn.place_order(
-                        transaction_type = trans_type,
-                        instrument = instrument,
-                        quantity = int(quantity),
-                        order_type = order_type,
-                        product_type = prod_matching[product_type],
-                        price = limit_price
-                    )['NOrdNo']
-
-                ot = "LIMIT"
-                if limit_price in [0, "", None]:
-                    ot = "MARKET"
-                    limit_price = self.real_time_values[str(self.get_instrument_token(instrument_name))][4]
-                trading_symbol = self.get_trading_symbol(instrument_name)
-                self.logger.info(f"""
-                =======================================================
-                ORDER PLACED 
-                =======================================================
-                Order Id : {order_id}
-                Trading Symbol : {trading_symbol}
-                Transaction Type : {transaction_type}
-                Quantity : {quantity}
-                Price : {limit_price}
-                Product Type : {product_type}
-                Order Type : {order_type}
-                """)
-
-                # [Date, OrderId, transaction type, product type, instrument name, Quantity, price, status]
-                self.thread_lock.acquire()
-                self.order_book.append([
-                    datetime.now().strftime("%Y-%m-%d %H-%M-%S"),
-                    order_id,
-                    transaction_type,
-                    product_type,
-                    trading_symbol,
-                    quantity,
-                    limit_price,
-                    ot,
-                    ""
-                ])
-                self.thread_lock.release()
-                return order_id
-            except Exception as e:
-                self.logger.error("order placement failed. Retrying ...", e)
-                sleep(settings.ORDER_PLACING_REFRESH_TIME)
-
-        self.logger.critical("Max retires for order placement exceeded. Application exiting ...")
-        exit(1)
+        order_type = OrderType.Market if limit_price == 0 else OrderType.Limit
+        instrument = self.__conn.get_instrument_by_token(self.get_exch(instrument_name), self.get_instrument_token(instrument_name))
+        trans_type = TransactionType.Buy if transaction_type == "BUY" else TransactionType.Sell
+        prod_matching = {
+            "MIS": ProductType.Intraday,
+            "CNC": ProductType.Delivery,
+            "NRML": ProductType.Normal
+            }
+        order_id = "PAPER TRADE"
+        if settings.PAPER_TRADE == 0:
+            request_time = perf_counter()
+            order_id = self.__conn.place_order(
+                transaction_type = trans_type,
+                instrument = instrument,
+                quantity = int(quantity),
+                order_type = order_type,
+                product_type = prod_matching[product_type],
+                price = limit_price
+            )['NOrdNo']
+            self.latency_metrics.record("order_rest_call", perf_counter() - request_time)
+
+        ot = "LIMIT"
+        if limit_price in [0, "", None]:
+            ot = "MARKET"
+            limit_price = self.tick_store.get_ltp(str(self.get_instrument_token(instrument_name)))
+        trading_symbol = self.get_trading_symbol(instrument_name)
+        self.logger.info(f"""
+        =======================================================
+        ORDER PLACED 
+        =======================================================
+        Order Id : {order_id}
+        Trading Symbol : {trading_symbol}
+        Transaction Type : {transaction_type}
+        Quantity : {quantity}
+        Price : {limit_price}
+        Product Type : {product_type}
+        Order Type : {order_type}
+        """)
+
+        # [Date, OrderId, transaction type, product type, instrument name, Quantity, price, status]
+        self.thread_lock.acquire()
+        self.order_book.append([
+            datetime.now().strftime("%Y-%m-%d %H-%M-%S"),
+            order_id,
+            transaction_type,
+            product_type,
+            trading_symbol,
+            quantity,
+            limit_price,
+            ot,
+            ""
+        ])
+        self.thread_lock.release()
+        return order_id
 
     def modify_order(self, instrument_name, transaction_type, product_type, limit_price, quantity, order_id):
         """
@@ -522,7 +802,7 @@ class Broker:
             
             ot = "LIMIT"
             if limit_price in [0, "", None]:
-                limit_price = self.real_time_values[str(self.get_instrument_token(instrument_name))][4]
+                limit_price = self.tick_store.get_ltp(str(self.get_instrument_token(instrument_name)))
                 ot = "MARKET"
             trading_symbol = self.get_trading_symbol(instrument_name)
 
@@ -560,26 +840,90 @@ class Broker:
         
     def cancel_order(self, order_id):
         """
-        Cancel a placed order
+        Submits the cancellation of a placed order to the order dispatcher.
+        Returns a Future resolving to the order id if cancelled, to the broker message otherwise.
         """
-        try:
-            if settings.PAPER_TRADE == 0:
-                status = self.__conn.cancel_order(order_id)
-                if "Emsg" in status.keys():
-                    status = status['Emsg']
-                else:
-                    status = order_id
-                return status
-            else:
-                return "PAPER TRADE"
-        except Exception as e:
-            self.logger.error("Exception caught while canelling an order", e)
-            return -1
+        return self.order_dispatcher.submit(send=self.send_cancel, order_id=order_id)
+
+    def send_cancel(self, order_id):
+        """
+        Cancels a placed order, raises an exception if the request fails. Called from the order dispatcher workers.
+        """
+        if settings.PAPER_TRADE != 0:
+            return "PAPER TRADE"
+        status = self.__conn.cancel_order(order_id)
+        if "Emsg" in status.keys():
+            return status['Emsg']
+        self.account_cache.invalidate()
+        return order_id
+
+    def on_cancel_done(self, row_id, order_id, keep_order_id, future):
+        """
+        Called when the cancellation of the order of a row is answered or dropped.
+        keep_order_id : True to keep the order id in the row and mark it NOT CANCELLED if the broker refused,
+        False to show the answer in place of the order id
+        """
+        if future.exception() != None:
+            self.logger.error(f"Cancellation of order {order_id} of Row ID {row_id} failed, {future.exception()}")
+            status = -1
+        else:
+            status = future.result()
+        self.thread_lock.acquire()
+        if keep_order_id:
+            self.all_positions[row_id][2] = "CANCELLED" if status == order_id else "NOT CANCELLED"
+        else:
+            self.all_positions[row_id][1] = status
+            self.all_positions[row_id][2] = "CANCELLED"
+        self.thread_lock.release()
+
+    def send_order_history(self, order_id):
+        """
+        Returns the status of a placed order (open, complete ...), the broker message if it has none.
+        Called from the order dispatcher workers.
+        """
+        status = self.__conn.get_order_history(order_id)
+        return status['Emsg'] if "Emsg" in status.keys() else status['Status']
+
+    def on_exit_order_status(self, row_id, order_id, instrument_name, transaction_type, product_type, quantity, future):
+        """
+        Finishes the exit of an open order once its status is fetched : cancelled if still open, squared off if complete
+        """
+        if future.exception() != None:
+            self.logger.critical(f"Status of order {order_id} of Row ID {row_id} could not be fetched, trade not exited")
+            self.thread_lock.acquire()
+            self.all_positions[row_id][2] = "EXIT_FAILED"
+            self.thread_lock.release()
+            return
+
+        status = future.result()
+        if status == "open":
+            self.cancel_order(order_id)
+            status = order_id
+        elif status == "complete":
+            self.thread_lock.acquire()
+            self.all_positions[row_id][1] = "WAITING"
+            self.thread_lock.release()
+            future = self.place_order(
+                instrument_name=instrument_name,
+                transaction_type="SELL" if transaction_type == "BUY" else "BUY",
+                product_type=product_type,
+                limit_price=None,
+                quantity=quantity
+            )
+            future.add_done_callback(lambda future: self.on_order_id(row_id, future))   # Order ID is written once placed
+            status = None
+        self.thread_lock.acquire()
+        if status != None:
+            self.all_positions[row_id][1] = status
+        self.all_positions[row_id][2] = "EXITED"
+        self.thread_lock.release()
+        self.logger.info(f"Trade with Row ID {row_id} exited")
 
     def order_management(self, row_id, instrument_name, transaction_type, product_type, limit_price, quantity, stoploss, target, below_or_above, future_price, action):
         """
         Executes user action based on the parameters set by him. Executes orders, shifts order to various waiting queues, and manages results. 
         """
+        self.reserve_rows(row_id + 1)
         if limit_price in [None, ""]:
             limit_price = 0.0
 
@@ -591,17 +935,6 @@ class Broker:
 
         if action == "EXECUTE":
             if below_or_above in [None, ""]:    # Not an above or below order
-                order_id = self.place_order(
-                    instrument_name=instrument_name,
-                    transaction_type=transaction_type,
-                    product_type=product_type,
-                    limit_price=limit_price,
-                    quantity=quantity
-                )
-                self.thread_lock.acquire()
-                self.all_positions[row_id][1] = order_id    # Assigning Order ID
-                self.thread_lock.release()
-
                 if stoploss != None or target != None:  # If order is of type stoploss or target
                     new_element = StoplossTargetWaitingQueueElement(
                         row_id=row_id,
@@ -613,11 +946,6 @@ class Broker:
                         stoploss=stoploss,
                         target=target
                     )
-                    self.thread_lock.acquire()
-                    self.stoploss_target_waiting_queue.append(new_element)  # Add to stoploss target waiting queue
-                    self.all_positions[row_id][2] = "WAITING_SL_T"
-                    self.thread_lock.release()
-
                 else:
                     new_element = OpenWaitingQueueElement(
                         row_id=row_id,
@@ -627,12 +955,19 @@ class Broker:
                         limit_price=limit_price,
                         quantity=quantity,
                     )
+                self.submit_entry_order(new_element)    # Moved to its waiting queue once placed
+
+            elif below_or_above != None:
+                try:
+                    future_price = float(future_price)
+                except (TypeError, ValueError):
+                    future_price = None
+                if below_or_above not in ["ABOVE", "BELOW"] or future_price == None:
                     self.thread_lock.acquire()
-                    self.open_waiting_queue.append(new_element)
-                    self.all_positions[row_id][2] = "OPEN"
+                    self.all_positions[row_id][2] = "INVALID"
                     self.thread_lock.release()
+                    return
 
-            elif below_or_above != None:
                 new_element = AboveBelowWaitingQueueElement(
                     row_id=row_id,
                     instrument_name=instrument_name,
@@ -646,41 +981,43 @@ class Broker:
                     future_price=future_price
                 )
                 self.thread_lock.acquire()
-                self.above_below_waiting_queue.append(new_element)
                 self.all_positions[row_id][2] = "WAITING_AB"
                 self.thread_lock.release()
+                if not self.add_above_below(new_element):
+                    self.thread_lock.acquire()
+                    self.all_positions[row_id][2] = "ERROR"
+                    self.thread_lock.release()
 
         elif action == "CANCEL":
+            cancel = False
             self.thread_lock.acquire()
             current_status = self.all_positions[row_id][2]
+            ord_id = self.all_positions[row_id][1]
             if current_status in ["WAITING_AB", "MODIFIED_WAITING_AB"]:
-                self.above_below_waiting_queue = [x for x in self.above_below_waiting_queue if x.row_id != row_id]
+                self.above_below_trigger_book.remove(row_id)
                 self.all_positions[row_id][2] = "CANCELLED"
 
             elif current_status in ["WAITING_SL_T", "MODIFIED_WAITING_SL_T"]:
-                self.stoploss_target_waiting_queue = [x for x in self.stoploss_target_waiting_queue if x.row_id != row_id]
-                status = self.cancel_order(self.all_positions[row_id][1])
-                self.all_positions[row_id][1] = status
-                self.all_positions[row_id][2] = "CANCELLED"
+                self.stoploss_target_bracket_book.remove(row_id)
+                self.all_positions[row_id][2] = "CANCELLING"
+                cancel = True
 
             elif current_status in ["OPEN", "MODIFIED_OPEN"]:
-                ord_id = self.all_positions[row_id][1]
-                status = self.cancel_order(ord_id)
-                if status != ord_id:
-                    self.all_positions[row_id][1] = ord_id
-                    self.all_positions[row_id][2] = "NOT CANCELLED"
-                else:
-                    self.all_positions[row_id][1] = ord_id
-                    self.all_positions[row_id][2] = "CANCELLED"
+                self.all_positions[row_id][2] = "CANCELLING"
                 self.open_waiting_queue = [x for x in self.open_waiting_queue if x.row_id != row_id]
+                cancel = True
 
             elif current_status == "CLOSED":
                 # Do Nothing
                 pass
-        
-            self.logger.info(f"Trade with Row ID {row_id} Cancelled")
             self.thread_lock.release()
 
+            if cancel:  # Cancelled by a dispatcher worker, the row is updated from the callback
+                keep_order_id = current_status in ["OPEN", "MODIFIED_OPEN"]
+                future = self.cancel_order(ord_id)
+                future.add_done_callback(lambda future: self.on_cancel_done(row_id, ord_id, keep_order_id, future))
+            self.logger.info(f"Trade with Row ID {row_id} Cancelled")
+
         elif action == "MODIFY":
             self.thread_lock.acquire()
             current_status = self.all_positions[row_id][2]
@@ -688,31 +1025,39 @@ class Broker:
             status = "MODIFIED"
 
             if current_status in ["WAITING_AB", "MODIFIED_WAITING_AB"]:
-                self.thread_lock.acquire()
-                for i in range(len(self.above_below_waiting_queue)):
-                    if self.above_below_waiting_queue[i].row_id == row_id:   
-                        self.above_below_waiting_queue[i].instrument_name = instrument_name
-                        self.above_below_waiting_queue[i].transaction_type = transaction_type
-                        self.above_below_waiting_queue[i].product_type = product_type
-                        self.above_below_waiting_queue[i].limit_price = limit_price
-                        self.above_below_waiting_queue[i].quantity = quantity
-                        self.above_below_waiting_queue[i].stoploss = stoploss
-                        self.above_below_waiting_queue[i].target = target
-                        self.above_below_waiting_queue[i].below_or_above = below_or_above
-                        self.above_below_waiting_queue[i].future_price = future_price
-                        break
-                status = "MODIFIED_WAITING_AB"
-                self.thread_lock.release()
+                element = self.above_below_trigger_book.remove(row_id)
+                if element == None:     # Already triggered, dispatcher owns the status now
+                    status = None
+                else:
+                    element.instrument_name = instrument_name
+                    element.transaction_type = transaction_type
+                    element.product_type = product_type
+                    element.limit_price = limit_price
+                    element.quantity = quantity
+                    element.stoploss = stoploss
+                    element.target = target
+                    element.below_or_above = below_or_above
+                    status = "MODIFIED_WAITING_AB"
+                    try:
+                        element.future_price = float(future_price)
+                    except (TypeError, ValueError):
+                        status = "INVALID"
+                    if below_or_above not in ["ABOVE", "BELOW"]:
+                        status = "INVALID"
+                    if status != "INVALID" and not self.add_above_below(element):
+                        status = "ERROR"
 
             elif current_status in ["WAITING_SL_T", "MODIFIED_WAITING_SL_T"]:
-                self.thread_lock.acquire()
-                for i in range(len(self.stoploss_target_waiting_queue)):
-                    if self.stoploss_target_waiting_queue[i].row_id == row_id:
-                        self.stoploss_target_waiting_queue[i].stoploss = stoploss
-                        self.stoploss_target_waiting_queue[i].target = target
-                        break
-                status = "MODIFIED_WAITING_SL_T"
-                self.thread_lock.release()
+                element = self.stoploss_target_bracket_book.remove(row_id)
+                if element == None:     # Already triggered, dispatcher owns the status now
+                    status = None
+                else:
+                    element.stoploss = stoploss
+                    element.target = target
+                    if self.add_stoploss_target(element):
+                        status = "MODIFIED_WAITING_SL_T"
+                    else:
+                        status = "ERROR"
 
             elif current_status in ["OPEN", "MODIFIED_OPEN"]:
                 self.thread_lock.acquire()
@@ -736,9 +1081,10 @@ class Broker:
                 status = "CLOSED"
                 pass
 
-            self.thread_lock.acquire()
-            self.all_positions[row_id][2] = status
-            self.thread_lock.release()
+            if status != None:
+                self.thread_lock.acquire()
+                self.all_positions[row_id][2] = status
+                self.thread_lock.release()
             self.logger.info(f"Trade with Row ID {row_id} modified")
 
         elif action == "EXIT":
@@ -747,49 +1093,29 @@ class Broker:
             self.thread_lock.release()
 
             if current_status in ["WAITING_AB", "MODIFIED_WAITING_AB"]:
-                self.thread_lock.acquire()
-                self.above_below_waiting_queue = [x for x in self.above_below_waiting_queue if x.row_id != row_id]
-                self.thread_lock.release()
+                self.above_below_trigger_book.remove(row_id)
 
             elif current_status in ["WAITING_SL_T", "MODIFIED_WAITING_SL_T"]:
-                self.thread_lock.acquire()
-                for i in range(len(self.stoploss_target_waiting_queue)):
-                    print(self.stoploss_target_waiting_queue[i])
-                    if self.stoploss_target_waiting_queue[i].row_id == row_id:
-                        self.thread_lock.release()
-                        self.place_order(
-                            instrument_name=self.stoploss_target_waiting_queue[i].instrument_name,
-                            transaction_type="BUY" if self.stoploss_target_waiting_queue[i].transaction_type == "SELL" else "SELL",
-                            product_type=self.stoploss_target_waiting_queue[i].product_type,
-                            limit_price=None,
-                            quantity=self.stoploss_target_waiting_queue[i].quantity
-                        )
-                        break
-                self.above_below_waiting_queue = [x for x in self.stoploss_target_waiting_queue if x.row_id != row_id]
-
-            elif current_status in ["OPEN", "MODIFIED_OPEN"]:
-                ord_id = self.all_positions[row_id][1]
-                status = self.__conn.get_order_history(ord_id)
-                if "Emsg" in status.keys():
-                    pass
-                else:
-                    status = status['Status']
-
-                if status == "open":
-                    self.cancel_order(ord_id)
-                    status = ord_id
-                elif status == "complete":
-                    status = self.place_order(
-                        instrument_name=instrument_name,
-                        transaction_type="SELL" if transaction_type == "BUY" else "BUY",
-                        product_type=product_type,
+                element = self.stoploss_target_bracket_book.remove(row_id)
+                if element != None:     # None if stoploss or target already closed the trade
+                    self.place_order(
+                        instrument_name=element.instrument_name,
+                        transaction_type="BUY" if element.transaction_type == "SELL" else "SELL",
+                        product_type=element.product_type,
                         limit_price=None,
-                        quantity=quantity
+                        quantity=element.quantity
                     )
+
+            elif current_status in ["OPEN", "MODIFIED_OPEN"]:
                 self.thread_lock.acquire()
-                self.all_positions[row_id][1] = status
+                ord_id = self.all_positions[row_id][1]
+                self.all_positions[row_id][2] = "EXITING"
                 self.open_waiting_queue = [x for x in self.open_waiting_queue if x.row_id != row_id]
                 self.thread_lock.release()
+                # Status fetched by a dispatcher worker, the exit is finished from the callback
+                future = self.order_dispatcher.submit(send=self.send_order_history, order_id=ord_id)
+                future.add_done_callback(lambda future: self.on_exit_order_status(row_id, ord_id, instrument_name, transaction_type, product_type, quantity, future))
+                return
 
             elif current_status == "CLOSED":
                 # Do Nothing
@@ -801,12 +1127,35 @@ class Broker:
             
             self.logger.info(f"Trade with Row ID {row_id} exited")
 
+    def reserve_rows(self, rows):
+        """
+        Grows the position state to hold at least the given number of marketwatch rows
+        """
+        if len(self.all_positions) >= rows:
+            return
+        self.thread_lock.acquire()
+        self.all_positions.extend([[None, None, None, None] for i in range(rows - len(self.all_positions))])
+        self.exit_latencies.extend([None for i in range(rows - len(self.exit_latencies))])
+        self.thread_lock.release()
+
     def get_positions(self):
         self.thread_lock.acquire()
         positions = self.all_positions.copy()
         self.thread_lock.release()
         return positions
     
+    def get_latency_summary(self):
+        """
+        Returns [[stage, count, p50, p95, p99, max]] of the latency metrics in milliseconds
+        """
+        return self.latency_metrics.get_summary()
+
+    def get_exit_latencies(self):
+        self.thread_lock.acquire()
+        latencies = self.exit_latencies.copy()
+        self.thread_lock.release()
+        return latencies
+
     def get_orderbook(self):
         self.thread_lock.acquire()
         orderbook = self.order_book.copy()
@@ -814,19 +1163,19 @@ class Broker:
         return orderbook
     # =======================================================================================
     # Live Ticker
-    def socket_open(self):
+    def socket_open(self, index=0):
         """
-        Called as soon as the socket is opened
+        Called as soon as a feed connection is opened (again after a reconnect)
         """
-        self.logger.info("Live streaming ticker connected.")
-        self.socket_active = True
+        self.logger.info(f"Live streaming ticker connected (connection {index + 1}).")
+        self.socket_active = self.feed_pool.is_active()
 
-    def socket_close(self):
+    def socket_close(self, index=0):
         """
-        Called as soon as the socket is closed
+        Called as soon as a feed connection is closed, its instruments are subscribed again when it reopens
         """
-        self.logger.info("Live streaming ticker closed.")
-        self.socket_active = False
+        self.logger.warning(f"Live streaming ticker closed (connection {index + 1}).")
+        self.socket_active = self.feed_pool.is_active()
 
     def socket_error(self, err):
         """
@@ -838,26 +1187,27 @@ class Broker:
         """
         Called whenever server sends any new message in the stream
         """
-        message = json.loads(msg)
-        if message["t"] == "ck":
+        tick_time = perf_counter()
+        message = decode_message(msg)
+        message_type = message["t"]
+        if message_type == "df" or message_type == "dk":  # Ticks first, they are almost every message
+            token = message["tk"]
+            self.tick_store.update(token, message)
+            self.latency_metrics.mark_tick(tick_time)
+            if self.tick_recorder != None:
+                self.tick_recorder.record(token, message_type, message)
+            if "lp" in message:
+                ltp = self.tick_store.get_ltp(token)
+                self.bar_engine.update(token, ltp, message.get("v"), message.get("ft"))
+                for account in self.accounts:   # Every account trading on this feed
+                    if account.above_below_trigger_book.is_watching(token):
+                        account.check_above_below(token, ltp, tick_time)
+                    if account.stoploss_target_bracket_book.is_watching(token):
+                        account.check_stoploss_target(token, ltp, tick_time)
+        elif message_type == "ck":
             self.logger.info(f"Connection Acknowledgement status : {message['s']} (Websocket Connected)")
-        elif message["t"] == "tk":
+        elif message_type == "tk":
             self.logger.info(f"Token Acknowledgement status : {message}")
-        elif message["t"] in ["dk", "df"]:
-            token = message["tk"]
-            last_val = self.real_time_values[token] if token in self.real_time_values.keys() else [0,0,0,0,0,0,0,0,0,0]
-            open_val = message['o'] if 'o' in message.keys() else last_val[0]
-            high_val = message['h'] if 'h' in message.keys() else last_val[1]
-            low_val = message['l'] if 'l' in message.keys() else last_val[2]
-            close_val = message['c'] if 'c' in message.keys() else last_val[3]
-            ltp = message['lp'] if 'lp' in message.keys() else last_val[4]
-            volume = message['v'] if 'v' in message.keys() else last_val[5]
-            vwap = message['ap'] if 'ap' in message.keys() else last_val[6]
-            best_buy = message['bp1'] if 'bp1' in message.keys() else last_val[7]
-            best_sell = message['sp1'] if 'sp1' in message.keys() else last_val[8]
-            oi = message['oi'] if 'oi' in message.keys() else last_val[9]
-
-            self.real_time_values[token] = [open_val, high_val, low_val, close_val, ltp, volume, vwap, best_buy, best_sell, oi]
 
     def subscribe_tokens(self, instrument_names:list):
         """
@@ -865,31 +1215,143 @@ class Broker:
         """
         subscribe_list = []
         for name in instrument_names:
-            print(f"SUBSCRIBED : {self.get_trading_symbol(name)}")
-            subscribe_list.append(self.__conn.get_instrument_by_token(self.get_exch(name), self.get_instrument_token(name)))
-        self.__conn.subscribe(subscribe_list)
+            token = self.get_instrument_token(name)
+            self.tick_store.get_slot(str(token))   # Reserve row in the tick table
+            subscribe_list.append(self.__conn.get_instrument_by_token(self.get_exch(name), token))
+        self.feed_pool.subscribe(subscribe_list)    # Spread over the websocket connections
     
     def unsubscribe_tokens(self, instrument_names:list):
         """
-        Unsubscribes list of given instrument names
+        Unsubscribes list of given instrument names, their rows of the tick table are released
         """
         unsubscribe_list = []
+        tokens = []
         for name in instrument_names:
-            unsubscribe_list.append(self.__conn.get_instrument_by_token(self.get_exch(name), self.get_instrument_token(name)))
-        self.__conn.unsubscribe(unsubscribe_list)
+            token = self.get_instrument_token(name)
+            unsubscribe_list.append(self.__conn.get_instrument_by_token(self.get_exch(name), token))
+            if token != None:
+                tokens.append(str(token))
+        self.feed_pool.unsubscribe(unsubscribe_list)
+        self.tick_store.release(tokens)
     
-    def get_ticker_values(self, instrument_names):
+    def has_pending_orders(self, instrument_name):
         """
-        Return live ticker values of the given instrument names
+        Returns True if above below or stoploss target orders of any account are waiting on the instrument's ticks
         """
-        ticker_values = []
+        token = str(self.get_instrument_token(instrument_name))
+        for account in self.market_data.accounts:
+            if account.above_below_trigger_book.is_watching(token) or account.stoploss_target_bracket_book.is_watching(token):
+                return True
+        return False
+
+    def update_subscriptions(self, instrument_names):
+        """
+        Subscribes and unsubscribes only the instruments added to or removed from the marketwatch
+        """
+        try:
+            delta = self.subscription_manager.update(list(instrument_names) + self.get_option_chain_instruments())
+        except Exception as e:
+            self.logger.error(f"Subscription update failed, {e}")
+            return
+        if delta != None:
+            stats = self.get_subscription_stats()
+            self.logger.info(f"Subscriptions : +{len(delta[0])} -{len(delta[1])}, active {stats['active']}, churn {stats['churn']}, per connection {stats['connections']}")
+
+    # =======================================================================================
+    # Option Chain
+    def select_option_chain(self, exchange, underlying, expiry):
+        """
+        Sets the underlying (Symbol of the master contracts) and expiry date of the option chain.
+        Returns False if no option of the underlying expires on that date.
+        """
+        changed = (exchange, underlying, expiry) != self.option_chain.selection
+        found = self.option_chain.select(exchange, underlying, expiry)
+        if changed:
+            if found:
+                self.logger.info(f"Option chain {underlying} {expiry} : {len(self.option_chain.strikes)} strikes, priced on {self.option_chain.future_name}")
+            else:
+                self.logger.error(f"Option chain {exchange} {underlying} {expiry} cannot be found in the master contracts")
+        return found
+
+    def clear_option_chain(self):
+        """
+        Drops the option chain selection, its options are unsubscribed by the next subscription update
+        """
+        if self.option_chain.selection == None:
+            return
+        self.logger.info(f"Option chain {self.option_chain.selection[1]} {self.option_chain.selection[2]} cleared")
+        self.option_chain.clear()
+
+    def get_option_chain_window(self):
+        """
+        Returns (indices of the strikes shown, underlying LTP), strikes are centered on the ATM strike
+        """
+        underlying_price = None
+        if self.option_chain.future_name != None:
+            underlying_price = self.tick_store.get_ltp(str(self.get_instrument_token(self.option_chain.future_name)))
+        return self.option_chain.get_window(underlying_price, settings.OPTION_CHAIN_STRIKES), underlying_price
+
+    def get_option_chain_instruments(self):
+        """
+        Returns instrument names of the underlying future and the options of the strikes shown, to be kept subscribed
+        """
+        if len(self.option_chain.strikes) == 0:
+            return []
+        window, underlying_price = self.get_option_chain_window()
+        names = [self.option_chain.future_name]
+        for i in window:
+            if i >= 0:
+                names += [self.option_chain.call_names[i], self.option_chain.put_names[i]]
+        return [name for name in names if name != None]
+
+    def get_option_chain_values(self):
+        """
+        Returns ([[call trading symbol, put trading symbol]], greeks block, underlying LTP) of the strikes shown
+        """
+        window, underlying_price = self.get_option_chain_window()
+        calls = [self.option_chain.call_names[i] if i >= 0 else None for i in window]
+        puts = [self.option_chain.put_names[i] if i >= 0 else None for i in window]
+        call_prices = self.get_ticker_values(calls)[:, LTP_COLUMN]
+        put_prices = self.get_ticker_values(puts)[:, LTP_COLUMN]
+        block = self.option_chain.compute(window, call_prices, put_prices, underlying_price, settings.OPTION_RISK_FREE_RATE)
+        symbols = [
+            [self.option_chain.call_symbols[i], self.option_chain.put_symbols[i]] if i >= 0 else [None, None]
+            for i in window
+        ]
+        return symbols, block, underlying_price
+
+    def get_subscription_stats(self):
+        stats = self.subscription_manager.get_stats()
+        stats["connections"] = self.feed_pool.get_stats()   # Instruments per websocket connection
+        return stats
+
+    def get_tokens(self, instrument_names):
+        """
+        Returns the token (str) of every instrument name, None for empty or unknown names
+        """
+        tokens = []
         for name in instrument_names:
             if name == "" or name == None or not self.check_if_instrument_exists(name):
-                ticker_values.append(["","","","","","","","","",""])
+                tokens.append(None)
             else:
-                token = self.get_instrument_token(name)
-                try:
-                    ticker_values.append(self.real_time_values[str(token)])
-                except:
-                    ticker_values.append([0,0,0,0,0,0,0,0,0,0])
-        return ticker_values
\ No newline at end of file
+                tokens.append(str(self.get_instrument_token(name)))
+        return tokens
+
+    def get_ticker_values(self, instrument_names):
+        """
+        Return live ticker values of the given instrument names
+        """
+        return self.tick_store.get_block(self.get_tokens(instrument_names))
+
+    def get_bar_values(self, instrument_names, minutes, count):
+        """
+        Returns [open, high, low, close, volume] of the last count bars of the given timeframe (minutes) per instrument name, newest first
+        """
+        return self.bar_engine.get_block(self.get_tokens(instrument_names), minutes, count)
+
+    def get_indicator_values(self, instrument_names, ticker_values):
+        """
+        Returns the INDICATOR_COLUMNS of the given instrument names, ticker_values are their rows from get_ticker_values
+        """
+        self.indicator_engine.update()
+        return self.indicator_engine.get_values(self.get_tokens(instrument_names), ticker_values)
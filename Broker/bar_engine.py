@@ -0,0 +1,147 @@
+import threading
+from time import time
+
+import numpy as np
+
+BAR_FIELDS = ['time', 'open', 'high', 'low', 'close', 'volume']
+TIME, OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(BAR_FIELDS))
+EMPTY_SLOT = 0  # Never written, read for rows with no instrument
+
+
+class BarSeries:
+    """
+    Ring buffer of the last length bars of one timeframe, for every slot
+    """
+    def __init__(self, seconds, length, capacity):
+        self.seconds = seconds
+        self.length = length
+        self.bars = np.full((capacity, length, len(BAR_FIELDS)), np.nan)
+        self.heads = np.zeros(capacity, dtype=np.int64)     # Index of the current bar
+        self.counts = np.zeros(capacity, dtype=np.int64)    # Bars started since the first tick, capped at length
+
+    def grow(self, capacity):
+        bars = np.full((capacity, self.length, len(BAR_FIELDS)), np.nan)
+        bars[:len(self.bars)] = self.bars
+        heads = np.zeros(capacity, dtype=np.int64)
+        heads[:len(self.heads)] = self.heads
+        counts = np.zeros(capacity, dtype=np.int64)
+        counts[:len(self.counts)] = self.counts
+        self.bars, self.heads, self.counts = bars, heads, counts
+
+    def update(self, slot, timestamp, ltp, volume):
+        """
+        Starts a new bar when the tick is past the current one, updates high / low / close / volume otherwise. O(1).
+        """
+        start = timestamp - timestamp % self.seconds
+        head = self.heads[slot]
+        bar = self.bars[slot, head]
+        if self.counts[slot] == 0 or start > bar[TIME]:
+            if self.counts[slot] != 0:
+                head = (head + 1) % self.length
+                self.heads[slot] = head
+                bar = self.bars[slot, head]
+            if self.counts[slot] < self.length:
+                self.counts[slot] += 1
+            bar[TIME] = start
+            bar[OPEN] = bar[HIGH] = bar[LOW] = bar[CLOSE] = ltp
+            bar[VOLUME] = volume
+            return
+        if ltp > bar[HIGH]:
+            bar[HIGH] = ltp
+        elif ltp < bar[LOW]:
+            bar[LOW] = ltp
+        bar[CLOSE] = ltp
+        bar[VOLUME] += volume
+
+    def get_block(self, slots, count):
+        """
+        Returns the last count bars of every slot, newest first, as an array (slots, count, fields). Missing bars are NaN.
+        """
+        back = np.arange(count)
+        indices = (self.heads[slots][:, None] - back[None, :]) % self.length
+        block = self.bars[slots[:, None], indices]
+        block[back[None, :] >= self.counts[slots][:, None]] = np.nan
+        return block
+
+
+class BarEngine:
+    """
+    OHLCV candles of every ticking token for several timeframes, built from feed_data in O(1) per tick
+    """
+    def __init__(self, timeframes, length, capacity):
+        self.timeframes = list(timeframes)  # Bar sizes in minutes
+        self.series = [BarSeries(60 * minutes, length, 1 + capacity) for minutes in self.timeframes]
+        self.slots = {}     # {instrument_token: slot}
+        self.next_slot = EMPTY_SLOT + 1
+        self.capacity = 1 + capacity
+        self.last_volumes = [None for i in range(self.capacity)]    # Cumulative day volume of the last tick per slot
+        self.lock = threading.Lock()    # Held while the buffers are grown, written or read, grow replaces them
+
+    def get_slot(self, token):
+        slot = self.slots.get(token)
+        if slot != None:
+            return slot
+        with self.lock:
+            slot = self.slots.get(token)
+            if slot != None:
+                return slot
+            if self.next_slot == self.capacity:    # Full, double the capacity
+                self.capacity *= 2
+                for series in self.series:
+                    series.grow(self.capacity)
+                self.last_volumes.extend([None for i in range(self.capacity - len(self.last_volumes))])
+            slot = self.next_slot
+            self.next_slot += 1
+            self.slots[token] = slot    # Published after the buffers are grown
+        return slot
+
+    def update(self, token, ltp, day_volume=None, feed_time=None):
+        """
+        Adds a tick to the current bar of every timeframe.
+        day_volume : cumulative volume of the day sent by the feed, the bar volume is its increase
+        feed_time : exchange time (epoch sec) of the tick, local time is used if not sent
+        """
+        if ltp == None:
+            return
+        try:
+            timestamp = int(float(feed_time)) if feed_time != None else int(time())
+        except (TypeError, ValueError):
+            timestamp = int(time())
+        slot = self.get_slot(token)
+        try:
+            day_volume = float(day_volume) if day_volume != None else None
+        except (TypeError, ValueError):
+            day_volume = None
+
+        with self.lock:     # A feed thread growing the buffers would drop a bar written into the old ones
+            volume = 0.0
+            if day_volume != None:
+                last_volume = self.last_volumes[slot]
+                if last_volume != None and day_volume > last_volume:
+                    volume = day_volume - last_volume
+                self.last_volumes[slot] = day_volume
+            for series in self.series:
+                series.update(slot, timestamp, ltp, volume)
+
+    def get_series(self, minutes):
+        """
+        Returns the BarSeries of the timeframe, the first timeframe if it is not built
+        """
+        return self.series[self.timeframes.index(minutes)] if minutes in self.timeframes else self.series[0]
+
+    def get_block(self, tokens, minutes, count):
+        """
+        Returns [open, high, low, close, volume] of the last count bars of the given tokens, newest first,
+        as an array (tokens, count * 5). Rows of None tokens and bars not formed yet are NaN.
+        """
+        series = self.get_series(minutes)
+        slots = np.fromiter(
+            (EMPTY_SLOT if token == None else self.slots.get(token, EMPTY_SLOT) for token in tokens),
+            dtype=np.intp,
+            count=len(tokens)
+        )
+        block = np.full((len(tokens), count, len(BAR_FIELDS) - OPEN), np.nan)   # Bars past the history length stay NaN
+        kept = min(count, series.length)
+        with self.lock:
+            block[:, :kept] = series.get_block(slots, kept)[:, :, OPEN:]
+        return block.reshape(len(tokens), count * (len(BAR_FIELDS) - OPEN))
@@ -0,0 +1,104 @@
+import threading
+from bisect import insort, bisect_right
+from itertools import count
+
+
+class BracketBook:
+    """
+    Per token book of stoploss / target brackets. Both levels of a bracket are armed as one-cancels-other legs :
+    the first leg crossed by a tick removes the whole bracket, so every bracket fires exactly once.
+    """
+    def __init__(self):
+        self.above = {}     # {instrument_token: [(price, seq, row_id, reason)]} ascending, leg fires when ltp >= price
+        self.below = {}     # {instrument_token: [(-price, seq, row_id, reason)]} ascending, leg fires when ltp <= price
+        self.brackets = {}  # {row_id: (instrument_token, element, [(side, leg)])}
+        self.sequence = count()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_legs(element):
+        """
+        Returns [(side, price, reason)] of the bracket. BUY exits below stoploss / above target, SELL the opposite.
+        """
+        legs = []
+        if element.stoploss != None:
+            legs.append(("below" if element.transaction_type == "BUY" else "above", element.stoploss, "STOPLOSS"))
+        if element.target != None:
+            legs.append(("above" if element.transaction_type == "BUY" else "below", element.target, "TARGET"))
+        return legs
+
+    def add(self, token, element):
+        """
+        Arms a StoplossTargetWaitingQueueElement, replaces any bracket with the same row id
+        """
+        with self.lock:
+            self.__remove(element.row_id)
+            legs = []
+            for side_name, price, reason in self.get_legs(element):
+                if side_name == "above":
+                    side = self.above
+                    leg = (price, next(self.sequence), element.row_id, reason)
+                else:
+                    side = self.below
+                    leg = (-price, next(self.sequence), element.row_id, reason)
+                insort(side.setdefault(token, []), leg)
+                legs.append((side, leg))
+            self.brackets[element.row_id] = (token, element, legs)
+
+    def remove(self, row_id):
+        """
+        Disarms the bracket of the given row id, returns its element or None if it is not armed (already fired)
+        """
+        with self.lock:
+            return self.__remove(row_id)
+
+    def __remove(self, row_id):
+        if row_id not in self.brackets:
+            return None
+        token, element, legs = self.brackets.pop(row_id)
+        for side, leg in legs:
+            levels = side.get(token)
+            if levels != None and leg in levels:
+                levels.remove(leg)
+                if not levels:
+                    del side[token]
+        return element
+
+    def get(self, row_id):
+        """
+        Returns the element of the given row id, None if not armed
+        """
+        with self.lock:
+            bracket = self.brackets.get(row_id)
+            return bracket[1] if bracket != None else None
+
+    def is_watching(self, token):
+        """
+        Returns True if there are armed brackets on the token
+        """
+        return token in self.above or token in self.below
+
+    def check(self, token, ltp):
+        """
+        Disarms and returns [(element, reason)] of every bracket of the token with a leg crossed by the ltp
+        """
+        fired = []
+        with self.lock:
+            crossed_legs = []
+            levels = self.above.get(token)
+            if levels:
+                crossed = bisect_right(levels, (ltp, float('inf')))
+                crossed_legs.extend(levels[:crossed])
+            levels = self.below.get(token)
+            if levels:
+                crossed = bisect_right(levels, (-ltp, float('inf')))
+                crossed_legs.extend(levels[:crossed])
+
+            for _, _, row_id, reason in crossed_legs:
+                element = self.__remove(row_id)  # None if the other leg of the bracket already fired on this tick
+                if element != None:
+                    fired.append((element, reason))
+        return fired
+
+    def __len__(self):
+        return len(self.brackets)
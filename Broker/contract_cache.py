@@ -0,0 +1,49 @@
+import os
+import json
+from datetime import date
+
+import pandas as pd
+
+
+class MasterContractCache:
+    """
+    On-disk cache of the merged master contracts table along with the date it was downloaded on
+    """
+    def __init__(self, cache_dir, name="instruments"):
+        self.data_file = os.path.join(cache_dir, f"{name}.pkl")
+        self.meta_file = os.path.join(cache_dir, f"{name}_meta.json")
+
+    def is_fresh(self):
+        """
+        Returns True if the cache exists and was downloaded on the current trading day
+        """
+        if not os.path.exists(self.data_file) or not os.path.exists(self.meta_file):
+            return False
+        try:
+            with open(self.meta_file) as file:
+                meta = json.load(file)
+            return meta.get("download_date") == date.today().isoformat()
+        except (OSError, ValueError):
+            return False
+
+    def load(self):
+        """
+        Returns the cached instruments DataFrame, None if the cache is missing or stale
+        """
+        if not self.is_fresh():
+            return None
+        try:
+            return pd.read_pickle(self.data_file)
+        except Exception:
+            return None
+
+    def save(self, instruments:pd.DataFrame):
+        """
+        Writes the instruments DataFrame and today's date to the cache.
+        Data file is replaced atomically so that a crash never leaves a half written cache.
+        """
+        tmp_file = self.data_file + ".tmp"
+        instruments.reset_index(drop=True).to_pickle(tmp_file)
+        os.replace(tmp_file, self.data_file)
+        with open(self.meta_file, 'w') as file:
+            json.dump({"download_date": date.today().isoformat(), "rows": len(instruments)}, file, indent=4)
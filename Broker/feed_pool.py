@@ -0,0 +1,134 @@
+import threading
+
+
+class FeedPool:
+    """
+    Spreads the subscribed instruments over several websocket connections, at most max_tokens per connection.
+    The first connection is the logged in one, others are opened by create_connection when all the open ones are full.
+    Each instrument stays on the connection it was subscribed on until it is unsubscribed.
+    Every connection has its own open / closed state : instruments are sent once it is open, and sent again when it
+    reopens (the websocket client reconnects by itself, subscriptions of the old socket are gone).
+    """
+    def __init__(self, connection, create_connection, max_tokens, max_connections, logger):
+        self.connections = [connection]
+        self.create_connection = create_connection  # Returns a new connection sharing the session of the first one
+        self.max_tokens = max_tokens
+        self.max_connections = max_connections
+        self.logger = logger
+        self.assigned = {}  # {(exchange, token): connection index}
+        self.instruments = [{}]     # {(exchange, token): instrument} subscribed on every connection
+        self.active = [False]   # Open state of every connection
+        self.websocket_options = None   # start_websocket arguments, set once streaming started
+        self.lock = threading.Lock()
+
+    def start(self, **websocket_options):
+        """
+        Starts the websocket of the first connection, later connections are started with the same callbacks.
+        The open and close callbacks are called with the index of the connection.
+        """
+        self.websocket_options = websocket_options
+        self.start_connection(0)
+
+    def start_connection(self, index):
+        options = dict(self.websocket_options)
+        options['socket_open_callback'] = lambda: self.on_open(index)
+        options['socket_close_callback'] = lambda: self.on_close(index)
+        self.connections[index].start_websocket(**options)
+
+    def on_open(self, index):
+        """
+        Marks the connection open and sends the instruments subscribed on it while it was not
+        """
+        with self.lock:
+            self.active[index] = True
+            instruments = list(self.instruments[index].values())
+        if instruments:
+            self.connections[index].subscribe(instruments)
+            self.logger.info(f"Feed connection {index + 1} open, {len(instruments)} instruments subscribed")
+        callback = self.websocket_options.get('socket_open_callback')
+        if callback != None:
+            callback(index)
+
+    def on_close(self, index):
+        with self.lock:
+            self.active[index] = False
+        callback = self.websocket_options.get('socket_close_callback')
+        if callback != None:
+            callback(index)
+
+    def is_active(self):
+        """
+        Returns True if every opened connection is open
+        """
+        with self.lock:
+            return all(self.active)
+
+    def add_connection(self):
+        """
+        Opens one more websocket connection, returns its index. Instruments assigned to it are sent once it is open.
+        """
+        self.connections.append(self.create_connection())
+        self.instruments.append({})
+        self.active.append(False)
+        index = len(self.connections) - 1
+        self.logger.info(f"Feed connection {index + 1} opening, {self.max_tokens} instruments per connection")
+        threading.Thread(target=self.start_connection, args=(index,), daemon=True).start()  # Not under the lock, on_open takes it
+        return index
+
+    def get_connection_index(self):
+        """
+        Returns the least loaded connection with room, opening a new one if all are full
+        """
+        counts = [len(x) for x in self.instruments]
+        index = min(range(len(counts)), key=lambda i: counts[i])
+        if counts[index] < self.max_tokens or self.websocket_options == None:
+            return index
+        if len(self.connections) < self.max_connections:
+            return self.add_connection()
+        return index    # All connections full, the least loaded one takes the overflow
+
+    def subscribe(self, instruments):
+        """
+        Subscribes the instruments (pya3 Instrument), one subscribe call per open connection
+        """
+        batches = {}
+        with self.lock:
+            for instrument in instruments:
+                if instrument == None:
+                    continue
+                key = (instrument.exchange, instrument.token)
+                if key in self.assigned:
+                    continue
+                index = self.get_connection_index()
+                self.assigned[key] = index
+                self.instruments[index][key] = instrument
+                if self.active[index]:
+                    batches.setdefault(index, []).append(instrument)
+        for index, batch in batches.items():
+            self.connections[index].subscribe(batch)
+
+    def unsubscribe(self, instruments):
+        """
+        Unsubscribes the instruments from the connections they were subscribed on
+        """
+        batches = {}
+        with self.lock:
+            for instrument in instruments:
+                if instrument == None:
+                    continue
+                key = (instrument.exchange, instrument.token)
+                index = self.assigned.pop(key, None)
+                if index == None:
+                    continue
+                del self.instruments[index][key]
+                if self.active[index]:
+                    batches.setdefault(index, []).append(instrument)
+        for index, batch in batches.items():
+            self.connections[index].unsubscribe(batch)
+
+    def get_stats(self):
+        """
+        Returns number of instruments subscribed on every connection
+        """
+        with self.lock:
+            return [len(x) for x in self.instruments]
@@ -0,0 +1,155 @@
+import time
+
+import numpy as np
+
+from Broker.bar_engine import TIME, HIGH, LOW, CLOSE, VOLUME
+from Broker.tick_store import LTP_COLUMN
+
+INDICATORS = ["EMA", "RSI", "ATR", "VWAP_UPPER", "VWAP_LOWER"]
+VWAP_COLUMN = 6
+
+
+def parse_column(column):
+    """
+    Returns (indicator, parameter) of a column name : EMA_20 -> ("EMA", 20.0), VWAP_UPPER_2 -> ("VWAP_UPPER", 2.0).
+    Parameter is the period (in candles) for EMA / RSI / ATR and the number of standard deviations for the VWAP bands.
+    """
+    name, _, parameter = column.upper().rpartition("_")
+    if name not in INDICATORS:
+        raise ValueError(f"Unknown indicator column {column}, expected one of {INDICATORS} followed by _<parameter>")
+    return name, float(parameter)
+
+
+class IndicatorEngine:
+    """
+    EMA / RSI (Wilder) / ATR (Wilder) / VWAP bands of every token on the candles of one timeframe of the bar engine.
+    State per token is advanced once per completed candle and the live values are derived from the state and the
+    current LTP, all tokens in one NumPy pass per cycle.
+    """
+    def __init__(self, bar_engine, minutes, columns):
+        self.bar_engine = bar_engine
+        self.minutes = minutes
+        self.columns = [parse_column(column) for column in columns]
+        self.utc_offset = time.localtime().tm_gmtoff    # Day of a candle is its local (exchange) date
+
+        # State arrays indexed by bar engine slot, NaN until the first completed candle
+        state_names = ["last_time", "prev_close", "day", "sum_volume", "sum_volume_price", "sum_volume_price2"]
+        for name, parameter in self.columns:
+            if name == "EMA":
+                state_names.append(("EMA", parameter))
+            elif name == "RSI":
+                state_names += [("AVG_GAIN", parameter), ("AVG_LOSS", parameter)]
+            elif name == "ATR":
+                state_names.append(("ATR", parameter))
+        self.state = {name: np.full(0, np.nan) for name in state_names}
+        self.grow(bar_engine.capacity)
+
+    def grow(self, size):
+        """
+        Extends the state arrays to size slots, called with the bar engine lock held
+        """
+        for name, values in self.state.items():
+            if len(values) < size:
+                grown = np.full(size, np.nan)
+                grown[:len(values)] = values
+                self.state[name] = grown
+
+    def update(self):
+        """
+        Advances the state of every token whose candle completed since the last call
+        """
+        series = self.bar_engine.get_series(self.minutes)
+        with self.bar_engine.lock:  # The buffers may be regrown by feed_data, the state by get_values
+            used = min(self.bar_engine.next_slot, len(series.heads))
+            slots = np.arange(used)
+            completed = series.bars[slots, (series.heads[:used] - 1) % series.length]    # Last completed candle of every slot
+            counts = series.counts[:used]
+            self.grow(self.bar_engine.capacity)
+            with np.errstate(invalid='ignore'):
+                is_new = (counts >= 2) & ~(completed[:, TIME] <= self.state["last_time"][:used])
+            rows = np.flatnonzero(is_new)
+            if len(rows):
+                self.advance(rows, completed[rows])
+
+    def advance(self, rows, candles):
+        """
+        Advances the state of the given slots with their last completed candle, called with the bar engine lock held
+        """
+        state = self.state
+        close, high, low, volume = candles[:, CLOSE], candles[:, HIGH], candles[:, LOW], candles[:, VOLUME]
+        prev_close = state["prev_close"][rows]
+        first = np.isnan(prev_close)
+        prev_close = np.where(first, close, prev_close)
+        change = close - prev_close
+        gain, loss = np.maximum(change, 0), np.maximum(-change, 0)
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+        for name, parameter in self.columns:
+            if name == "EMA":
+                ema = state["EMA", parameter][rows]
+                state["EMA", parameter][rows] = np.where(np.isnan(ema), close, ema + 2 / (parameter + 1) * (close - ema))
+            elif name == "RSI":
+                for key, value in [("AVG_GAIN", gain), ("AVG_LOSS", loss)]:
+                    average = state[key, parameter][rows]
+                    state[key, parameter][rows] = np.where(np.isnan(average), value, (average * (parameter - 1) + value) / parameter)
+            elif name == "ATR":
+                atr = state["ATR", parameter][rows]
+                state["ATR", parameter][rows] = np.where(np.isnan(atr), true_range, (atr * (parameter - 1) + true_range) / parameter)
+
+        day = (candles[:, TIME] + self.utc_offset) // 86400
+        new_day = day != state["day"][rows]     # Volume weighted sums restart every day, as the feed's VWAP
+        typical_price = (high + low + close) / 3
+        state["sum_volume"][rows] = np.where(new_day, 0, state["sum_volume"][rows]) + volume
+        state["sum_volume_price"][rows] = np.where(new_day, 0, state["sum_volume_price"][rows]) + volume * typical_price
+        state["sum_volume_price2"][rows] = np.where(new_day, 0, state["sum_volume_price2"][rows]) + volume * typical_price ** 2
+        state["day"][rows] = day
+        state["prev_close"][rows] = close
+        state["last_time"][rows] = candles[:, TIME]
+
+    def get_values(self, tokens, ticker_values):
+        """
+        Returns the indicator columns of the given tokens as an array (tokens, columns).
+        ticker_values : tick store rows of the same tokens, the LTP is used as the close of the current candle
+        """
+        slots = np.fromiter(
+            (0 if token == None else self.bar_engine.slots.get(token, 0) for token in tokens),
+            dtype=np.intp,
+            count=len(tokens)
+        )
+        ltp = ticker_values[:, LTP_COLUMN]
+        ltp = np.where(ltp > 0, ltp, np.nan)    # Not ticked yet
+        series = self.bar_engine.get_series(self.minutes)
+        with self.bar_engine.lock:  # State regrown and advanced by update under the same lock
+            self.grow(self.bar_engine.capacity)    # Capacity is raised before a new slot is published
+            state = {name: values[slots] for name, values in self.state.items()}   # Copies of the rows, computed outside the lock
+            current = series.bars[slots, series.heads[slots]]   # Candle being formed
+        prev_close = np.where(np.isnan(state["prev_close"]), ltp, state["prev_close"])
+        change = ltp - prev_close
+
+        values = np.full((len(tokens), len(self.columns)), np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sum_volume = state["sum_volume"]
+            mean = state["sum_volume_price"] / sum_volume
+            deviation = np.sqrt(np.maximum(state["sum_volume_price2"] / sum_volume - mean ** 2, 0))
+            vwap = ticker_values[:, VWAP_COLUMN]
+            vwap = np.where(vwap > 0, vwap, mean)
+            for i, (name, parameter) in enumerate(self.columns):
+                if name == "EMA":
+                    ema = state["EMA", parameter]
+                    values[:, i] = np.where(np.isnan(ema), ltp, ema + 2 / (parameter + 1) * (ltp - ema))
+                elif name == "RSI":
+                    gain = (np.nan_to_num(state["AVG_GAIN", parameter]) * (parameter - 1) + np.maximum(change, 0)) / parameter
+                    loss = (np.nan_to_num(state["AVG_LOSS", parameter]) * (parameter - 1) + np.maximum(-change, 0)) / parameter
+                    values[:, i] = np.where(gain + loss > 0, 100 * gain / (gain + loss), 50)
+                    values[np.isnan(ltp), i] = np.nan
+                elif name == "ATR":
+                    high = np.fmax(current[:, HIGH], ltp)
+                    low = np.fmin(current[:, LOW], ltp)
+                    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+                    atr = state["ATR", parameter]
+                    values[:, i] = np.where(np.isnan(atr), true_range, (atr * (parameter - 1) + true_range) / parameter)
+                elif name == "VWAP_UPPER":
+                    values[:, i] = vwap + parameter * deviation
+                else:
+                    values[:, i] = vwap - parameter * deviation
+        return np.round(values, 2)
@@ -0,0 +1,78 @@
+import pandas as pd
+
+
+class InstrumentIndex:
+    """
+    Hash maps built once over the master contracts so that every lookup is O(1)
+    instead of a boolean scan over the whole instruments DataFrame
+    """
+    def __init__(self, instruments:pd.DataFrame):
+        # Trading Symbol -> values
+        self.symbol_to_name = {}
+        self.symbol_to_token = {}
+        self.symbol_to_exch = {}
+        self.symbol_to_lot_size = {}
+
+        # Instrument Name -> values
+        self.name_to_token = {}
+        self.name_to_exch = {}
+        self.name_to_symbol = {}
+
+        self.build(instruments)
+
+    @staticmethod
+    def is_valid_key(key):
+        """
+        Returns True if key can be used in the index (empty cells in the master are NaN)
+        """
+        return key is not None and not (isinstance(key, float) and pd.isna(key))
+
+    def build(self, instruments:pd.DataFrame):
+        """
+        Builds all the maps in a single pass. First occurrence wins, same as .iloc[0] on a mask.
+        """
+        lot_sizes = instruments['Lot Size'] if 'Lot Size' in instruments.columns else [None] * len(instruments)
+        rows = zip(
+            instruments['Trading Symbol'],
+            instruments['Instrument Name'],
+            instruments['Token'],
+            instruments['Exch'],
+            lot_sizes
+        )
+        for trading_symbol, instrument_name, token, exch, lot_size in rows:
+            try:
+                token = int(token)
+            except (TypeError, ValueError):
+                token = None
+
+            if self.is_valid_key(trading_symbol) and trading_symbol not in self.symbol_to_name:
+                self.symbol_to_name[trading_symbol] = str(instrument_name)
+                self.symbol_to_token[trading_symbol] = token
+                self.symbol_to_exch[trading_symbol] = exch
+                self.symbol_to_lot_size[trading_symbol] = lot_size
+
+            if self.is_valid_key(instrument_name) and instrument_name not in self.name_to_token:
+                self.name_to_token[instrument_name] = token
+                self.name_to_exch[instrument_name] = exch
+                self.name_to_symbol[instrument_name] = str(trading_symbol)
+
+    def has_instrument(self, instrument_name):
+        return self.is_valid_key(instrument_name) and instrument_name in self.name_to_token
+
+    def has_trading_symbol(self, trading_symbol):
+        return self.is_valid_key(trading_symbol) and trading_symbol in self.symbol_to_name
+
+    def get_token(self, instrument_name):
+        return self.name_to_token.get(instrument_name) if self.is_valid_key(instrument_name) else None
+
+    def get_exch(self, instrument_name):
+        return self.name_to_exch.get(instrument_name) if self.is_valid_key(instrument_name) else None
+
+    def get_trading_symbol(self, instrument_name):
+        return self.name_to_symbol.get(instrument_name) if self.is_valid_key(instrument_name) else None
+
+    def get_instrument_name(self, trading_symbol):
+        return self.symbol_to_name.get(trading_symbol) if self.is_valid_key(trading_symbol) else None
+
+    def get_lot_size(self, trading_symbol):
+        return self.symbol_to_lot_size.get(trading_symbol) if self.is_valid_key(trading_symbol) else None
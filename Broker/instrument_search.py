@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+PREFIX_END = "￿"   # Sorts after every character of a trading symbol
+MAX_CACHED_SUGGESTIONS = 1000
+HISTOGRAM_BINS = 64     # Characters are counted modulo 64, upper case letters, digits and punctuation fall in distinct bins
+
+
+def get_histograms(codes):
+    """
+    Returns the character counts (rows, HISTOGRAM_BINS) of every row of character codes
+    """
+    count = codes.shape[0]
+    bins = (np.arange(count)[:, None] * HISTOGRAM_BINS + codes % HISTOGRAM_BINS).ravel()
+    return np.bincount(bins, minlength=count * HISTOGRAM_BINS).reshape(count, HISTOGRAM_BINS).astype(np.int16)
+
+
+def edit_distances(candidates, lengths, query):
+    """
+    Returns the optimal string alignment distance (Levenshtein with adjacent transpositions) of every candidate to query.
+    candidates : array (candidates, width) of character codes, lengths : length of every candidate, query : array of codes.
+    The dynamic programming table is filled one query character at a time for all the candidates at once.
+    """
+    count, width = candidates.shape
+    columns = np.arange(width + 1)
+    before = None
+    previous = np.broadcast_to(columns, (count, width + 1)).copy()
+    for i in range(1, len(query) + 1):
+        current = np.empty_like(previous)
+        current[:, 0] = i
+        substitution = previous[:, :-1] + (candidates != query[i - 1])
+        deletion = previous[:, 1:] + 1
+        best = np.minimum(substitution, deletion)
+        if before is not None:
+            swapped = (candidates[:, :-1] == query[i - 1]) & (candidates[:, 1:] == query[i - 2])
+            best[:, 1:] = np.where(swapped, np.minimum(best[:, 1:], before[:, :-2] + 1), best[:, 1:])
+        for j in range(1, width + 1):     # Insertions depend on the cell on the left
+            current[:, j] = np.minimum(best[:, j - 1], current[:, j - 1] + 1)
+        before, previous = previous, current
+    return previous[np.arange(count), lengths]
+
+
+class InstrumentSearch:
+    """
+    Master contracts sorted by trading symbol and by instrument name, built once in load_master_contracts.
+    A prefix is two binary searches, exchange and expiry filters are masks over the matching range only.
+    Trading symbols and instrument names are also bucketed by length as character codes for typo tolerant suggestions.
+    """
+    def __init__(self, instruments:pd.DataFrame, max_typos=2):
+        symbols = instruments['Trading Symbol'].fillna("").astype(str).str.upper().to_numpy(dtype=str)
+        self.order = np.argsort(symbols, kind='stable')     # Row of the master of every sorted position
+        self.symbols = symbols[self.order]
+        self.exchanges = instruments['Exch'].fillna("").astype(str).str.upper().to_numpy(dtype=str)[self.order]
+        expiries = pd.to_datetime(instruments['Expiry Date'], errors='coerce')
+        self.expiries = expiries.to_numpy(dtype='datetime64[D]')[self.order]
+        values = instruments.astype(object)
+        self.values = values.where(values.notna(), None).to_numpy()     # Cells of every row as written to a sheet, empty as None
+        self.columns = list(instruments.columns)
+
+        names = instruments['Instrument Name'].fillna("").astype(str).str.upper().to_numpy(dtype=str)
+        self.name_order = np.argsort(names, kind='stable')
+        self.names = names[self.name_order]
+
+        self.trading_symbols = instruments['Trading Symbol'].to_numpy(dtype=object)    # As written in the master
+        self.max_typos = max_typos
+        self.length_buckets = self.build_length_buckets(symbols)
+        unique_names, first_rows = np.unique(names, return_index=True)  # Derivatives share the name of their underlying
+        self.name_length_buckets = self.build_length_buckets(unique_names, first_rows)
+        self.suggestions = {}   # {(text, limit): trading symbols} of the texts already looked up
+
+    @staticmethod
+    def build_length_buckets(keys, rows=None):
+        """
+        Returns {length: (rows, character codes (rows, length), character histograms)} of the keys.
+        rows : row of the master of every key, the position of the key if not given
+        """
+        rows = np.arange(len(keys)) if rows is None else np.asarray(rows)
+        lengths = np.char.str_len(keys)
+        buckets = {}
+        for length in np.unique(lengths):
+            if length == 0:
+                continue
+            positions = np.flatnonzero(lengths == length)
+            codes = keys[positions].astype(f'<U{length}').view(np.uint32).reshape(len(positions), length)
+            buckets[int(length)] = (rows[positions], codes, get_histograms(codes))
+        return buckets
+
+    @staticmethod
+    def get_prefix_range(keys, prefix):
+        if prefix == "":
+            return 0, len(keys)
+        start = int(np.searchsorted(keys, prefix, side='left'))
+        end = int(np.searchsorted(keys, prefix + PREFIX_END, side='left'))
+        return start, end
+
+    def get_range(self, prefix):
+        """
+        Returns (start, end) of the sorted positions of the trading symbols starting with prefix
+        """
+        return self.get_prefix_range(self.symbols, prefix.upper())
+
+    def filter(self, exchange=None, prefix=None, expiry=None):
+        """
+        Returns the rows of the master matching all the given filters, ordered by trading symbol.
+        exchange : Exch column (NSE, NFO ...), prefix : start of the trading symbol, expiry : date
+        """
+        start, end = self.get_range(prefix or "")
+        mask = np.ones(end - start, dtype=bool)
+        if exchange not in [None, ""]:
+            mask &= self.exchanges[start:end] == str(exchange).upper()
+        if expiry != None:
+            mask &= self.expiries[start:end] == np.datetime64(expiry, 'D')
+        return self.order[start:end][mask]
+
+    def get_page(self, rows, page, page_size, columns):
+        """
+        Returns the values of the columns (list of rows) of the given page of rows, pages start at 1
+        """
+        page_rows = rows[(page - 1) * page_size:page * page_size]
+        column_indices = [self.columns.index(column) for column in columns]
+        return self.values[np.ix_(page_rows, column_indices)].tolist()
+
+    def get_close_rows(self, text, limit):
+        """
+        Returns up to limit rows whose trading symbol or instrument name is at most max_typos edits away from text,
+        closest first
+        """
+        query = np.array([text]).view(np.uint32)
+        query_histogram = get_histograms(query[None, :])[0]
+        rows, distances = [], []
+        for buckets in [self.length_buckets, self.name_length_buckets]:
+            self.add_close_rows(buckets, query, query_histogram, rows, distances)
+        if not rows:
+            return []
+        rows, distances = np.concatenate(rows), np.concatenate(distances)
+        rows = rows[np.argsort(distances, kind='stable')]
+        _, first = np.unique(rows, return_index=True)   # A row close by its symbol and its name is kept once
+        return rows[np.sort(first)[:limit]].tolist()
+
+    def add_close_rows(self, buckets, query, query_histogram, rows, distances):
+        """
+        Appends the rows of the buckets at most max_typos edits away from query and their distances
+        """
+        for length in range(len(query) - self.max_typos, len(query) + self.max_typos + 1):
+            if length not in buckets:
+                continue
+            bucket_rows, codes, histograms = buckets[length]
+            # An edit changes the character counts by 2 at most, most of the bucket is dropped before the edit distance
+            kept = np.flatnonzero(np.abs(histograms - query_histogram).sum(axis=1) <= 2 * self.max_typos)
+            bucket_rows, codes = bucket_rows[kept], codes[kept]
+            bucket_distances = edit_distances(codes, np.full(len(bucket_rows), length), query)
+            close = bucket_distances <= self.max_typos
+            rows.append(bucket_rows[close])
+            distances.append(bucket_distances[close])
+
+    def suggest(self, text, limit=3):
+        """
+        Returns up to limit trading symbols for a symbol typed by hand : trading symbols then instrument names
+        starting with text, then trading symbols and instrument names with at most max_typos typos
+        """
+        text = str(text).strip().upper()
+        if text == "":
+            return []
+        key = (text, limit)
+        if key in self.suggestions:
+            return self.suggestions[key]
+
+        start, end = self.get_prefix_range(self.symbols, text)
+        rows = self.order[start:min(end, start + limit)].tolist()
+        if len(rows) < limit:
+            start, end = self.get_prefix_range(self.names, text)
+            rows += self.name_order[start:min(end, start + limit)].tolist()
+        if len(rows) < limit:
+            rows += self.get_close_rows(text, limit)
+
+        suggestions = []
+        for row in rows:
+            trading_symbol = self.trading_symbols[row]
+            if trading_symbol not in suggestions and isinstance(trading_symbol, str):
+                suggestions.append(trading_symbol)
+        if len(self.suggestions) >= MAX_CACHED_SUGGESTIONS:
+            self.suggestions.clear()
+        self.suggestions[key] = suggestions[:limit]
+        return self.suggestions[key]
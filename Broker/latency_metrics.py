@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import deque
+from time import sleep
+
+import numpy as np
+
+# Stages timed along the tick to order and tick to sheet paths, in the order they are published
+LATENCY_STAGES = [
+    "tick_to_trigger",  # Tick receipt in feed_data to trigger detection in the above below / stoploss target books
+    "trigger_to_submit",    # Trigger detection to order submission in place_order
+    "order_rest_call",  # Broker REST call of one order placement attempt
+    "submit_to_ack",    # Submission in place_order to order id received (queueing, retries and REST call)
+    "tick_to_ack",  # Tick receipt to order id received for triggered orders
+    "sheet_write",  # Marketwatch block write in excel
+    "tick_to_sheet",    # Oldest tick not yet on the sheet to the end of the marketwatch write
+    "marketwatch_cycle"     # One refresh cycle of the marketwatch (without sleep)
+]
+PERCENTILES = [50, 95, 99]
+
+
+class RollingHistogram:
+    """
+    Latencies (in sec) of the last window samples of one stage
+    """
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0  # Samples recorded since start, including the ones out of the window
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def get_summary(self):
+        """
+        Returns {count, p50, p95, p99, max} in milliseconds over the window
+        """
+        if not self.samples:
+            return {"count": self.count, "p50": None, "p95": None, "p99": None, "max": None}
+        values = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)) * 1000
+        p50, p95, p99 = np.percentile(values, PERCENTILES)
+        return {"count": self.count, "p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3), "max": round(values.max(), 3)}
+
+
+class LatencyMetrics:
+    """
+    Rolling latency histogram per stage. Stages are timed with perf_counter by the broker and the excel manager,
+    the summary is written to a plain text file every publish_time seconds for local scrapers.
+    """
+    def __init__(self, window, metrics_file=None, publish_time=5):
+        self.window = window
+        self.metrics_file = metrics_file
+        self.publish_time = publish_time    # Time (in sec) between two writes of the metrics file
+        self.histograms = {stage: RollingHistogram(window) for stage in LATENCY_STAGES}
+        self.unwritten_tick_time = None    # Receipt time of the oldest tick not yet written to the sheet
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        if self.metrics_file != None:
+            self.thread.start()
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.histograms[stage].record(seconds)
+
+    def record_since(self, stage, start_time, end_time):
+        """
+        Records end_time - start_time, ignored when the start of the stage was not timed
+        """
+        if start_time != None:
+            self.record(stage, end_time - start_time)
+
+    def mark_tick(self, tick_time):
+        """
+        Called for every tick by every feed connection, keeps the receipt time of the oldest tick since the last sheet write
+        """
+        with self.lock:
+            if self.unwritten_tick_time == None or tick_time < self.unwritten_tick_time:
+                self.unwritten_tick_time = tick_time
+
+    def take_tick_time(self):
+        """
+        Returns the receipt time of the oldest tick since the last call (None if no tick came) and resets it
+        """
+        with self.lock:
+            tick_time, self.unwritten_tick_time = self.unwritten_tick_time, None
+        return tick_time
+
+    def get_summary(self):
+        """
+        Returns [[stage, count, p50, p95, p99, max]] with latencies in milliseconds
+        """
+        with self.lock:
+            summaries = [(stage, self.histograms[stage].get_summary()) for stage in LATENCY_STAGES]
+        return [[stage, s["count"], s["p50"], s["p95"], s["p99"], s["max"]] for stage, s in summaries]
+
+    def to_text(self):
+        """
+        Returns the summary in the prometheus text format
+        """
+        lines = [
+            f"# HELP latency_ms Latency in milliseconds over the last {self.window} samples of each stage",
+            "# TYPE latency_ms summary"
+        ]
+        for stage, count, p50, p95, p99, max_value in self.get_summary():
+            for percentile, value in zip(PERCENTILES, [p50, p95, p99]):
+                if value != None:
+                    lines.append(f'latency_ms{{stage="{stage}",quantile="{percentile / 100}"}} {value}')
+            if max_value != None:
+                lines.append(f'latency_ms_max{{stage="{stage}"}} {max_value}')
+            lines.append(f'latency_ms_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write_file(self):
+        """
+        Replaces the metrics file atomically so that a scraper never reads a half written file
+        """
+        tmp_file = self.metrics_file + ".tmp"
+        with open(tmp_file, 'w') as file:
+            file.write(self.to_text())
+        os.replace(tmp_file, self.metrics_file)
+
+    def run(self):
+        while True:
+            sleep(self.publish_time)
+            try:
+                self.write_file()
+            except OSError:
+                pass
@@ -0,0 +1,176 @@
+from datetime import datetime, time as day_time
+
+import numpy as np
+import pandas as pd
+
+OPTION_FIELDS = ['ltp', 'iv', 'delta', 'gamma', 'theta', 'vega']
+EXPIRY_TIME = day_time(15, 30)  # Options expire at the close of the trading day
+MIN_VOLATILITY = 0.0001
+MAX_VOLATILITY = 5.0
+IV_ITERATIONS = 60  # Bisection steps, the volatility interval is halved on every step
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x):
+    """
+    Standard normal CDF, Abramowitz and Stegun 7.1.26 approximation of erf (error below 1.5e-7)
+    """
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    erf = 1 - t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429)))) * np.exp(-z * z)
+    return 0.5 * (1 + np.sign(x) * erf)
+
+
+def black76(forward, strike, years, rate, sigma, is_call):
+    """
+    Returns (price, d1, d2) of European options on a future (Black 76), vectorized over all the arguments
+    """
+    sqrt_t = np.sqrt(years)
+    d1 = (np.log(forward / strike) + 0.5 * sigma * sigma * years) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    discount = np.exp(-rate * years)
+    call = discount * (forward * norm_cdf(d1) - strike * norm_cdf(d2))
+    put = discount * (strike * norm_cdf(-d2) - forward * norm_cdf(-d1))
+    return np.where(is_call, call, put), d1, d2
+
+
+def implied_volatility(prices, forward, strike, years, rate, is_call):
+    """
+    Returns the implied volatility of every option by bisection (price is increasing in volatility),
+    NaN for prices outside the no-arbitrage bounds
+    """
+    low = np.full(len(prices), MIN_VOLATILITY)
+    high = np.full(len(prices), MAX_VOLATILITY)
+    for i in range(IV_ITERATIONS):
+        middle = 0.5 * (low + high)
+        price, _, _ = black76(forward, strike, years, rate, middle, is_call)
+        above = price > prices
+        high = np.where(above, middle, high)
+        low = np.where(above, low, middle)
+    sigma = 0.5 * (low + high)
+    lowest, _, _ = black76(forward, strike, years, rate, MIN_VOLATILITY, is_call)
+    highest, _, _ = black76(forward, strike, years, rate, MAX_VOLATILITY, is_call)
+    return np.where((prices > lowest) & (prices < highest), sigma, np.nan)
+
+
+def option_greeks(prices, forward, strike, years, rate, is_call):
+    """
+    Returns an array (options, 6) of [ltp, iv (%), delta, gamma, theta (per day), vega (per 1% volatility)]
+    """
+    sigma = implied_volatility(prices, forward, strike, years, rate, is_call)
+    price, d1, d2 = black76(forward, strike, years, rate, sigma, is_call)
+    discount = np.exp(-rate * years)
+    sqrt_t = np.sqrt(years)
+    density = norm_pdf(d1)
+    delta = np.where(is_call, discount * norm_cdf(d1), -discount * norm_cdf(-d1))
+    gamma = discount * density / (forward * sigma * sqrt_t)
+    theta = (rate * price - discount * forward * density * sigma / (2 * sqrt_t)) / 365
+    vega = discount * forward * density * sqrt_t / 100
+    return np.column_stack([prices, sigma * 100, delta, gamma, theta, vega])
+
+
+def parse_expiry(value):
+    """
+    Returns the date of an expiry cell (date, datetime or text), None if it cannot be read
+    """
+    if value in [None, ""]:
+        return None
+    expiry = pd.to_datetime(value, errors='coerce')
+    return None if pd.isna(expiry) else expiry.date()
+
+
+class OptionChain:
+    """
+    Strikes of one underlying and expiry from the master contracts, with their greeks computed for all strikes at once
+    """
+    def __init__(self, instruments:pd.DataFrame):
+        derivatives = instruments[instruments['Option Type'].isin(['CE', 'PE', 'XX'])]
+        self.contracts = derivatives[['Exch', 'Symbol', 'Instrument Name', 'Trading Symbol', 'Option Type', 'Strike Price']].copy()
+        self.contracts['Expiry'] = pd.to_datetime(derivatives['Expiry Date'], errors='coerce').dt.date
+        self.clear()
+
+    def clear(self):
+        """
+        Drops the selected chain, no strike is shown or kept subscribed until the next select
+        """
+        self.selection = None   # (exchange, underlying, expiry)
+        self.strikes = np.zeros(0)
+        self.call_names = []    # Instrument name of the call of every strike, None if not listed
+        self.put_names = []
+        self.call_symbols = []  # Trading symbol of the call of every strike
+        self.put_symbols = []
+        self.future_name = None     # Future the options are priced against
+
+    def select(self, exchange, underlying, expiry):
+        """
+        Loads the strikes of the underlying (Symbol column) and expiry. Returns False if the chain is not in the master.
+        """
+        if (exchange, underlying, expiry) == self.selection:
+            return len(self.strikes) > 0
+        self.selection = (exchange, underlying, expiry)
+        contracts = self.contracts[self.contracts['Symbol'] == underlying]
+        if exchange not in [None, ""]:
+            contracts = contracts[contracts['Exch'] == exchange]
+
+        options = contracts[(contracts['Expiry'] == expiry) & (contracts['Option Type'] != 'XX')].dropna(subset=['Strike Price'])
+        calls = options[options['Option Type'] == 'CE'].drop_duplicates('Strike Price').set_index('Strike Price')
+        puts = options[options['Option Type'] == 'PE'].drop_duplicates('Strike Price').set_index('Strike Price')
+        self.strikes = np.array(sorted(set(calls.index) | set(puts.index)), dtype=np.float64)
+        self.call_names = [calls.at[x, 'Instrument Name'] if x in calls.index else None for x in self.strikes]
+        self.put_names = [puts.at[x, 'Instrument Name'] if x in puts.index else None for x in self.strikes]
+        self.call_symbols = [calls.at[x, 'Trading Symbol'] if x in calls.index else None for x in self.strikes]
+        self.put_symbols = [puts.at[x, 'Trading Symbol'] if x in puts.index else None for x in self.strikes]
+
+        # Future of the same expiry, the nearest later one otherwise
+        futures = contracts[(contracts['Option Type'] == 'XX') & (contracts['Expiry'] >= expiry)].sort_values('Expiry') if expiry != None else contracts.iloc[0:0]
+        self.future_name = futures['Instrument Name'].iloc[0] if len(futures) else None
+        return len(self.strikes) > 0
+
+    def get_window(self, underlying_price, strikes_each_side):
+        """
+        Returns indices of the strikes_each_side strikes around the ATM strike (-1 where the chain runs out)
+        """
+        if len(self.strikes) == 0:
+            return np.full(2 * strikes_each_side + 1, -1)
+        if underlying_price == None:
+            atm = len(self.strikes) // 2
+        else:
+            atm = int(np.argmin(np.abs(self.strikes - underlying_price)))
+        window = np.arange(atm - strikes_each_side, atm + strikes_each_side + 1)
+        return np.where((window >= 0) & (window < len(self.strikes)), window, -1)
+
+    def get_years_to_expiry(self, now=None):
+        now = now if now != None else datetime.now()
+        expiry = datetime.combine(self.selection[2], EXPIRY_TIME)
+        return max((expiry - now).total_seconds(), 60) / (365 * 86400)     # At least a minute, greeks blow up at expiry
+
+    def compute(self, window, call_prices, put_prices, underlying_price, rate):
+        """
+        Returns an array (strikes, 13) of [call ltp, iv, delta, gamma, theta, vega, strike, put ltp, iv, delta, gamma, theta, vega].
+        Rows outside the chain and options with no price or underlying price are NaN.
+        """
+        count = len(window)
+        with np.errstate(invalid='ignore'):
+            call_prices = np.where(call_prices > 0, call_prices, np.nan)     # 0 until the first tick
+            put_prices = np.where(put_prices > 0, put_prices, np.nan)
+        block = np.full((count, 2 * len(OPTION_FIELDS) + 1), np.nan)
+        listed = window >= 0
+        strikes = np.full(count, np.nan)
+        strikes[listed] = self.strikes[window[listed]]  # No strike listed when the chain is empty
+        block[:, len(OPTION_FIELDS)] = strikes
+        block[:, 0] = call_prices
+        block[:, len(OPTION_FIELDS) + 1] = put_prices
+        if underlying_price == None or not listed.any():
+            return block
+
+        years = self.get_years_to_expiry()
+        prices = np.concatenate([call_prices, put_prices])
+        is_call = np.concatenate([np.ones(count, dtype=bool), np.zeros(count, dtype=bool)])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            greeks = option_greeks(prices, underlying_price, np.concatenate([strikes, strikes]), years, rate, is_call)
+        block[:, :len(OPTION_FIELDS)] = greeks[:count]
+        block[:, len(OPTION_FIELDS) + 1:] = greeks[count:]
+        return block
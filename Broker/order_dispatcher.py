@@ -0,0 +1,90 @@
+import threading
+import heapq
+from concurrent.futures import Future
+from itertools import count
+from queue import Queue
+from time import monotonic
+
+
+class OrderDispatcher:
+    """
+    Places orders on a pool of worker threads. Every submitted order gets a Future which resolves to the order id,
+    callers attach callbacks instead of waiting. Failed attempts are retried with exponential backoff by a
+    scheduler thread, so neither the submitter nor a worker sleeps between retries.
+    Other broker requests (cancel, order history) can be submitted with their own send function.
+    """
+    def __init__(self, send_order, logger, workers, max_retries, base_delay, max_delay):
+        self.send_order = send_order    # Function placing one order, returns the order id and raises on failure
+        self.logger = logger
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.submission_queue = Queue()     # [(future, send, order, attempt)]
+        self.retry_heap = []    # [(ready time, seq, (future, send, order, attempt))]
+        self.retry_condition = threading.Condition()
+        self.sequence = count()
+
+        self.worker_threads = [threading.Thread(target=self.run_worker, daemon=True) for i in range(workers)]
+        self.retry_thread = threading.Thread(target=self.run_retries, daemon=True)
+
+    def start(self):
+        for thread in self.worker_threads:
+            thread.start()
+        self.retry_thread.start()
+
+    def submit(self, send=None, **order):
+        """
+        Queues an order for placement and returns its Future. order is passed as keyword arguments to send_order.
+        send : function called instead of send_order, the Future resolves to its result
+        """
+        future = Future()
+        future.order = order
+        self.submission_queue.put((future, send or self.send_order, order, 1))
+        return future
+
+    def get_retry_delay(self, attempt):
+        """
+        Returns the delay (in sec) before the next attempt
+        """
+        return min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+
+    def run_worker(self):
+        while True:
+            future, send, order, attempt = self.submission_queue.get()
+            if attempt == 1 and not future.set_running_or_notify_cancel():  # Cancelled before it was picked up
+                continue
+            try:
+                result = send(**order)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.logger.critical(f"Max retries for {send.__name__} exceeded, request dropped : {order}")
+                    future.set_exception(e)
+                else:
+                    delay = self.get_retry_delay(attempt)
+                    self.logger.error(f"{send.__name__} failed (attempt {attempt}). Retrying in {delay}s ... {e}")
+                    self.schedule_retry(delay, (future, send, order, attempt + 1))
+                continue
+            future.set_result(result)
+
+    def schedule_retry(self, delay, job):
+        with self.retry_condition:
+            heapq.heappush(self.retry_heap, (monotonic() + delay, next(self.sequence), job))
+            self.retry_condition.notify()
+
+    def run_retries(self):
+        """
+        Moves retries back to the submission queue once their backoff delay has passed
+        """
+        with self.retry_condition:
+            while True:
+                if not self.retry_heap:
+                    self.retry_condition.wait()
+                    continue
+                ready_time = self.retry_heap[0][0]
+                now = monotonic()
+                if ready_time > now:
+                    self.retry_condition.wait(ready_time - now)
+                    continue
+                _, _, job = heapq.heappop(self.retry_heap)
+                self.submission_queue.put(job)
@@ -0,0 +1,65 @@
+import threading
+
+TERMINAL_STATUSES = ["complete", "rejected", "cancelled"]
+UNTRACKED_ORDER_IDS = ["PAPER TRADE", "", None, -1]
+
+
+class OrderStatusCache:
+    """
+    Status of every placed order, refreshed for all open orders with a single order book call.
+    Orders in a terminal state are memoized and never polled again.
+    """
+    def __init__(self):
+        self.statuses = {}  # {order_id: status shown in the orderbook sheet}
+        self.terminal = set()   # Order ids which reached a terminal state
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def format_status(order):
+        """
+        Returns the status text of an order book entry
+        """
+        status = order['Status']
+        if status == "rejected":
+            status = f"Rejected due to - {order.get('RejReason', '')}"
+        return status
+
+    def get(self, order_id):
+        """
+        Returns cached status of the order, empty string if it has not been fetched yet
+        """
+        with self.lock:
+            return self.statuses.get(order_id, "")
+
+    def get_open_orders(self, order_ids):
+        """
+        Returns the order ids which still need to be polled
+        """
+        with self.lock:
+            return [oid for oid in order_ids if oid not in self.terminal and oid not in UNTRACKED_ORDER_IDS]
+
+    def refresh(self, order_ids, fetch_order_book):
+        """
+        Updates the status of all the open orders in order_ids from one order book fetch.
+        Returns [(order_id, status)] of the orders which reached a terminal state in this refresh.
+        """
+        open_orders = self.get_open_orders(order_ids)
+        if not open_orders:
+            return []
+
+        order_book = fetch_order_book()
+        if not isinstance(order_book, list):    # Broker returns a dict with Emsg when there are no orders
+            return []
+        entries = {str(order.get('Nstordno')): order for order in order_book if isinstance(order, dict)}
+
+        finished = []
+        with self.lock:
+            for oid in open_orders:
+                order = entries.get(str(oid))
+                if order == None or 'Status' not in order:
+                    continue
+                self.statuses[oid] = self.format_status(order)
+                if order['Status'] in TERMINAL_STATUSES:
+                    self.terminal.add(oid)
+                    finished.append((oid, order['Status']))
+        return finished
@@ -0,0 +1,355 @@
+import os
+import csv
+import json
+import random
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import count
+from time import time, sleep
+
+import settings
+
+# Same fields as the Instrument returned by pya3
+Instrument = namedtuple('Instrument', ['exchange', 'token', 'symbol', 'name', 'expiry', 'lot_size'])
+
+CONTRACT_HEADER = ['Exch', 'Exchange Segment', 'Symbol', 'Token', 'Instrument Name', 'Trading Symbol', 'Option Type', 'Expiry Date', 'Strike Price', 'Lot Size']
+SEGMENTS = {    # {exchange: (exchange segment, first token)}
+    "NSE": ("nse_cm", 1000),
+    "BSE": ("bse_cm", 200000),
+    "NFO": ("nse_fo", 400000),
+    "BFO": ("bse_fo", 600000),
+    "MCX": ("mcx_fo", 700000),
+    "CDS": ("cde_fo", 800000),
+}
+UNDERLYINGS = {"NFO": ["SIMNIFTY", "SIMBANK"], "BFO": ["SIMSENSEX"], "MCX": ["SIMGOLD"], "CDS": ["SIMUSDINR"]}
+TERMINAL_STATUSES = ["complete", "rejected", "cancelled"]
+
+
+def enum_value(value):
+    """
+    Returns the value of a pya3 enum member, the value itself for plain strings
+    """
+    return getattr(value, 'value', value)
+
+
+class SimulatedOrder:
+    """
+    Order accepted by the simulated exchange
+    """
+    def __init__(self, order_id, token, transaction_type, quantity, order_type, product_type, price, fill_time):
+        self.order_id = order_id
+        self.token = token
+        self.transaction_type = transaction_type
+        self.quantity = quantity
+        self.order_type = order_type
+        self.product_type = product_type
+        self.price = price
+        self.fill_time = fill_time
+        self.status = "open"
+        self.average_price = 0.0
+
+
+class SimulatedExchange:
+    """
+    Offline stand-in for the pya3 Aliceblue connection. Generates master contracts and synthetic ticks,
+    and fills orders after a configurable latency, with no network access.
+    """
+    def __init__(self, instruments_per_segment, tick_rate, fill_latency, seed=0):
+        self.instruments_per_segment = instruments_per_segment
+        self.tick_rate = tick_rate  # Messages per second sent on the websocket
+        self.fill_latency = fill_latency    # Seconds before an order becomes complete
+        self.rng = random.Random(seed)
+
+        self.instruments = {}   # {(exchange, token): Instrument}
+        self.contract_rows = {}     # {exchange: [master contract row]}
+        self.prices = {}    # {token: ltp}
+        self.day_values = {}    # {token: [open, high, low, close, volume]}
+        self.subscribed = []    # Subscribed tokens
+        self.orders = {}    # {order_id: SimulatedOrder}
+        self.order_ids = count(1000000)
+        self.cash = 1000000.0
+        self.lock = threading.Lock()
+
+        self.callback = None
+        self.websocket_thread = None
+        self.build_instruments()
+
+    # ===================================================================================
+    # Session and master contracts
+    def get_session_id(self):
+        return {"stat": "Ok", "sessionID": "SIMULATOR"}
+
+    def build_instruments(self):
+        """
+        Creates the synthetic instruments of every segment : equities for NSE / BSE, futures and option chains for the others
+        """
+        expiries = [date.today() + timedelta(days=7 * i + 3) for i in range(3)]
+        for exchange, (segment, first_token) in SEGMENTS.items():
+            token = first_token
+            rows = []
+            if exchange in ["NSE", "BSE"]:
+                for i in range(self.instruments_per_segment):
+                    symbol = f"SIM{exchange[0]}{i:05d}"    # SIMN00000 on NSE, SIMB00000 on BSE
+                    rows.append([exchange, segment, symbol, token, symbol, f"{symbol}-EQ", "", "", "", 1])
+                    self.prices[token] = round(self.rng.uniform(50, 5000), 2)
+                    token += 1
+            else:
+                underlyings = UNDERLYINGS[exchange]
+                per_expiry = max(3, self.instruments_per_segment // (len(underlyings) * len(expiries)))
+                strikes_count = (per_expiry - 1) // 2     # One future and a CE / PE pair per strike
+                for underlying in underlyings:
+                    spot = round(self.rng.uniform(1000, 50000))
+                    step = max(1, round(spot * 0.005))
+                    lot_size = self.rng.choice([15, 25, 50, 100])
+                    for expiry in expiries:
+                        tag = expiry.strftime('%d%b%y').upper()
+                        rows.append([exchange, segment, underlying, token, f"{underlying} {tag} FUT", f"{underlying}{tag}F", "XX", expiry.isoformat(), "", lot_size])
+                        self.prices[token] = float(spot)
+                        token += 1
+                        for i in range(strikes_count):
+                            strike = spot + (i - strikes_count // 2) * step
+                            for option_type in ["CE", "PE"]:
+                                intrinsic = max(0, spot - strike) if option_type == "CE" else max(0, strike - spot)
+                                rows.append([exchange, segment, underlying, token, f"{underlying} {tag} {strike} {option_type}", f"{underlying}{tag}{option_type[0]}{strike}", option_type, expiry.isoformat(), strike, lot_size])
+                                self.prices[token] = round(intrinsic + spot * 0.01 * self.rng.uniform(0.5, 1.5), 2)
+                                token += 1
+
+            for row in rows:
+                self.instruments[(exchange, row[3])] = Instrument(exchange, row[3], row[2], row[4], row[7], row[9])
+            self.contract_rows[exchange] = rows
+
+        for token, price in self.prices.items():
+            self.day_values[token] = [price, price, price, price, 0]
+
+    def get_contract_master(self, exchange):
+        """
+        Writes {exchange}.csv in BASE_DIR in the format of the broker's master contract files
+        """
+        path = os.path.join(settings.BASE_DIR, f"{exchange}.csv")
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            if exchange == "INDICES":
+                writer.writerow(["exch", "symbol", "token"])
+                writer.writerow(["NSE", "SIM INDEX", 999001])
+                writer.writerow(["BSE", "SIM SENSEX", 999002])
+            else:
+                writer.writerow(CONTRACT_HEADER)
+                writer.writerows(self.contract_rows[exchange])
+        return {"stat": "Ok"}
+
+    def get_instrument_by_token(self, exchange, token):
+        return self.instruments.get((exchange, int(token)))
+
+    def create_feed(self):
+        """
+        Returns one more websocket connection on this exchange, ticking from the same prices
+        """
+        return SimulatedFeed(self)
+
+    # ===================================================================================
+    # Websocket
+    def start_websocket(self, socket_open_callback=None, socket_close_callback=None, socket_error_callback=None,
+                        subscription_callback=None, run_in_background=False, market_depth=False):
+        self.callback = subscription_callback
+        self.websocket_thread = threading.Thread(target=self.run_websocket, args=(socket_open_callback,), daemon=True)
+        if run_in_background:
+            self.websocket_thread.start()
+        else:
+            self.run_websocket(socket_open_callback)
+
+    def send(self, message):
+        if self.callback != None:
+            self.callback(json.dumps(message))
+
+    def subscribe(self, instruments):
+        with self.lock:
+            for instrument in instruments:
+                if instrument != None and instrument.token not in self.subscribed:
+                    self.subscribed.append(instrument.token)
+        for instrument in instruments:
+            if instrument != None:
+                self.send(self.get_snapshot(instrument))
+
+    def unsubscribe(self, instruments):
+        with self.lock:
+            tokens = {instrument.token for instrument in instruments if instrument != None}
+            self.subscribed = [token for token in self.subscribed if token not in tokens]
+
+    def get_snapshot(self, instrument):
+        """
+        Returns the full (dk) message of an instrument
+        """
+        ltp = self.prices[instrument.token]
+        open_val, high_val, low_val, close_val, volume = self.day_values[instrument.token]
+        return {
+            "t": "dk", "e": instrument.exchange, "tk": str(instrument.token), "lp": f"{ltp:.2f}",
+            "o": f"{open_val:.2f}", "h": f"{high_val:.2f}", "l": f"{low_val:.2f}", "c": f"{close_val:.2f}",
+            "v": str(volume), "ap": f"{ltp:.2f}", "bp1": f"{ltp - 0.05:.2f}", "sp1": f"{ltp + 0.05:.2f}", "oi": "0"
+        }
+
+    def next_tick(self, token):
+        """
+        Moves the price of the token by a random step and returns its partial (df) message
+        """
+        ltp = max(0.05, round(self.prices[token] * (1 + self.rng.gauss(0, 0.0005)), 2))
+        self.prices[token] = ltp
+        day = self.day_values[token]
+        day[1] = max(day[1], ltp)
+        day[2] = min(day[2], ltp)
+        day[4] += self.rng.randint(1, 500)
+        return {"t": "df", "tk": str(token), "lp": f"{ltp:.2f}", "h": f"{day[1]:.2f}", "l": f"{day[2]:.2f}",
+                "v": str(day[4]), "bp1": f"{ltp - 0.05:.2f}", "sp1": f"{ltp + 0.05:.2f}"}
+
+    def run_websocket(self, socket_open_callback):
+        if socket_open_callback != None:
+            socket_open_callback()
+        self.send({"t": "ck", "s": "OK"})
+
+        batch_time = 0.01   # Ticks are sent in batches every 10 ms to hold the configured rate
+        batch_size = max(1, int(self.tick_rate * batch_time))
+        while True:
+            start = time()
+            with self.lock:
+                tokens = self.subscribed
+            if tokens:
+                for i in range(batch_size):
+                    self.send(self.next_tick(self.rng.choice(tokens)))
+            self.fill_orders()
+            remaining = batch_time - (time() - start)
+            if remaining > 0:
+                sleep(remaining)
+
+    # ===================================================================================
+    # Orders
+    def place_order(self, transaction_type, instrument, quantity, order_type, product_type, price=0.0, trigger_price=None, stop_loss=None,
+                    square_off=None, trailing_sl=None, is_amo=False, order_tag=None):
+        if instrument == None:
+            return {"stat": "Not_Ok", "Emsg": "Invalid instrument"}
+        order_id = str(next(self.order_ids))
+        with self.lock:
+            self.orders[order_id] = SimulatedOrder(
+                order_id, instrument.token, enum_value(transaction_type), int(quantity), enum_value(order_type),
+                enum_value(product_type), float(price or 0), time() + self.fill_latency
+            )
+        return {"stat": "Ok", "NOrdNo": order_id}
+
+    def modify_order(self, transaction_type, instrument, product_type, order_id, order_type, quantity, price=0.0, trigger_price=0.0):
+        with self.lock:
+            order = self.orders.get(str(order_id))
+            if order == None or order.status in TERMINAL_STATUSES:
+                return {"stat": "Not_Ok", "Emsg": "Order cannot be modified"}
+            order.quantity = int(quantity)
+            order.order_type = enum_value(order_type)
+            order.price = float(price or 0)
+        return {"stat": "Ok", "Result": order_id}
+
+    def cancel_order(self, nestordernmbr):
+        with self.lock:
+            order = self.orders.get(str(nestordernmbr))
+            if order == None or order.status in TERMINAL_STATUSES:
+                return {"stat": "Not_Ok", "Emsg": "Order cannot be cancelled"}
+            order.status = "cancelled"
+        return {"stat": "Ok", "Result": nestordernmbr}
+
+    def fill_orders(self):
+        """
+        Completes open orders whose fill latency has passed. Limit orders wait for the price to cross the limit.
+        """
+        now = time()
+        with self.lock:
+            for order in self.orders.values():
+                if order.status != "open" or order.fill_time > now:
+                    continue
+                ltp = self.prices.get(order.token, 0)
+                is_market = order.price == 0
+                if is_market or (order.transaction_type == "BUY" and ltp <= order.price) or (order.transaction_type == "SELL" and ltp >= order.price):
+                    order.status = "complete"
+                    order.average_price = ltp if is_market else order.price
+                    sign = -1 if order.transaction_type == "BUY" else 1
+                    self.cash += sign * order.average_price * order.quantity
+
+    def get_order_history(self, nextorder):
+        with self.lock:
+            order = self.orders.get(str(nextorder))
+            if order == None:
+                return {"stat": "Not_Ok", "Emsg": "No Data"}
+            return {"Nstordno": order.order_id, "Status": order.status, "RejReason": "", "Avgprc": order.average_price}
+
+    def order_data(self):
+        with self.lock:
+            if not self.orders:
+                return {"stat": "Not_Ok", "Emsg": "No Data"}
+            return [{"Nstordno": order.order_id, "Status": order.status, "RejReason": "", "Avgprc": order.average_price} for order in self.orders.values()]
+
+    # ===================================================================================
+    # Account
+    def get_balance(self):
+        return [{
+            "cashmarginavailable": round(self.cash, 2),
+            "credits": 0.0,
+            "exposuremargin": 0.0,
+            "net": round(self.cash, 2),
+            "grossexposurevalue": 0.0
+        }]
+
+    def get_profile(self):
+        return {"accountId": "SIMULATOR"}
+
+
+class SimulatedFeed:
+    """
+    Extra websocket connection of a SimulatedExchange, as opened by the feed pool. Sends ticks of its own
+    subscriptions at the exchange's tick rate from the exchange's prices, orders stay on the exchange.
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.subscribed = []    # Subscribed tokens
+        self.lock = threading.Lock()
+        self.callback = None
+        self.websocket_thread = None
+
+    def start_websocket(self, socket_open_callback=None, socket_close_callback=None, socket_error_callback=None,
+                        subscription_callback=None, run_in_background=False, market_depth=False):
+        self.callback = subscription_callback
+        self.websocket_thread = threading.Thread(target=self.run_websocket, args=(socket_open_callback,), daemon=True)
+        if run_in_background:
+            self.websocket_thread.start()
+        else:
+            self.run_websocket(socket_open_callback)
+
+    def send(self, message):
+        if self.callback != None:
+            self.callback(json.dumps(message))
+
+    def subscribe(self, instruments):
+        with self.lock:
+            for instrument in instruments:
+                if instrument != None and instrument.token not in self.subscribed:
+                    self.subscribed.append(instrument.token)
+        for instrument in instruments:
+            if instrument != None:
+                self.send(self.exchange.get_snapshot(instrument))
+
+    def unsubscribe(self, instruments):
+        with self.lock:
+            tokens = {instrument.token for instrument in instruments if instrument != None}
+            self.subscribed = [token for token in self.subscribed if token not in tokens]
+
+    def run_websocket(self, socket_open_callback):
+        if socket_open_callback != None:
+            socket_open_callback()
+        self.send({"t": "ck", "s": "OK"})
+
+        batch_time = 0.01
+        batch_size = max(1, int(self.exchange.tick_rate * batch_time))
+        while True:
+            start = time()
+            with self.lock:
+                tokens = self.subscribed
+            if tokens:
+                for i in range(batch_size):
+                    self.send(self.exchange.next_tick(self.exchange.rng.choice(tokens)))
+            remaining = batch_time - (time() - start)
+            if remaining > 0:
+                sleep(remaining)
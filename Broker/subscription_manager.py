@@ -0,0 +1,59 @@
+from time import monotonic
+
+
+class SubscriptionManager:
+    """
+    Keeps the websocket subscriptions in line with the instruments on the sheet.
+    Only the delta is sent, in one subscribe and one unsubscribe call, once the sheet has been stable for the debounce time.
+    """
+    def __init__(self, subscribe, unsubscribe, debounce_time, is_pinned=None):
+        self.subscribe = subscribe  # Function subscribing a list of instrument names
+        self.unsubscribe = unsubscribe  # Function unsubscribing a list of instrument names
+        self.debounce_time = debounce_time
+        self.is_pinned = is_pinned  # Function returning True for instruments which must stay subscribed (pending orders)
+
+        self.active = set()     # Subscribed instrument names
+        self.desired = set()    # Instrument names on the sheet
+        self.desired_since = None   # Time at which the sheet last changed
+        self.subscribe_count = 0    # Total instruments subscribed
+        self.unsubscribe_count = 0  # Total instruments unsubscribed
+
+    def update(self, instrument_names):
+        """
+        Called every cycle with the instrument names on the sheet. Returns (added, removed) when a delta was sent, None otherwise.
+        """
+        desired = {name for name in instrument_names if name not in [None, ""]}
+        now = monotonic()
+        if desired != self.desired:
+            self.desired = desired
+            self.desired_since = now
+            return None
+        if self.desired_since == None or now - self.desired_since < self.debounce_time:
+            return None
+        added = list(self.desired - self.active)
+        stale = self.active - self.desired
+        removed = [name for name in stale if self.is_pinned == None or not self.is_pinned(name)]
+        if len(removed) == len(stale):
+            self.desired_since = None   # Stable set applied, nothing to do until the next edit
+        if added:
+            self.subscribe(added)
+            self.active.update(added)
+            self.subscribe_count += len(added)
+        if removed:
+            self.unsubscribe(removed)
+            self.active.difference_update(removed)
+            self.unsubscribe_count += len(removed)
+        if not added and not removed:
+            return None
+        return added, removed
+
+    def get_stats(self):
+        """
+        Returns number of active subscriptions and total churn (subscribes + unsubscribes)
+        """
+        return {
+            "active": len(self.active),
+            "subscribed": self.subscribe_count,
+            "unsubscribed": self.unsubscribe_count,
+            "churn": self.subscribe_count + self.unsubscribe_count
+        }
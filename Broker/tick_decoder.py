@@ -0,0 +1,22 @@
+import json
+
+try:
+    import orjson  # Optional, several times faster than json for websocket frames
+except ImportError:
+    orjson = None
+
+
+def decode_message(msg):
+    """
+    Decodes a websocket frame (str or bytes) into a dictionary using the fastest parser available
+    """
+    if orjson != None:
+        return orjson.loads(msg)
+    return json.loads(msg)
+
+
+def get_parser_name():
+    """
+    Returns name of the JSON parser in use
+    """
+    return "orjson" if orjson != None else "json"
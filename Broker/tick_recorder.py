@@ -0,0 +1,181 @@
+import os
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from time import time, sleep
+
+import numpy as np
+
+from Broker.tick_store import TICK_MESSAGE_KEYS
+
+# Fixed width record of one tick, mask has bit i set when TICK_MESSAGE_KEYS[i] was present in the message
+TICK_RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('token', '<i8'),
+    ('type', 'u1'),     # 0 : dk (full snapshot), 1 : df (partial update)
+    ('mask', '<u2'),
+    ('values', '<f8', (len(TICK_MESSAGE_KEYS),)),
+    ('feed_time', '<f8')    # Exchange time (ft, epoch sec) of the tick, NaN if not sent
+])
+LEGACY_TICK_RECORD_DTYPE = np.dtype(TICK_RECORD_DTYPE.descr[:-1])  # Records of the files written before feed time
+RECORD_FILE_HEADER = b"TICKS\x00v2"     # Start of the files of TICK_RECORD_DTYPE, legacy files have no header
+MESSAGE_TYPES = ["dk", "df"]
+
+
+def get_record_file(directory, day):
+    """
+    Returns path of the record file of the given trading day (date)
+    """
+    return os.path.join(directory, f"ticks_{day.isoformat()}.bin")
+
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        return file.read(len(RECORD_FILE_HEADER))
+
+
+class TickRecorder:
+    """
+    Appends every decoded tick to a fixed width binary file per trading day.
+    feed_data only appends to an in-memory buffer, records are encoded and written in batches by a background thread.
+    """
+    def __init__(self, directory, flush_time):
+        self.directory = directory
+        self.flush_time = flush_time    # Time (in sec) between two batch writes
+        self.buffer = deque()    # (timestamp, token, message type, message), appended by feed threads and drained by flush
+        self.recorded_count = 0
+        self.files = {}     # {day: record file}, checked once per day
+        self.flush_lock = threading.Lock()  # One flush at a time, a flush called by hand may run next to the background one
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def record(self, token, message_type, message):
+        """
+        Called from feed_data for every tick
+        """
+        self.buffer.append((time(), token, message_type, message))
+
+    @staticmethod
+    def encode(ticks):
+        """
+        Returns the ticks as an array of TICK_RECORD_DTYPE
+        """
+        records = np.zeros(len(ticks), dtype=TICK_RECORD_DTYPE)
+        count = 0
+        for timestamp, token, message_type, message in ticks:
+            try:
+                token = int(token)
+            except (TypeError, ValueError):
+                continue
+            record = records[count]
+            record['timestamp'] = timestamp
+            record['token'] = token
+            record['type'] = MESSAGE_TYPES.index(message_type) if message_type in MESSAGE_TYPES else 1
+            mask = 0
+            for column, key in enumerate(TICK_MESSAGE_KEYS):
+                if key in message:
+                    try:
+                        record['values'][column] = float(message[key])
+                        mask |= 1 << column
+                    except (TypeError, ValueError):
+                        pass
+            record['mask'] = mask
+            try:
+                record['feed_time'] = float(message['ft'])
+            except (KeyError, TypeError, ValueError):
+                record['feed_time'] = np.nan
+            count += 1
+        return records[:count]
+
+    def get_file(self, day):
+        """
+        Returns the record file of the day, a new one if the day was started by a version without feed time
+        """
+        path = self.files.get(day)
+        if path == None:
+            path = get_record_file(self.directory, day)
+            if os.path.exists(path) and os.path.getsize(path) > 0 and read_header(path) != RECORD_FILE_HEADER:
+                path = path[:-len(".bin")] + "_ft.bin"
+            self.files[day] = path
+        return path
+
+    def flush(self):
+        """
+        Writes the buffered ticks to the record file of their trading day
+        """
+        with self.flush_lock:
+            # Only the ticks present now are taken, a tick appended meanwhile stays for the next flush
+            ticks = [self.buffer.popleft() for i in range(len(self.buffer))]
+            if not ticks:
+                return
+            records = self.encode(ticks)
+            days = np.array([datetime.fromtimestamp(ts).date() for ts in records['timestamp']])
+            for day in sorted(set(days)):
+                with open(self.get_file(day), 'ab') as file:
+                    if file.tell() == 0:
+                        file.write(RECORD_FILE_HEADER)
+                    file.write(records[days == day].tobytes())
+            self.recorded_count += len(records)
+
+    def run(self):
+        while True:
+            sleep(self.flush_time)
+            self.flush()
+
+
+class TickReader:
+    """
+    Memory maps a record file and replays it as websocket messages.
+    Only whole records are mapped, a record cut by a crash during a write is dropped.
+    """
+    def __init__(self, path, logger=None):
+        offset, dtype = 0, LEGACY_TICK_RECORD_DTYPE
+        if read_header(path) == RECORD_FILE_HEADER:
+            offset, dtype = len(RECORD_FILE_HEADER), TICK_RECORD_DTYPE
+        size = max(os.path.getsize(path) - offset, 0)
+        count = size // dtype.itemsize
+        self.truncated_bytes = size - count * dtype.itemsize
+        if self.truncated_bytes and logger != None:
+            logger.warning(f"Record file {path} ends with a partial record, {self.truncated_bytes} bytes ignored")
+        if count == 0:  # Process stopped before the first flush, memmap cannot map an empty file
+            self.records = np.zeros(0, dtype=dtype)
+        else:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    @staticmethod
+    def to_message(record):
+        """
+        Returns the websocket frame (json string) of a record
+        """
+        message = {"t": MESSAGE_TYPES[record['type']], "tk": str(record['token'])}
+        mask = int(record['mask'])
+        values = record['values']
+        for column, key in enumerate(TICK_MESSAGE_KEYS):
+            if mask & (1 << column):
+                message[key] = float(values[column])
+        if 'feed_time' in record.dtype.names and not np.isnan(record['feed_time']):
+            message['ft'] = str(int(record['feed_time']))   # Sent as text by the feed
+        return json.dumps(message)
+
+    def replay(self, feed_data, speed=1.0):
+        """
+        Feeds every record to feed_data. speed 1 replays at the original pace, 10 ten times faster, 0 as fast as possible.
+        Returns number of messages replayed.
+        """
+        if len(self.records) == 0:
+            return 0
+        first_timestamp = float(self.records[0]['timestamp'])
+        start = time()
+        for record in self.records:
+            if speed > 0:
+                delay = (float(record['timestamp']) - first_timestamp) / speed - (time() - start)
+                if delay > 0:
+                    sleep(delay)
+            feed_data(self.to_message(record))
+        return len(self.records)
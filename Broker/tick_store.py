@@ -0,0 +1,146 @@
+import threading
+from collections import deque
+from time import monotonic
+
+import numpy as np
+
+# Column order of the tick table, same as the marketwatch block (c:l)
+TICK_FIELDS = ['open', 'high', 'low', 'close', 'ltp', 'volume', 'vwap', 'best_buy', 'best_sell', 'oi']
+# Websocket message keys for each column of the tick table
+TICK_MESSAGE_KEYS = ['o', 'h', 'l', 'c', 'lp', 'v', 'ap', 'bp1', 'sp1', 'oi']
+TICK_MESSAGE_COLUMNS = {key: column for column, key in enumerate(TICK_MESSAGE_KEYS)}
+LTP_COLUMN = 4
+
+EMPTY_SLOT = 0  # Row of NaN, written as empty cells for rows with no valid instrument
+ZERO_SLOT = 1   # Row of zeros, for valid instruments which have not ticked yet
+RESERVED_SLOTS = 2
+SLOT_REUSE_DELAY = 1    # Time (in sec) before a released slot is reused, a tick decoded before the release may still write it
+
+
+class TickStore:
+    """
+    Preallocated NumPy table of live streaming values with one row per token, updated in place on every tick.
+    Ticks are written without a lock : grow and release bump version, a write which saw it change is redone under the lock.
+    """
+    def __init__(self, capacity):
+        self.values = np.zeros((RESERVED_SLOTS + capacity, len(TICK_FIELDS)), dtype=np.float64)
+        self.values[EMPTY_SLOT] = np.nan
+        self.slots = {}  # {instrument_token: slot}
+        self.next_slot = RESERVED_SLOTS
+        self.free_slots = deque()   # [(release time, slot)] of unsubscribed tokens, oldest first
+        self.released = set()   # Unsubscribed tokens, their late ticks are dropped
+        self.version = 0    # Odd while the table is grown or slots are released, changed by both
+        self.grow_lock = threading.Lock()
+
+    def get_slot(self, token):
+        """
+        Returns slot of the token, allocates a new one if the token is not present
+        """
+        slot = self.slots.get(token)
+        if slot != None:
+            return slot
+
+        with self.grow_lock:
+            self.released.discard(token)    # Subscribed again
+            return self.allocate(token)
+
+    def allocate(self, token):
+        """
+        Returns slot of the token, a released slot or a new one if the token is not present. Called with grow_lock held.
+        """
+        slot = self.slots.get(token)
+        if slot != None:
+            return slot
+        if self.free_slots and monotonic() - self.free_slots[0][0] >= SLOT_REUSE_DELAY:
+            self.version += 1
+            _, slot = self.free_slots.popleft()
+            self.values[slot] = 0   # Row of the previous token
+            self.version += 1
+        else:
+            if self.next_slot == len(self.values):    # Table full, double the capacity
+                self.version += 1
+                grown = np.zeros((2 * len(self.values), len(TICK_FIELDS)), dtype=np.float64)
+                grown[:len(self.values)] = self.values
+                self.values = grown
+                self.version += 1
+            slot = self.next_slot
+            self.next_slot += 1
+        self.slots[token] = slot    # Published after the table is grown so readers never see an out of range slot
+        return slot
+
+    def release(self, tokens):
+        """
+        Frees the slots of unsubscribed tokens, reused after SLOT_REUSE_DELAY. Ticks of the tokens are dropped until
+        they are subscribed again.
+        """
+        with self.grow_lock:
+            self.version += 1
+            now = monotonic()
+            for token in tokens:
+                slot = self.slots.pop(token, None)
+                if slot == None:
+                    continue
+                self.released.add(token)
+                self.free_slots.append((now, slot))
+            self.version += 1
+
+    def update(self, token, message):
+        """
+        Writes the fields present in the message into the row of the token
+        """
+        columns = TICK_MESSAGE_COLUMNS
+        fields = []
+        for key, value in message.items():    # Single pass over the message, only the keys present are touched
+            column = columns.get(key)
+            if column != None:
+                try:
+                    fields.append((column, float(value)))
+                except (TypeError, ValueError):
+                    pass
+
+        version = self.version
+        slot = self.slots.get(token)
+        if slot != None and version % 2 == 0:
+            values = self.values
+            for column, value in fields:
+                values[slot, column] = value
+            if self.version == version:     # No grow or release started meanwhile, the write is in the current table
+                return
+
+        with self.grow_lock:    # New token, or the table was grown or a slot released during the write
+            if token in self.released:
+                return
+            slot = self.allocate(token)
+            values = self.values
+            for column, value in fields:
+                values[slot, column] = value
+
+    def get_ltp(self, token):
+        """
+        Returns last traded price of the token, None if no tick has been received
+        """
+        slot = self.slots.get(token)
+        if slot == None:
+            return None
+        ltp = float(self.values[slot][LTP_COLUMN])
+        return ltp if ltp != 0 else None    # Row is reserved on subscription, LTP stays 0 until the first tick
+
+    def get_values(self, token):
+        """
+        Returns a copy of the row of the token, None if no tick has been received
+        """
+        slot = self.slots.get(token)
+        if slot == None:
+            return None
+        return self.values[slot].copy()
+
+    def get_block(self, tokens):
+        """
+        Returns the rows of the given tokens as one 2D array (None for an empty row)
+        """
+        slots = np.fromiter(
+            (EMPTY_SLOT if token == None else self.slots.get(token, ZERO_SLOT) for token in tokens),
+            dtype=np.intp,
+            count=len(tokens)
+        )
+        return self.values.take(slots, axis=0)
@@ -0,0 +1,93 @@
+import threading
+from bisect import insort, bisect_right
+from itertools import count
+
+
+class TriggerBook:
+    """
+    Per token book of pending above / below orders kept sorted by trigger price.
+    Checked on every tick of a token, only the levels crossed by the new LTP are removed and returned.
+    """
+    def __init__(self):
+        self.above = {}     # {instrument_token: [(future_price, seq, element)]} ascending, fires when ltp >= future_price
+        self.below = {}     # {instrument_token: [(-future_price, seq, element)]} ascending, fires when ltp <= future_price
+        self.entries = {}   # {row_id: (instrument_token, side, entry)}
+        self.sequence = count()
+        self.lock = threading.Lock()
+
+    def add(self, token, element):
+        """
+        Adds an AboveBelowWaitingQueueElement to the book, replaces any element with the same row id
+        """
+        with self.lock:
+            self.__remove(element.row_id)
+            if element.below_or_above == "ABOVE":
+                side = self.above
+                entry = (element.future_price, next(self.sequence), element)
+            else:
+                side = self.below
+                entry = (-element.future_price, next(self.sequence), element)
+            insort(side.setdefault(token, []), entry)
+            self.entries[element.row_id] = (token, side, entry)
+
+    def remove(self, row_id):
+        """
+        Removes the element of the given row id, returns it or None if not present
+        """
+        with self.lock:
+            return self.__remove(row_id)
+
+    def __remove(self, row_id):
+        if row_id not in self.entries:
+            return None
+        token, side, entry = self.entries.pop(row_id)
+        levels = side[token]
+        levels.remove(entry)
+        if not levels:
+            del side[token]
+        return entry[2]
+
+    def get(self, row_id):
+        """
+        Returns the element of the given row id, None if not present
+        """
+        with self.lock:
+            entry = self.entries.get(row_id)
+            return entry[2][2] if entry != None else None
+
+    def is_watching(self, token):
+        """
+        Returns True if there are pending orders on the token
+        """
+        return token in self.above or token in self.below
+
+    def check(self, token, ltp):
+        """
+        Removes and returns all the elements of the token crossed by the ltp
+        """
+        fired = []
+        with self.lock:
+            levels = self.above.get(token)
+            if levels:
+                crossed = bisect_right(levels, (ltp, float('inf')))  # All levels with future_price <= ltp
+                if crossed:
+                    fired.extend(entry[2] for entry in levels[:crossed])
+                    del levels[:crossed]
+
+            levels = self.below.get(token)
+            if levels:
+                crossed = bisect_right(levels, (-ltp, float('inf')))  # All levels with future_price >= ltp
+                if crossed:
+                    fired.extend(entry[2] for entry in levels[:crossed])
+                    del levels[:crossed]
+
+            for element in fired:
+                del self.entries[element.row_id]
+            if token in self.above and not self.above[token]:
+                del self.above[token]
+            if token in self.below and not self.below[token]:
+                del self.below[token]
+        return fired
+
+    def __len__(self):
+        return len(self.entries)
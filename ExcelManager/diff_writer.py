@@ -0,0 +1,78 @@
+import numpy as np
+
+import settings
+
+
+class DiffWriter:
+    """
+    Writes a numeric block to a sheet keeping the last written snapshot.
+    Only the changed row runs are written, whole block is written when that is cheaper.
+    Every range write is counted as MARKETWATCH_RANGE_WRITE_CELLS cells on top of its cells (call overhead).
+    """
+    def __init__(self, sheet, top_row, left_column):
+        self.sheet = sheet
+        self.top_row = top_row          # 1 based row of the first cell of the block
+        self.left_column = left_column  # 1 based column of the first cell of the block
+        self.snapshot = None
+        self.cycles = 0
+        self.last_cells_written = 0     # Cells written in the last cycle
+        self.total_cells_written = 0
+        self.fallback_writes = 0    # Cycles with changes written as the whole block because the runs cost more
+
+    def write_range(self, row, column, values):
+        """
+        Writes 2D values with its top left corner at (row, column) of the block
+        """
+        top = self.top_row + row
+        left = self.left_column + column
+        self.sheet.range((top, left), (top + values.shape[0] - 1, left + values.shape[1] - 1)).value = values
+        return values.size
+
+    def get_changed_runs(self, changed, max_gap=0):
+        """
+        Returns [(first_row, last_row, first_column, last_column)] covering all the changed cells.
+        Changed rows at most max_gap unchanged rows apart are merged into one run over the union of their changed columns.
+        """
+        changed_rows = np.flatnonzero(changed.any(axis=1))
+        if len(changed_rows) == 0:
+            return []
+        breaks = np.flatnonzero(np.diff(changed_rows) > max_gap + 1) + 1
+        runs = []
+        for rows in np.split(changed_rows, breaks):
+            changed_columns = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+            runs.append((rows[0], rows[-1], changed_columns[0], changed_columns[-1]))
+        return runs
+
+    def write(self, values):
+        """
+        Writes the values, returns number of cells written
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.cycles += 1
+        full_write = (
+            self.snapshot is None
+            or self.snapshot.shape != values.shape
+            or self.cycles % settings.MARKETWATCH_FULL_REFRESH_CYCLES == 0    # Repaint cells edited by hand
+        )
+
+        cells = 0
+        if not full_write:
+            changed = ~((values == self.snapshot) | (np.isnan(values) & np.isnan(self.snapshot)))
+            write_cost = settings.MARKETWATCH_RANGE_WRITE_CELLS
+            # Unchanged rows cheaper to write than one more range write are written with their neighbours
+            runs = self.get_changed_runs(changed, max_gap=write_cost // max(1, values.shape[1]))
+            runs_cost = sum((last_row - first_row + 1) * (last_column - first_column + 1) + write_cost for first_row, last_row, first_column, last_column in runs)
+            if runs_cost >= values.size + write_cost:
+                full_write = True
+                self.fallback_writes += 1
+            else:
+                for first_row, last_row, first_column, last_column in runs:
+                    cells += self.write_range(first_row, first_column, values[first_row:last_row + 1, first_column:last_column + 1])
+
+        if full_write:
+            cells = self.write_range(0, 0, values)
+
+        self.snapshot = values.copy()
+        self.last_cells_written = cells
+        self.total_cells_written += cells
+        return cells
@@ -1,25 +1,91 @@
 import xlwings as xw
 import os
 import logging
-from time import sleep
+from time import sleep, perf_counter
 import pandas as pd
 
 import settings
-from Broker.alice_blue import Broker
+from Broker.alice_blue import Broker, CONTRACT_COLUMNS
+from Broker.account_manager import AccountManager
+from Broker.latency_metrics import LATENCY_STAGES
+from Broker.option_chain import parse_expiry
+from ExcelManager.diff_writer import DiffWriter
+from ExcelManager.marketwatch_shard import MarketwatchShard, SUGGESTIONS_COLUMN, ACCOUNTS_COLUMN, INDICATOR_LEFT_COLUMN
 
 class ExcelManager:
     """
     Manages live updates in excel
     """
-    def __init__(self):
+    def __init__(self, broker=None, run=True):
+        """
+        broker : Broker object to use instead of creating one
+        run : opens the workbook and starts the refresh loop, False when sheets are attached by hand (benchmarks)
+        """
         self.logger = self.get_logger()
-        self.__broker = Broker()  # Broker Object
+        self.__broker = broker if broker != None else Broker()  # Broker Object
         if self.__broker == None:
             exit(1)
+        self.__accounts = AccountManager(self.__broker) if settings.MULTI_ACCOUNT == 1 else None  # Other accounts sharing the broker's feed
 
         self.RUN_FLAG = 1
-        self.load_excel()
-        self.update_marketwatch()
+        self.__shards = []  # MarketwatchShard per block of marketwatch rows
+        self.__written_profile = None   # Profile sheet values as last written
+        self.__metrics_published_at = perf_counter()     # Time of the last Metrics sheet update
+        self.__bars_published_at = perf_counter()    # Time of the last Bars sheet update
+        self.__bars_instrument_names = None     # Instrument names of the rows as last written on the Bars sheet
+        self.__option_chain_published_at = perf_counter()    # Time of the last OptionChain sheet update
+        self.__option_chain_symbols = None  # Trading symbols of the strikes as last written on the OptionChain sheet
+        self.__option_chain_header = None   # (Underlying LTP, Days to expiry) as last written
+        self.__instruments_read_at = perf_counter()  # Time of the last Instruments sheet filter read
+        self.__instruments_filter = None    # (Exchange, Symbol prefix, Expiry, Page) as last written on the Instruments sheet
+        if run:
+            self.load_excel()
+            self.update_marketwatch()
+
+    def attach_sheets(self, marketwatch_sheet, orderbook_sheet, profile_sheet, metrics_sheet=None, bars_sheet=None, option_chain_sheet=None, instruments_sheet=None):
+        """
+        Sets the sheets the manager reads from and writes to
+        """
+        self.__orderbook_sheet = orderbook_sheet
+        self.__profile_sheet = profile_sheet
+        self.__metrics_sheet = metrics_sheet
+        self.__bars_sheet = bars_sheet
+        self.__option_chain_sheet = option_chain_sheet
+        self.__instrument_sheet = instruments_sheet
+        self.__shards = [MarketwatchShard(marketwatch_sheet, 0, settings.MAX_TOKENS_IN_MARKETWATCH, refresh_time=settings.MARKETWATCH_REFRESH_TIME)]
+        self.__bars_writer = DiffWriter(self.__bars_sheet, top_row=5, left_column=3) if bars_sheet != None else None  # Candles block starting at c5
+        self.__option_chain_writer = DiffWriter(self.__option_chain_sheet, top_row=8, left_column=2) if option_chain_sheet != None else None  # Greeks block starting at b8
+
+    def attach_marketwatch_sheets(self, sheets):
+        """
+        Splits the marketwatch rows in the MARKETWATCH_SHEETS blocks, blocks of the same sheet one below the other.
+        sheets : {sheet name: sheet}
+        """
+        self.__shards = []
+        first_row = 0
+        top_rows = {}   # {sheet name: first free row}
+        for name, rows, refresh_time in settings.MARKETWATCH_SHEETS:
+            top_row = top_rows.get(name, 5)
+            self.__shards.append(MarketwatchShard(sheets[name], first_row, rows, top_row, refresh_time))
+            top_rows[name] = top_row + rows
+            first_row += rows
+        (self.__accounts or self.__broker).reserve_rows(first_row)
+
+    def get_instrument_names(self):
+        """
+        Returns the instrument names of all the marketwatch rows, all blocks in row order
+        """
+        return [name for shard in self.__shards for name in shard.instrument_names]
+
+    def get_write_stats(self):
+        """
+        Returns {cycles, fallback_writes, fallback_share} of the marketwatch block writers of all the blocks,
+        fallback_writes counts cycles whose changes were written as the whole block
+        """
+        writers = [x.ticker_writer for x in self.__shards] + [x.indicator_writer for x in self.__shards]
+        cycles = sum(x.cycles for x in writers)
+        fallback_writes = sum(x.fallback_writes for x in writers)
+        return {"cycles": cycles, "fallback_writes": fallback_writes, "fallback_share": round(fallback_writes / cycles, 3) if cycles else 0.0}
     
     def get_logger(self):
         """
@@ -40,6 +106,37 @@ class ExcelManager:
         logger.info("logger initialized")
         return logger
 
+    def setup_marketwatch_sheet(self, marketwatch_sheet):
+        """
+        Writes the title and the column headers of a marketwatch sheet
+        """
+        marketwatch_sheet.range("a1:c2").merge()
+        marketwatch_sheet.range("l1:n1").merge()
+        marketwatch_sheet.range("a1:c2").value = [
+            "ALICE BLUE TERMINAL"
+        ]
+        marketwatch_sheet.range("l1:n1").value = [
+            "MARKETWATCH"
+        ]
+
+        marketwatch_sheet.range("a4:y4").value = [
+            "S.No.", "Trading Symbol", 
+            "Open", "High", "Low", "Close", "LTP",
+            "Volume", "VWAP", "Best Buy", "Best Sell", "OI",
+            "Transaction Type\n(BUY/SELL)", "Product Type\n(MIS/CNC/NRML)", 
+            "Limit Price\n(=0 for Market order)", "Quantity\n(Lot size x No. of lots)", 
+            "Stoploss", "Target", "Below or Above\n(BELOW/ABOVE)",
+            "Future Price\n(Order will execute when LTP reaches this value)",
+            "Entry Action\n(EXECUTE)", 
+            "Order ID\n(WAITING / Order ID)", "Last Action", "Exit Action (EXIT / CANCEL / MODIFY)",
+            "Exit Latency (ms)\n(Stoploss / Target trigger to exit order)"
+            ]
+        marketwatch_sheet.range((4, SUGGESTIONS_COLUMN)).value = "Did you mean\n(Trading Symbol not found)"
+        if self.__accounts != None:
+            marketwatch_sheet.range((4, ACCOUNTS_COLUMN)).value = "Accounts\n(blank = main account, ALL, or user ids separated by commas)"
+        if settings.INDICATOR_COLUMNS:
+            marketwatch_sheet.range((4, INDICATOR_LEFT_COLUMN), (4, INDICATOR_LEFT_COLUMN + len(settings.INDICATOR_COLUMNS) - 1)).value = settings.INDICATOR_COLUMNS
+
     def load_excel(self):
         # CREATE OR LOAD CONNECTION OBJECT TO EXCEL FILE
         if not os.path.exists(settings.EXCEL_FILE):
@@ -50,44 +147,32 @@ class ExcelManager:
             self.__workbook = xw.Book(settings.EXCEL_FILE)
             self.logger.info("Excel file loaded")
 
-        sheets = ['Marketwatch', 'Orderbook', 'Profile', 'Instruments']
+        sheets = ['Marketwatch', 'Orderbook', 'Profile', 'Instruments', 'Metrics', 'Bars', 'OptionChain']
+        sheets += [x[0] for x in settings.MARKETWATCH_SHEETS if x[0] not in sheets]
         for sheet in sheets:
             try:
                 self.__workbook.sheets(sheet)
             except:
                 self.__workbook.sheets.add(sheet)
                 self.logger.info(f"New sheet added : {sheet}")
+        self.attach_sheets(
+            self.__workbook.sheets("Marketwatch"), self.__workbook.sheets("Orderbook"),
+            self.__workbook.sheets("Profile"), self.__workbook.sheets("Metrics"), self.__workbook.sheets("Bars"),
+            self.__workbook.sheets("OptionChain"), self.__workbook.sheets("Instruments")
+        )
+        marketwatch_sheets = {x[0]: self.__workbook.sheets(x[0]) for x in settings.MARKETWATCH_SHEETS}
+        self.attach_marketwatch_sheets(marketwatch_sheets)
         
-        # MARKETWATCH SHEET SETUP 
+        # MARKETWATCH SHEETS SETUP 
         # ==========================================================================
-        self.__marketwatch_sheet = self.__workbook.sheets("Marketwatch")
-        self.__marketwatch_sheet.range("a1:c2").merge()
-        self.__marketwatch_sheet.range("l1:n1").merge()
-        self.__marketwatch_sheet.range("a1:c2").value = [
-            "ALICE BLUE TERMINAL"
-        ]
-        self.__marketwatch_sheet.range("l1:n1").value = [
-            "MARKETWATCH"
-        ]
-
-        self.__marketwatch_sheet.range("a4:x4").value = [
-            "S.No.", "Trading Symbol", 
-            "Open", "High", "Low", "Close", "LTP",
-            "Volume", "VWAP", "Best Buy", "Best Sell", "OI",
-            "Transaction Type\n(BUY/SELL)", "Product Type\n(MIS/CNC/NRML)", 
-            "Limit Price\n(=0 for Market order)", "Quantity\n(Lot size x No. of lots)", 
-            "Stoploss", "Target", "Below or Above\n(BELOW/ABOVE)",
-            "Future Price\n(Order will execute when LTP reaches this value)",
-            "Entry Action\n(EXECUTE)", 
-            "Order ID\n(WAITING / Order ID)", "Last Action", "Exit Action (EXIT / CANCEL / MODIFY)"
-            ]
-
-        self.__marketwatch_sheet.range(f"a5:a{5 + settings.MAX_TOKENS_IN_MARKETWATCH}").value = [[x] for x in range(settings.MAX_TOKENS_IN_MARKETWATCH)]
+        for marketwatch_sheet in marketwatch_sheets.values():
+            self.setup_marketwatch_sheet(marketwatch_sheet)
+        for shard in self.__shards:
+            shard.sheet.range(shard.get_address("a", "a")).value = [[shard.first_row + x] for x in range(shard.rows)]
         # ==========================================================================
 
         # ORDERBOOK SHEET SETUP
         # ==========================================================================
-        self.__orderbook_sheet = self.__workbook.sheets("Orderbook")
         self.__orderbook_sheet.range("a1:c2").merge()
         self.__orderbook_sheet.range("f1:g1").merge()
         self.__orderbook_sheet.range("a1:c2").value = [
@@ -102,15 +187,16 @@ class ExcelManager:
             "Quantity\n(Lot size x No. of lots)", "Price", "Order Type",
             "Status\n(SUCCESS/REJECTED/CANCELLED)"
         ]
+        if self.__accounts != None:
+            self.__orderbook_sheet.range("k4").value = "Account"
 
-        clear_values = [[i+1, '', '', '', '', '', '', '', '', ''] for i in range(250)]
-        self.__orderbook_sheet.range(f"a5:j{254}").value = clear_values
+        clear_values = [[i+1, '', '', '', '', '', '', '', '', '', ''] for i in range(250)]
+        self.__orderbook_sheet.range(f"a5:k{254}").value = clear_values
 
         # ==========================================================================
 
         # Profile SHEET SETUP
         # ==========================================================================
-        self.__profile_sheet = self.__workbook.sheets("Profile")
         self.__profile_sheet.range("a1:c2").merge()
         self.__profile_sheet.range("f1:g1").merge()
         self.__profile_sheet.range("a1:c2").value = [
@@ -123,20 +209,83 @@ class ExcelManager:
             ["User ID"], ["Cash Margin"], ["Credits"], ["Exposure Margin"], ['Net'], ['Gross Exposure Value']
         ]
         # ==========================================================================
-        self.logger.info("EXCEL FILE INITIALIZED AND LOADED SUCCESSFULLY")
+
+        # Metrics SHEET SETUP
+        # ==========================================================================
+        self.__metrics_sheet.range("a1:c2").merge()
+        self.__metrics_sheet.range("f1:g1").merge()
+        self.__metrics_sheet.range("a1:c2").value = [
+            "ALICE BLUE TERMINAL"
+        ]
+        self.__metrics_sheet.range("f1:g1").value = [
+            "LATENCY METRICS"
+        ]
+        self.__metrics_sheet.range("a4:g4").value = [
+            "S.No", "Stage", "Samples", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)"
+        ]
+        self.__metrics_sheet.range(f"a5:a{4 + len(LATENCY_STAGES)}").value = [[i+1] for i in range(len(LATENCY_STAGES))]
+        # ==========================================================================
+
+        # Bars SHEET SETUP
+        # ==========================================================================
+        self.__bars_sheet.range("a1:c2").merge()
+        self.__bars_sheet.range("a1:c2").value = [
+            "ALICE BLUE TERMINAL"
+        ]
+        self.__bars_sheet.range("e1").value = "Timeframe (min)"
+        if self.__bars_sheet.range("f1").value not in settings.BAR_TIMEFRAMES:
+            self.__bars_sheet.range("f1").value = settings.BAR_TIMEFRAMES[0]
+        self.__bars_sheet.range("h1").value = f"Candles of the marketwatch rows, current one first. Timeframe : {' / '.join(str(x) for x in settings.BAR_TIMEFRAMES)}"
+        bar_headers = ["S.No.", "Trading Symbol"]
+        for i in range(settings.BARS_IN_SHEET):
+            bar_headers += [f"{name} [{-i}]" for name in ["Open", "High", "Low", "Close", "Volume"]]
+        self.__bars_sheet.range((4, 1), (4, len(bar_headers))).value = bar_headers
+        self.__bars_sheet.range(f"a5:a{5 + settings.MAX_TOKENS_IN_MARKETWATCH}").value = [[x] for x in range(settings.MAX_TOKENS_IN_MARKETWATCH)]
+        # ==========================================================================
+
+        # OptionChain SHEET SETUP
+        # ==========================================================================
+        self.__option_chain_sheet.range("a1:c2").merge()
+        self.__option_chain_sheet.range("a1:c2").value = [
+            "ALICE BLUE TERMINAL"
+        ]
+        self.__option_chain_sheet.range("a3:a5").value = [["Exchange"], ["Underlying"], ["Expiry"]]
+        if self.__option_chain_sheet.range("b3").value in [None, ""]:
+            self.__option_chain_sheet.range("b3").value = "NFO"
+        self.__option_chain_sheet.range("d3:d4").value = [["Underlying LTP"], ["Days to expiry"]]
+        self.__option_chain_sheet.range("g3").value = "Underlying is the Symbol column of the master contracts (e.g. NIFTY), options are priced on its nearest future"
+        option_fields = ["LTP", "IV (%)", "Delta", "Gamma", "Theta", "Vega"]
+        self.__option_chain_sheet.range("a7:o7").value = (
+            ["CE Trading Symbol"] + [f"CE {x}" for x in option_fields] + ["Strike"] +
+            [f"PE {x}" for x in option_fields] + ["PE Trading Symbol"]
+        )
+        # ==========================================================================
 
         # Instruments SHEET SETUP
         # ==========================================================================
-        self.__instrument_sheet = self.__workbook.sheets("Instruments")
-        self.__instrument_sheet["A1"].options(pd.DataFrame, header=1, index=True, expand='table').value = self.__broker.instruments
+        self.__instrument_sheet.clear_contents()    # Drops the full master written by older versions
+        self.__instrument_sheet.range("a1:c2").merge()
+        self.__instrument_sheet.range("a1:c2").value = [
+            "ALICE BLUE TERMINAL"
+        ]
+        self.__instrument_sheet.range("a3:j3").value = [
+            "Exchange", "NSE", "Symbol prefix", None, "Expiry", None, "Page", 1, "Matches", None
+        ]
+        self.__instrument_sheet.range("l3").value = f"Set the filter in b3 / d3 / f3, {settings.INSTRUMENTS_PAGE_SIZE} matching instruments are shown per page"
+        self.__instrument_sheet.range((5, 1), (5, len(CONTRACT_COLUMNS))).value = CONTRACT_COLUMNS
+        # ==========================================================================
+        self.logger.info("EXCEL FILE INITIALIZED AND LOADED SUCCESSFULLY")
         return
 
     def update_profile(self):
         """
         Update Profile Page
         """
-        user_id, cash_margin, credits, exposure_margin, net, gross_exposure_value = self.__broker.get_margin()
-        self.__profile_sheet.range("b3:b8").value = [[user_id], [cash_margin], [credits], [exposure_margin], [net], [gross_exposure_value]]
+        profile = [[x] for x in self.__broker.get_margin()]  # [user_id, cash_margin, credits, exposure_margin, net, gross_exposure_value]
+        if profile == self.__written_profile:
+            return
+        self.__profile_sheet.range("b3:b8").value = profile
+        self.__written_profile = profile
 
     def close_excel(self):
         self.RUN_FLAG = 0
@@ -146,29 +295,47 @@ class ExcelManager:
         """
         Updates order book for any new orders
         """
+        if self.__accounts != None:
+            orderbook = self.__accounts.get_orderbook_rows()    # Orders of all the accounts with their account name
+            l = len(orderbook)
+            if l == 0:
+                return
+            self.__orderbook_sheet.range(f"b5:k{4+l}").value = orderbook
+            return
         orderbook = self.__broker.get_orderbook()
         l = len(orderbook)
-        x = self.__broker
-        for i in range(len(orderbook)):
-            oid = orderbook[i][1] 
-            orderbook[i][8] = self.__broker.get_status(oid)
+        if l == 0:
+            return
+        orderbook = [x[:8] + [self.__broker.get_status(x[1])] for x in orderbook]   # Status is read from the broker's status cache
         self.__orderbook_sheet.range(f"b5:j{4+l}").value = orderbook
 
-    def place_orders(self, instrument_names):
-        orders = self.__marketwatch_sheet.range(f"m5:x{settings.MAX_TOKENS_IN_MARKETWATCH + 5}").value
+    def place_orders(self, instrument_names, shard=None):
+        """
+        Dispatches user actions of new or changed order rows of a marketwatch block (the first by default)
+        and writes back the positions in one range write
+        """
+        shard = shard if shard != None else self.__shards[0]
+        orders = shard.read_column("m", "x")
+        accounts = shard.read_accounts() if self.__accounts != None else None
         # [Transaction type, Product Type, Limit Price, Quantity, Stoploss, Target, Below or Above, Future Price, Entry Action, Order ID, Last Action, Exit Action]
+        processed_rows = set()
         for row_no in range(len(orders)):
             order = orders[row_no]
+            row_snapshot = tuple(order)
+            if row_snapshot == shard.order_entry_snapshots[row_no]:    # Row not edited since the last cycle
+                continue
+            shard.order_entry_snapshots[row_no] = row_snapshot
+
             current_action = ""
             if order[8] in ["EXECUTE", "execute"]:
-                current_action = order[8]
+                current_action = "EXECUTE"
             elif order[11] in ["MODIFY", "EXIT", "CANCEL"]:
                 current_action = order[11]
             else:
                 continue
 
-            self.__broker.order_management(
-                row_id=row_no,
+            order_params = dict(
+                row_id=shard.first_row + row_no,
                 instrument_name=instrument_names[row_no],
                 transaction_type=order[0],
                 product_type=order[1],
@@ -180,57 +347,183 @@ class ExcelManager:
                 future_price=order[7],
                 action=current_action
             )
-            positions = self.__broker.get_positions()[row_no]
-            self.__marketwatch_sheet.range(f"u{5+row_no}:x{5+row_no}").value = positions
+            if self.__accounts != None:
+                self.__accounts.order_management(accounts[row_no], **order_params)  # Every account of the row in parallel
+            else:
+                self.__broker.order_management(**order_params)
+            processed_rows.add(row_no)
+
+        # [Entry Action, Order ID, Last Action, Exit Action, Exit Latency]
+        # Action cells are cleared on processed rows and written back as read on the others
+        positions = (self.__accounts or self.__broker).get_positions()[shard.first_row:shard.first_row + shard.rows]
+        exit_latencies = (self.__accounts or self.__broker).get_exit_latencies()[shard.first_row:shard.first_row + shard.rows]
+        block = []
+        changed_rows = []
+        for row_no in range(len(orders)):
+            position = positions[row_no]
+            written = (position[1], position[2], exit_latencies[row_no])
+            if row_no in processed_rows:
+                block.append([position[0], position[1], position[2], position[3], exit_latencies[row_no]])
+            else:
+                block.append([orders[row_no][8], position[1], position[2], orders[row_no][11], exit_latencies[row_no]])
+            if row_no in processed_rows or written != shard.written_positions[row_no]:
+                changed_rows.append(row_no)
+                shard.written_positions[row_no] = written
+
+        # One range per run of consecutive changed rows, rows in between are not written back over the user's edits
+        first = None
+        for i, row_no in enumerate(changed_rows):
+            if first == None:
+                first = row_no
+            if i + 1 == len(changed_rows) or changed_rows[i + 1] != row_no + 1:
+                shard.sheet.range(shard.get_address("u", "y", first, row_no)).value = block[first:row_no + 1]
+                first = None
+
+    def refresh_marketwatch(self, shard=None):
+        """
+        One refresh cycle of a marketwatch block (the first by default) : resolves the symbols, updates subscriptions
+        of all the blocks and writes the ticker values. Returns the instrument names of the rows of the block.
+        """
+        shard = shard if shard != None else self.__shards[0]
+        shard.refreshed_at = perf_counter()
+        instrument_names = shard.read_column("b", "b")
+        ins = []
+        for x in instrument_names:
+            if self.__broker.check_if_trading_symbol_exists(x):
+                ins.append(self.__broker.get_instrument_name(x))
+            else:
+                ins.append("")
+        shard.instrument_names = ins
+        self.update_suggestions(shard, instrument_names)
+
+        self.__broker.update_subscriptions(self.get_instrument_names())    # Only the symbols added or removed are (un)subscribed
+
+        tick_time = self.__broker.latency_metrics.take_tick_time()  # Oldest tick which will be on the sheet after this write
+        ticker_values = self.__broker.get_ticker_values(ins)
+        write_start = perf_counter()
+        shard.ticker_writer.write(ticker_values)  # Writes only the cells changed since the last cycle
+        write_end = perf_counter()
+        self.__broker.latency_metrics.record("sheet_write", write_end - write_start)
+        self.__broker.latency_metrics.record_since("tick_to_sheet", tick_time, write_end)
+
+        if settings.INDICATOR_COLUMNS:
+            shard.indicator_writer.write(self.__broker.get_indicator_values(ins, ticker_values))
+        return ins
+
+    def update_suggestions(self, shard, trading_symbols):
+        """
+        Writes the trading symbols close to every symbol of column b which cannot be found, in the suggestions column of the block.
+        Written only when a suggestion changed.
+        """
+        suggestions = [
+            ", ".join(self.__broker.get_symbol_suggestions(x)) if y == "" and x not in [None, ""] else None
+            for x, y in zip(trading_symbols, shard.instrument_names)
+        ]
+        if suggestions == shard.written_suggestions:
+            return
+        shard.sheet.range((shard.top_row, SUGGESTIONS_COLUMN), (shard.top_row + shard.rows - 1, SUGGESTIONS_COLUMN)).value = [[x] for x in suggestions]
+        shard.written_suggestions = suggestions
+
+    def update_bars(self, instrument_names):
+        """
+        Writes the last BARS_IN_SHEET candles of every marketwatch row to the Bars sheet every BARS_REFRESH_TIME seconds.
+        Timeframe is read from f1.
+        """
+        if self.__bars_sheet == None or perf_counter() - self.__bars_published_at < settings.BARS_REFRESH_TIME:
+            return
+        self.__bars_published_at = perf_counter()
+        try:
+            minutes = int(self.__bars_sheet.range("f1").value)
+        except (TypeError, ValueError):
+            minutes = settings.BAR_TIMEFRAMES[0]
+        if instrument_names != self.__bars_instrument_names:
+            symbols = [[self.__broker.get_trading_symbol(x) if x != "" else None] for x in instrument_names]
+            self.__bars_sheet.range(f"b5:b{4 + len(symbols)}").value = symbols
+            self.__bars_instrument_names = list(instrument_names)
+        self.__bars_writer.write(self.__broker.get_bar_values(instrument_names, minutes, settings.BARS_IN_SHEET))  # Writes only the changed cells
+
+    def update_metrics(self):
+        """
+        Writes the latency percentiles to the Metrics sheet every LATENCY_METRICS_PUBLISH_TIME seconds
+        """
+        if self.__metrics_sheet == None or perf_counter() - self.__metrics_published_at < settings.LATENCY_METRICS_PUBLISH_TIME:
+            return
+        self.__metrics_published_at = perf_counter()
+        summary = self.__broker.get_latency_summary()
+        self.__metrics_sheet.range(f"b5:g{4 + len(summary)}").value = summary
+
+    def update_instruments(self):
+        """
+        Reads the filter (exchange, symbol prefix, expiry, page) of the Instruments sheet every INSTRUMENTS_REFRESH_TIME seconds
+        and writes the matching page of the master contracts when it changed
+        """
+        if self.__instrument_sheet == None or perf_counter() - self.__instruments_read_at < settings.INSTRUMENTS_REFRESH_TIME:
+            return
+        self.__instruments_read_at = perf_counter()
+        exchange, _, prefix, _, expiry, _, page = self.__instrument_sheet.range("b3:h3").value
+        try:
+            page = int(page)
+        except (TypeError, ValueError):
+            page = 1
+        exchange = str(exchange).strip().upper() if exchange not in [None, ""] else None
+        prefix = str(prefix).strip().upper() if prefix not in [None, ""] else ""
+        instruments_filter = (exchange, prefix, parse_expiry(expiry), page)
+        if instruments_filter == self.__instruments_filter:
+            return
+
+        matches, page, rows = self.__broker.search_instruments(*instruments_filter[:3], page, settings.INSTRUMENTS_PAGE_SIZE)
+        rows += [[None] * len(CONTRACT_COLUMNS) for i in range(settings.INSTRUMENTS_PAGE_SIZE - len(rows))]  # Clears the rows of the previous page
+        self.__instrument_sheet.range((6, 1), (5 + settings.INSTRUMENTS_PAGE_SIZE, len(CONTRACT_COLUMNS))).value = rows
+        self.__instrument_sheet.range("h3:j3").value = [page, "Matches", matches]
+        self.__instruments_filter = instruments_filter[:3] + (page,)
+
+    def update_option_chain(self):
+        """
+        Writes the strikes around the ATM strike with their IV and greeks to the OptionChain sheet every OPTION_CHAIN_REFRESH_TIME seconds.
+        Underlying and expiry are read from b3:b5, the chain is cleared and unsubscribed when either is blank.
+        """
+        if self.__option_chain_sheet == None or perf_counter() - self.__option_chain_published_at < settings.OPTION_CHAIN_REFRESH_TIME:
+            return
+        self.__option_chain_published_at = perf_counter()
+        exchange, underlying, expiry = self.__option_chain_sheet.range("b3:b5").value
+        expiry = parse_expiry(expiry)
+        if underlying in [None, ""] or expiry == None:
+            self.__broker.clear_option_chain()
+        else:
+            self.__broker.select_option_chain(exchange, str(underlying).strip().upper(), expiry)
 
-        all_positions = [[x[1], x[2]] for x in self.__broker.get_positions()]
-        self.__marketwatch_sheet.range(f"v5:w{4 + settings.MAX_TOKENS_IN_MARKETWATCH}").value = all_positions
+        symbols, values, underlying_price = self.__broker.get_option_chain_values()
+        if symbols != self.__option_chain_symbols:
+            self.__option_chain_sheet.range(f"a8:a{7 + len(symbols)}").value = [[x[0]] for x in symbols]
+            self.__option_chain_sheet.range(f"o8:o{7 + len(symbols)}").value = [[x[1]] for x in symbols]
+            self.__option_chain_symbols = symbols
+        header = (underlying_price, (expiry - pd.Timestamp.now().date()).days if expiry != None else None)
+        if header != self.__option_chain_header:
+            self.__option_chain_sheet.range("e3:e4").value = [[header[0]], [header[1]]]
+            self.__option_chain_header = header
+        self.__option_chain_writer.write(values.round(4))   # Writes only the changed cells
 
     def update_marketwatch(self):
         order_flag = 0
         while True:
             if self.RUN_FLAG == 0:
                 return
-            instrument_names = self.__marketwatch_sheet.range(f"b5:b{settings.MAX_TOKENS_IN_MARKETWATCH + 5}").value
-            ins = []
-            for x in instrument_names:
-                if self.__broker.check_if_trading_symbol_exists(x):
-                    ins.append(self.__broker.get_instrument_name(x))
-                else:
-                    ins.append("")
-
-            new_subscriptions = []
-            remove_subscriptions = []
-            
-            for name in self.__broker.subscribed_list.keys():
-                if name not in ins:
-                    remove_subscriptions.append(name)
-
-            for name in instrument_names:
-                if name != None and name != "" and self.__broker.check_if_trading_symbol_exists(name):
-                    n = self.__broker.get_instrument_name(name)
-                    if n not in self.__broker.subscribed_list.keys():
-                        new_subscriptions.append(n)
-            
-            if new_subscriptions != []:
-                self.__broker.subscribe_tokens(new_subscriptions)
-            # if remove_subscriptions != []:
-            #     self.__broker.unsubscribe_tokens(remove_subscriptions)
-
-            self.__broker.subscribed_list = {}
-            for name in instrument_names:
-                if name != None and name != "" and self.__broker.check_if_trading_symbol_exists(name):
-                    n = self.__broker.get_instrument_name(name)
-                    self.__broker.subscribed_list[n] = 1
-
-            ticker_values = self.__broker.get_ticker_values(ins)
-            no_of_records = len(ticker_values)
-            self.__marketwatch_sheet.range(f"c5:l{no_of_records + 5}").value = ticker_values
+            cycle_start = perf_counter()
 
             # Check order placements
             order_flag = (order_flag + 1)%1
+            for shard in self.__shards:     # Blocks whose refresh time has elapsed
+                if not shard.is_due(cycle_start):
+                    continue
+                ins = self.refresh_marketwatch(shard)
+                if order_flag == 0:
+                    self.place_orders(ins, shard)
             if order_flag == 0:
-                self.place_orders(ins)
                 self.update_orderbook()
                 self.update_profile()
-            sleep(settings.MARKETWATCH_REFRESH_TIME)
\ No newline at end of file
+            self.__broker.latency_metrics.record("marketwatch_cycle", perf_counter() - cycle_start)
+            self.update_metrics()
+            self.update_bars(self.get_instrument_names())
+            self.update_option_chain()
+            self.update_instruments()
+            sleep(settings.MARKETWATCH_REFRESH_TIME)
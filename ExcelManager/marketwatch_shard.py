@@ -0,0 +1,49 @@
+from ExcelManager.diff_writer import DiffWriter
+
+SUGGESTIONS_COLUMN = 26    # Column z, next to the marketwatch block
+ACCOUNTS_COLUMN = 27    # Column aa, accounts a row is traded on when MULTI_ACCOUNT is set
+INDICATOR_LEFT_COLUMN = 28  # Column ab, after the accounts
+
+
+class MarketwatchShard:
+    """
+    Block of the marketwatch rows first_row to first_row + rows - 1 (numbered across all the blocks),
+    shown on a sheet from top_row and refreshed every refresh_time seconds
+    """
+    def __init__(self, sheet, first_row, rows, top_row=5, refresh_time=0):
+        self.sheet = sheet
+        self.first_row = first_row
+        self.rows = rows
+        self.top_row = top_row
+        self.refresh_time = refresh_time
+        self.refreshed_at = None    # Time of the last refresh
+        self.instrument_names = ["" for i in range(rows)]   # Instrument names of the rows at the last refresh, "" if not found
+        self.ticker_writer = DiffWriter(sheet, top_row=top_row, left_column=3)  # Ticker values block starting at column c
+        self.indicator_writer = DiffWriter(sheet, top_row=top_row, left_column=INDICATOR_LEFT_COLUMN)    # Indicator block starting at column ab
+        self.order_entry_snapshots = [None for i in range(rows)]    # Order entry cells (m:x) of each row as last read
+        self.written_positions = [None for i in range(rows)]    # (Order ID, Last Action, Exit Latency) of each row as last written
+        self.written_suggestions = None     # Suggestions column as last written
+
+    def is_due(self, now):
+        return self.refreshed_at == None or now - self.refreshed_at >= self.refresh_time
+
+    def get_address(self, first_column, last_column, first=0, last=None):
+        """
+        Returns the address of the given columns (letters) over the rows first to last of the block (all by default)
+        """
+        last = self.rows - 1 if last == None else last
+        return f"{first_column}{self.top_row + first}:{last_column}{self.top_row + last}"
+
+    def read_column(self, first_column, last_column):
+        """
+        Returns the values of the columns with one entry per row, also for a block of one row
+        """
+        values = self.sheet.range(self.get_address(first_column, last_column)).value
+        return values if self.rows > 1 else [values]
+
+    def read_accounts(self):
+        """
+        Returns the Accounts cell of every row
+        """
+        values = self.sheet.range((self.top_row, ACCOUNTS_COLUMN), (self.top_row + self.rows - 1, ACCOUNTS_COLUMN)).value
+        return values if self.rows > 1 else [values]
@@ -0,0 +1,186 @@
+import os
+import json
+import logging
+from datetime import datetime
+from time import sleep, perf_counter
+
+import settings
+from Broker.alice_blue import Broker
+from Broker.tick_store import TICK_FIELDS
+from Headless.order_source import FileOrderSource, SocketOrderSource
+
+
+class HeadlessManager:
+    """
+    Runs the broker engine without excel. Marketwatch symbols and order rows come from a watched file or a local socket API,
+    ticks, positions, order book and profile are published to a JSON file (and the socket API) instead of the sheets.
+    """
+    def __init__(self, broker=None, source=None):
+        """
+        broker : Broker object to use instead of creating one
+        source : FileOrderSource or SocketOrderSource, chosen from HEADLESS_SOURCE if not given
+        """
+        self.logger = self.get_logger()
+        self.__broker = broker if broker != None else Broker()  # Broker Object
+        self.__source = source if source != None else self.get_source()
+
+        self.RUN_FLAG = 1
+        self.__order_entry_snapshots = [None for i in range(settings.MAX_TOKENS_IN_MARKETWATCH)]  # Order cells of each row as last read
+        self.__snapshots_seeded = False     # Set after the first read, actions found then were sent by an earlier run
+        self.__published_at = perf_counter() - settings.HEADLESS_PUBLISH_TIME   # Time of the last snapshot publish
+
+    def get_logger(self):
+        """
+        Creates Headless logger object
+        """
+        logger = logging.getLogger('Headless Logger')
+        logger.setLevel(logging.DEBUG)
+        stream_handler = logging.StreamHandler()
+        file_handler = logging.FileHandler(os.path.join(settings.BROKER_LOGS_FOLDER, "headless.log"))
+        stream_handler.setLevel(logging.DEBUG)
+        file_handler.setLevel(logging.DEBUG)
+        stream_format = logging.Formatter('%(name)s - %(levelname)s - %(message)s')
+        file_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        stream_handler.setFormatter(stream_format)
+        file_handler.setFormatter(file_format)
+        logger.addHandler(stream_handler)
+        logger.addHandler(file_handler)
+        logger.info("logger initialized")
+        return logger
+
+    def get_source(self):
+        if settings.HEADLESS_SOURCE == "SOCKET":
+            self.logger.info(f"Order rows read from the socket API on {settings.HEADLESS_SOCKET_HOST}:{settings.HEADLESS_SOCKET_PORT}")
+            return SocketOrderSource(settings.HEADLESS_SOCKET_HOST, settings.HEADLESS_SOCKET_PORT, settings.MAX_TOKENS_IN_MARKETWATCH)
+        self.logger.info(f"Order rows read from {settings.HEADLESS_ORDERS_FILE}")
+        return FileOrderSource(settings.HEADLESS_ORDERS_FILE, settings.MAX_TOKENS_IN_MARKETWATCH)
+
+    def run(self):
+        self.__source.start()
+        while self.RUN_FLAG == 1:
+            cycle_start = perf_counter()
+            ins = self.refresh()
+            self.__broker.latency_metrics.record("marketwatch_cycle", perf_counter() - cycle_start)
+            if perf_counter() - self.__published_at >= settings.HEADLESS_PUBLISH_TIME:
+                self.publish(ins)
+            sleep(settings.MARKETWATCH_REFRESH_TIME)
+
+    def close(self):
+        self.RUN_FLAG = 0
+        self.__source.close()
+
+    def refresh(self):
+        """
+        One cycle : resolves the symbols, updates subscriptions and dispatches new or changed order rows.
+        Returns the instrument names of the rows.
+        """
+        symbols, orders = self.__source.read()
+        ins = []
+        for x in symbols:
+            if self.__broker.check_if_trading_symbol_exists(x):
+                ins.append(self.__broker.get_instrument_name(x))
+            else:
+                ins.append("")
+        self.__broker.update_subscriptions(ins)
+        self.place_orders(ins, orders)
+        return ins
+
+    def place_orders(self, instrument_names, orders):
+        """
+        Dispatches user actions of new or changed order rows, same rules as the Marketwatch sheet
+        """
+        if not self.__snapshots_seeded:
+            self.__snapshots_seeded = True
+            skipped = 0
+            for row_no in range(len(orders)):
+                self.__order_entry_snapshots[row_no] = tuple(orders[row_no])
+                if orders[row_no][8] in ["EXECUTE", "execute"] or orders[row_no][11] in ["MODIFY", "EXIT", "CANCEL"]:
+                    skipped += 1
+            if skipped:
+                self.logger.warning(f"{skipped} rows already hold an action at startup and are not sent again, clear and set the action to send it")
+            return
+
+        processed_rows = []
+        for row_no in range(len(orders)):
+            order = orders[row_no]
+            row_snapshot = tuple(order)
+            previous = self.__order_entry_snapshots[row_no]
+            if row_snapshot == previous:
+                continue
+            self.__order_entry_snapshots[row_no] = row_snapshot
+
+            # Actions fire when they are set, a file keeps them written so an action read again is not sent again
+            if order[8] in ["EXECUTE", "execute"] and (previous == None or previous[8] not in ["EXECUTE", "execute"]):
+                current_action = "EXECUTE"
+            elif order[11] in ["MODIFY", "EXIT", "CANCEL"] and (previous == None or previous[11] != order[11]):
+                current_action = order[11]
+            else:
+                continue
+
+            self.__broker.order_management(
+                row_id=row_no,
+                instrument_name=instrument_names[row_no],
+                transaction_type=order[0],
+                product_type=order[1],
+                limit_price=order[2],
+                quantity=order[3],
+                stoploss=order[4],
+                target=order[5],
+                below_or_above=order[6],
+                future_price=order[7],
+                action=current_action
+            )
+            processed_rows.append(row_no)
+        if processed_rows:
+            self.__source.clear_actions(processed_rows)
+
+    def get_snapshot(self, instrument_names):
+        """
+        Returns ticks and positions of the rows with an instrument, order book, profile and latency metrics
+        """
+        ticker_values = self.__broker.get_ticker_values(instrument_names)
+        indicator_values = self.__broker.get_indicator_values(instrument_names, ticker_values)
+        positions = self.__broker.get_positions()
+        exit_latencies = self.__broker.get_exit_latencies()
+        rows = []
+        for row_no, instrument_name in enumerate(instrument_names):
+            if instrument_name in ["", None] and positions[row_no][1] == None:
+                continue
+            row = {"row": row_no, "symbol": self.__broker.get_trading_symbol(instrument_name) if instrument_name not in ["", None] else None}
+            for field, value in zip(TICK_FIELDS, ticker_values[row_no]):
+                row[field] = None if value != value else float(value)  # NaN : no tick yet
+            for column, value in zip(settings.INDICATOR_COLUMNS, indicator_values[row_no]):
+                row[column] = None if value != value else float(value)
+            row.update({
+                "entry_action": positions[row_no][0],
+                "order_id": positions[row_no][1],
+                "last_action": positions[row_no][2],
+                "exit_action": positions[row_no][3],
+                "exit_latency_ms": exit_latencies[row_no]
+            })
+            rows.append(row)
+
+        orderbook = [x[:8] + [self.__broker.get_status(x[1])] for x in self.__broker.get_orderbook()]
+        profile = self.__broker.get_margin()
+        return {
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "rows": rows,
+            "orderbook": orderbook,
+            "profile": dict(zip(["user_id", "cash_margin", "credits", "exposure_margin", "net", "gross_exposure_value"], profile)),
+            "latency": self.__broker.get_latency_summary()
+        }
+
+    def publish(self, instrument_names):
+        """
+        Writes the snapshot to HEADLESS_OUTPUT_FILE (replaced atomically) and hands it to the socket API
+        """
+        self.__published_at = perf_counter()
+        snapshot = self.get_snapshot(instrument_names)
+        self.__source.publish(snapshot)
+        tmp_file = settings.HEADLESS_OUTPUT_FILE + ".tmp"
+        try:
+            with open(tmp_file, 'w') as file:
+                json.dump(snapshot, file, default=str)
+            os.replace(tmp_file, settings.HEADLESS_OUTPUT_FILE)
+        except OSError as e:
+            self.logger.error(f"Snapshot could not be written, {e}")
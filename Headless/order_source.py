@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import threading
+import socketserver
+
+# Fields of one marketwatch row, same order as the Marketwatch sheet (b and m:x)
+ROW_FIELDS = [
+    "symbol", "transaction_type", "product_type", "limit_price", "quantity", "stoploss", "target",
+    "below_or_above", "future_price", "entry_action", "order_id", "last_action", "exit_action"
+]
+INPUT_FIELDS = [field for field in ROW_FIELDS if field not in ["order_id", "last_action"]]     # Written by the engine, never read
+
+
+def parse_cell(value):
+    """
+    Returns None for empty cells, a float for numbers and the stripped string otherwise, as xlwings reads the sheet
+    """
+    if value in [None, ""]:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    if value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def to_rows(records, max_rows):
+    """
+    Converts row records ({field: value}) to (symbols, orders) in the layout read from the Marketwatch sheet
+    """
+    symbols = [None for i in range(max_rows)]
+    orders = [[None] * 12 for i in range(max_rows)]
+    for row_no, record in enumerate(records[:max_rows]):
+        if record == None:
+            continue
+        symbols[row_no] = parse_cell(record.get("symbol"))
+        orders[row_no] = [None if field in ["order_id", "last_action"] else parse_cell(record.get(field)) for field in ROW_FIELDS[1:]]
+    return symbols, orders
+
+
+class FileOrderSource:
+    """
+    Marketwatch rows from a CSV (header with INPUT_FIELDS) or JSON (list of row objects) file, re-read whenever it is modified.
+    Row number is the position of the row in the file.
+    """
+    def __init__(self, path, max_rows):
+        self.path = path
+        self.max_rows = max_rows
+        self.modified_time = None
+        self.rows = to_rows([], max_rows)
+
+    def start(self):
+        if not os.path.exists(self.path):     # Empty template to fill in
+            with open(self.path, 'w', newline='') as file:
+                csv.writer(file).writerow(INPUT_FIELDS)
+
+    def read(self):
+        """
+        Returns (symbols, orders) of the rows, parsed again only if the file changed since the last call
+        """
+        try:
+            modified_time = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self.rows
+        if modified_time == self.modified_time:
+            return self.rows
+        try:
+            with open(self.path, newline='') as file:
+                if self.path.lower().endswith(".json"):
+                    records = json.load(file)
+                else:
+                    records = list(csv.DictReader(file))
+        except (OSError, ValueError):   # File being written, read again next cycle
+            return self.rows
+        self.modified_time = modified_time
+        self.rows = to_rows(records, self.max_rows)
+        return self.rows
+
+    def clear_actions(self, row_nos):
+        """
+        Action cells of a file are left as written, HeadlessManager sends an action again only once it is cleared and set again
+        """
+        pass
+
+    def publish(self, snapshot):
+        pass
+
+    def close(self):
+        pass
+
+
+class OrderRequestHandler(socketserver.StreamRequestHandler):
+    """
+    One JSON command per line, one JSON reply per line
+
+    {"action": "set", "row": 0, "values": {"symbol": "SBIN-EQ", "transaction_type": "BUY", ..., "entry_action": "EXECUTE"}}
+    {"action": "clear", "row": 0}
+    {"action": "snapshot"} : latest ticks, positions, order book and profile
+    """
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.order_source.handle_command(json.loads(line))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                reply = {"stat": "Not_Ok", "Emsg": str(e)}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class SocketOrderSource:
+    """
+    Marketwatch rows set through a local TCP socket API. Action cells are cleared once processed as on the sheet.
+    """
+    def __init__(self, host, port, max_rows):
+        self.host = host
+        self.port = port
+        self.max_rows = max_rows
+        self.records = [None for i in range(max_rows)]    # {field: value} per row
+        self.snapshot = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), OrderRequestHandler)
+        self.server.daemon_threads = True
+        self.server.order_source = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle_command(self, command):
+        action = command["action"]
+        if action == "snapshot":
+            with self.lock:
+                return self.snapshot
+        row_no = int(command["row"])
+        if row_no < 0 or row_no >= self.max_rows:
+            raise IndexError(f"Row {row_no} out of range (0 to {self.max_rows - 1})")
+        with self.lock:
+            if action == "set":
+                record = dict(self.records[row_no] or {})
+                record.update({field: value for field, value in command["values"].items() if field in INPUT_FIELDS})
+                self.records[row_no] = record
+            elif action == "clear":
+                self.records[row_no] = None
+            else:
+                raise KeyError(f"Unknown action {action}")
+        return {"stat": "Ok"}
+
+    def read(self):
+        with self.lock:
+            return to_rows(self.records, self.max_rows)
+
+    def clear_actions(self, row_nos):
+        with self.lock:
+            for row_no in row_nos:
+                if self.records[row_no] != None:
+                    self.records[row_no]["entry_action"] = None
+                    self.records[row_no]["exit_action"] = None
+
+    def publish(self, snapshot):
+        with self.lock:
+            self.snapshot = snapshot
+
+    def close(self):
+        if self.server != None:
+            self.server.shutdown()
@@ -0,0 +1,100 @@
+import sys
+import types
+import logging
+
+import numpy as np
+
+try:
+    import xlwings
+except ImportError:     # Benchmarks never open a workbook, the sheets are replaced by FakeSheet
+    sys.modules['xlwings'] = types.ModuleType('xlwings')
+
+import settings
+from Broker.alice_blue import Broker
+from Broker.tick_store import TickStore
+from Broker.trigger_book import TriggerBook
+from Broker.bracket_book import BracketBook
+from Broker.latency_metrics import LatencyMetrics
+from Broker.bar_engine import BarEngine
+
+
+def make_offline_broker(capacity=settings.MAX_TOKENS_IN_MARKETWATCH):
+    """
+    Returns a Broker object with only the in-memory state set up (no login, master contracts or websocket)
+    """
+    broker = Broker.__new__(Broker)
+    broker.logger = logging.getLogger('Benchmark Logger')
+    broker.tick_store = TickStore(capacity)
+    broker.tick_recorder = None
+    broker.above_below_trigger_book = TriggerBook()
+    broker.stoploss_target_bracket_book = BracketBook()
+    broker.latency_metrics = LatencyMetrics(settings.LATENCY_METRICS_WINDOW)
+    broker.bar_engine = BarEngine(settings.BAR_TIMEFRAMES, settings.BAR_HISTORY_LENGTH, capacity)
+    broker.market_data = broker
+    broker.accounts = [broker]
+    return broker
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value at the given fraction of an already sorted list
+    """
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def summarize(timings):
+    """
+    Returns mean / p50 / p99 / max of a list of timings (in sec) in microseconds
+    """
+    timings = sorted(timings)
+    if not timings:
+        return {"count": 0}
+    return {
+        "count": len(timings),
+        "mean_us": round(sum(timings) / len(timings) * 1e6, 2),
+        "p50_us": round(percentile(timings, 0.50) * 1e6, 2),
+        "p99_us": round(percentile(timings, 0.99) * 1e6, 2),
+        "max_us": round(timings[-1] * 1e6, 2)
+    }
+
+
+class FakeRange:
+    """
+    Stand-in for an xlwings Range, reads return the preset value of the address and writes are counted
+    """
+    def __init__(self, sheet, address):
+        self.sheet = sheet
+        self.address = address
+
+    @property
+    def value(self):
+        return self.sheet.values.get(self.address)
+
+    @value.setter
+    def value(self, value):
+        self.sheet.writes += 1
+        if isinstance(value, np.ndarray):
+            self.sheet.cells_written += value.size
+        elif isinstance(value, list):
+            self.sheet.cells_written += sum(len(row) if isinstance(row, list) else 1 for row in value)
+        else:
+            self.sheet.cells_written += 1
+
+    def merge(self):
+        pass
+
+
+class FakeSheet:
+    """
+    Stand-in for an xlwings Sheet
+    """
+    def __init__(self, values=None):
+        self.values = values if values != None else {}  # {address: value returned on read}
+        self.writes = 0
+        self.cells_written = 0
+
+    def range(self, *address):
+        return FakeRange(self, address[0] if len(address) == 1 else address)
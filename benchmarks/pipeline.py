@@ -0,0 +1,243 @@
+"""
+Benchmarks the tick to sheet pipeline against the simulated exchange, without a broker login or excel
+
+- feed_data ingest rate
+- get_ticker_values and marketwatch cycle time at 50 / 250 / 1000 rows
+- above / below and stoploss / target trigger latency with 10 / 1k / 10k pending orders
+- update_orderbook cost against order book size
+
+Usage : python -m benchmarks.pipeline [--output results.json]
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+from datetime import datetime
+from time import perf_counter
+
+import settings
+from benchmarks.common import FakeSheet, summarize
+from Broker.alice_blue import Broker, AboveBelowWaitingQueueElement, StoplossTargetWaitingQueueElement
+from Broker.simulator import SimulatedExchange
+from Broker.trigger_book import TriggerBook
+from Broker.bracket_book import BracketBook
+from ExcelManager.manager import ExcelManager
+
+MARKETWATCH_ROWS = [50, 250, 1000]
+PENDING_ORDERS = [10, 1000, 10000]
+ORDERBOOK_SIZES = [10, 100, 1000, 5000]
+MAX_FALLBACK_SHARE = 0.1    # Share of marketwatch block writes falling back to a whole block write flagged with 10% of the rows ticking
+
+
+def make_broker(rows):
+    """
+    Returns a Broker connected to a SimulatedExchange with the websocket stopped, ticks are fed by hand
+    """
+    settings.BROKER_CONNECTION = "SIMULATOR"
+    settings.MASTER_CONTRACTS_CACHE = 0
+    settings.SUBSCRIPTION_DEBOUNCE_TIME = 0
+    settings.MAX_TOKENS_IN_MARKETWATCH = rows
+    exchange = SimulatedExchange(
+        instruments_per_segment=max(rows, settings.SIMULATOR_INSTRUMENTS_PER_SEGMENT),
+        tick_rate=settings.SIMULATOR_TICK_RATE,
+        fill_latency=settings.SIMULATOR_FILL_LATENCY
+    )
+    broker = Broker(conn=exchange, streaming=False)
+    broker.logger.setLevel(logging.WARNING)     # Order logs would dominate the timings
+    return broker, exchange
+
+
+def get_symbols(exchange, rows):
+    """
+    Returns (trading symbol, token) of the first NSE equities
+    """
+    return [(row[5], row[3]) for row in exchange.contract_rows["NSE"][:rows]]
+
+
+def tick_message(token, ltp):
+    return json.dumps({"t": "df", "tk": str(token), "lp": f"{ltp:.2f}"})
+
+
+def bench_ingest(broker, exchange, symbols, messages):
+    """
+    Rate at which feed_data consumes websocket frames
+    """
+    tokens = [token for _, token in symbols]
+    frames = [json.dumps(exchange.next_tick(tokens[i % len(tokens)])) for i in range(messages)]
+    for frame in frames[:len(tokens)]:  # Warm up, reserves a tick slot for every token
+        broker.feed_data(frame)
+
+    timings = []
+    start = perf_counter()
+    for frame in frames:
+        tick_start = perf_counter()
+        broker.feed_data(frame)
+        timings.append(perf_counter() - tick_start)
+    elapsed = perf_counter() - start
+    result = {"messages": messages, "tokens": len(tokens), "messages_per_sec": round(messages / elapsed, 1)}
+    result.update(summarize(timings))
+    return result
+
+
+def bench_marketwatch(broker, exchange, symbols, rows, cycles):
+    """
+    get_ticker_values and one marketwatch cycle (refresh, order rows, order book, profile) with 10% of the rows ticking between cycles
+    """
+    settings.MAX_TOKENS_IN_MARKETWATCH = rows
+    marketwatch_sheet = FakeSheet({
+        f"b5:b{rows + 4}": [symbol for symbol, _ in symbols[:rows]],
+        f"m5:x{rows + 4}": [[None] * 12 for i in range(rows)]
+    })
+    manager = ExcelManager(broker=broker, run=False)
+    manager.attach_sheets(marketwatch_sheet, FakeSheet(), FakeSheet())
+    ins = manager.refresh_marketwatch()
+    ins = manager.refresh_marketwatch()     # Second cycle applies the subscriptions
+
+    tokens = [token for _, token in symbols[:rows]]
+    ticker_timings = []
+    cycle_timings = []
+    cells_written = 0
+    for cycle in range(cycles):
+        for i in range(max(1, rows // 10)):
+            token = tokens[(cycle * 7 + i * 10) % rows]
+            broker.feed_data(json.dumps(exchange.next_tick(token)))
+
+        start = perf_counter()
+        broker.get_ticker_values(ins)
+        ticker_timings.append(perf_counter() - start)
+
+        cells_before = marketwatch_sheet.cells_written
+        start = perf_counter()
+        ins = manager.refresh_marketwatch()
+        manager.place_orders(ins)
+        manager.update_orderbook()
+        manager.update_profile()
+        cycle_timings.append(perf_counter() - start)
+        cells_written += marketwatch_sheet.cells_written - cells_before
+
+    write_stats = manager.get_write_stats()
+    return {
+        "rows": rows,
+        "get_ticker_values": summarize(ticker_timings),
+        "cycle": summarize(cycle_timings),
+        "cells_written_per_cycle": round(cells_written / cycles, 1),
+        "full_write_fallback_share": write_stats["fallback_share"]     # Block writes with changes written as the whole block
+    }
+
+
+def bench_above_below(broker, symbols, pending, repeats):
+    """
+    Cost of the tick which triggers one above / below order while the book holds the given number of pending orders
+    """
+    broker.above_below_trigger_book = TriggerBook()
+    for i in range(pending):
+        symbol, token = symbols[i % len(symbols)]
+        ltp = broker.tick_store.get_ltp(str(token))
+        below_or_above = "ABOVE" if i % 2 == 0 else "BELOW"
+        future_price = ltp * 2 if below_or_above == "ABOVE" else ltp / 2   # Never reached
+        broker.above_below_trigger_book.add(str(token), AboveBelowWaitingQueueElement(
+            settings.MAX_TOKENS_IN_MARKETWATCH + i, broker.get_instrument_name(symbol), "BUY", "MIS", 0, 1, None, None, below_or_above, future_price
+        ))
+
+    symbol, token = symbols[0]
+    ltp = broker.tick_store.get_ltp(str(token))
+    timings = []
+    for i in range(repeats):
+        broker.add_above_below(AboveBelowWaitingQueueElement(0, broker.get_instrument_name(symbol), "BUY", "MIS", 0, 1, None, None, "ABOVE", ltp + 1))
+        message = tick_message(token, ltp + 1)
+        start = perf_counter()
+        broker.feed_data(message)
+        timings.append(perf_counter() - start)
+        broker.feed_data(tick_message(token, ltp))
+    result = {"pending": pending}
+    result.update(summarize(timings))
+    return result
+
+
+def bench_stoploss_target(broker, symbols, pending, repeats):
+    """
+    Cost of the tick which hits the target of one position while the book holds the given number of armed brackets
+    """
+    broker.stoploss_target_bracket_book = BracketBook()
+    for i in range(pending):
+        symbol, token = symbols[i % len(symbols)]
+        ltp = broker.tick_store.get_ltp(str(token))
+        broker.stoploss_target_bracket_book.add(str(token), StoplossTargetWaitingQueueElement(
+            settings.MAX_TOKENS_IN_MARKETWATCH + i, broker.get_instrument_name(symbol), "BUY", "MIS", 0, 1, ltp / 2, ltp * 2
+        ))
+
+    symbol, token = symbols[0]
+    ltp = broker.tick_store.get_ltp(str(token))
+    timings = []
+    for i in range(repeats):
+        broker.add_stoploss_target(StoplossTargetWaitingQueueElement(0, broker.get_instrument_name(symbol), "BUY", "MIS", 0, 1, ltp - 1, ltp + 1))
+        message = tick_message(token, ltp + 1)
+        start = perf_counter()
+        broker.feed_data(message)
+        timings.append(perf_counter() - start)
+        broker.feed_data(tick_message(token, ltp))
+    result = {"pending": pending}
+    result.update(summarize(timings))
+    return result
+
+
+def bench_orderbook(broker, size, repeats):
+    """
+    Cost of update_orderbook against the number of orders placed in the session.
+    broker : a broker no order was sent with, orders of the trigger benchmarks would still be filling into its order book
+    """
+    broker.order_book = [
+        [datetime.now().strftime("%Y-%m-%d %H-%M-%S"), str(i), "BUY", "MIS", "SIMN00000-EQ", 1, 100.0, "MARKET", ""]
+        for i in range(size)
+    ]
+    orderbook_sheet = FakeSheet()
+    manager = ExcelManager(broker=broker, run=False)
+    manager.attach_sheets(FakeSheet(), orderbook_sheet, FakeSheet())
+    timings = []
+    for i in range(repeats):
+        start = perf_counter()
+        manager.update_orderbook()
+        timings.append(perf_counter() - start)
+    result = {"orders": size, "cells_written_per_call": orderbook_sheet.cells_written // repeats}
+    result.update(summarize(timings))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick to sheet pipeline benchmarks")
+    parser.add_argument("--messages", type=int, default=100000, help="Messages fed for the ingest benchmark")
+    parser.add_argument("--cycles", type=int, default=200, help="Marketwatch cycles per row count")
+    parser.add_argument("--repeats", type=int, default=200, help="Triggers and order book updates per size")
+    parser.add_argument("--output", help="Writes the results to this JSON file as well")
+    args = parser.parse_args()
+
+    max_rows = max(MARKETWATCH_ROWS)
+    broker, exchange = make_broker(max_rows)
+    symbols = get_symbols(exchange, max_rows)
+
+    results = {
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "feed_data": bench_ingest(broker, exchange, symbols, args.messages),
+        "marketwatch": [bench_marketwatch(broker, exchange, symbols, rows, args.cycles) for rows in MARKETWATCH_ROWS],
+        "above_below_trigger": [bench_above_below(broker, symbols, pending, args.repeats) for pending in PENDING_ORDERS],
+        "stoploss_target_trigger": [bench_stoploss_target(broker, symbols, pending, args.repeats) for pending in PENDING_ORDERS],
+    }
+    orderbook_broker, _ = make_broker(max_rows)
+    results["update_orderbook"] = [bench_orderbook(orderbook_broker, size, args.repeats) for size in ORDERBOOK_SIZES]
+    results["warnings"] = [
+        f"{x['rows']} rows : {x['full_write_fallback_share']:.0%} of the block writes fell back to a whole block write with 10% of the rows ticking"
+        for x in results["marketwatch"] if x["full_write_fallback_share"] > MAX_FALLBACK_SHARE
+    ]
+    output = json.dumps(results, indent=4)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    if results["warnings"]:
+        sys.exit("\n".join(results["warnings"]))   # Non zero exit status for scripted runs
+
+
+if __name__ == "__main__":
+    main()
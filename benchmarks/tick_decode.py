@@ -0,0 +1,90 @@
+"""
+Replays a stream of dk/df websocket messages through Broker.feed_data and reports throughput
+
+Usage : python -m benchmarks.tick_decode [--tokens 250] [--messages 200000] [--file recorded_stream.txt]
+"""
+import argparse
+import json
+import random
+from time import perf_counter_ns
+
+from Broker.tick_decoder import get_parser_name
+from benchmarks.common import make_offline_broker, percentile
+
+
+def generate_messages(tokens, count, seed=0):
+    """
+    Returns a synthetic stream : one full dk snapshot per token followed by partial df updates
+    """
+    rng = random.Random(seed)
+    prices = {str(26000 + i): rng.uniform(50, 5000) for i in range(tokens)}
+    messages = []
+    for token, price in prices.items():
+        messages.append(json.dumps({
+            "t": "dk", "e": "NSE", "tk": token, "o": f"{price:.2f}", "h": f"{price * 1.01:.2f}",
+            "l": f"{price * 0.99:.2f}", "c": f"{price:.2f}", "lp": f"{price:.2f}", "v": "1000",
+            "ap": f"{price:.2f}", "bp1": f"{price - 0.05:.2f}", "sp1": f"{price + 0.05:.2f}", "oi": "0"
+        }))
+
+    token_list = list(prices.keys())
+    while len(messages) < count:
+        token = rng.choice(token_list)
+        prices[token] *= 1 + rng.uniform(-0.001, 0.001)
+        price = prices[token]
+        message = {"t": "df", "e": "NSE", "tk": token, "lp": f"{price:.2f}"}
+        if rng.random() < 0.5:
+            message["v"] = str(rng.randint(1000, 100000))
+            message["ap"] = f"{price:.2f}"
+        if rng.random() < 0.7:
+            message["bp1"] = f"{price - 0.05:.2f}"
+            message["sp1"] = f"{price + 0.05:.2f}"
+        messages.append(json.dumps(message))
+    return messages
+
+
+def load_messages(path):
+    """
+    Returns messages from a recorded stream file, one websocket frame per line
+    """
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip() != ""]
+
+
+def run(messages, capacity):
+    """
+    Feeds every message through feed_data and returns the results
+    """
+    broker = make_offline_broker(capacity)
+    feed_data = broker.feed_data
+    timings = []
+    start = perf_counter_ns()
+    for msg in messages:
+        t0 = perf_counter_ns()
+        feed_data(msg)
+        timings.append(perf_counter_ns() - t0)
+    total = perf_counter_ns() - start
+
+    timings.sort()
+    return {
+        "parser": get_parser_name(),
+        "messages": len(messages),
+        "messages_per_sec": round(len(messages) / (total / 1e9), 1),
+        "p50_us": round(percentile(timings, 0.50) / 1000, 3),
+        "p99_us": round(percentile(timings, 0.99) / 1000, 3),
+        "max_us": round(timings[-1] / 1000, 3) if timings else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick decode benchmark")
+    parser.add_argument("--tokens", type=int, default=250)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--file", default=None, help="Recorded stream, one JSON message per line")
+    args = parser.parse_args()
+
+    messages = load_messages(args.file) if args.file else generate_messages(args.tokens, args.messages)
+    print(json.dumps(run(messages, args.tokens), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Replays a recorded tick file through Broker.feed_data at original or accelerated speed
+
+Usage : python -m benchmarks.tick_replay Broker/tick_records/ticks_2024-01-01.bin [--speed 10]
+"""
+import argparse
+import json
+from time import perf_counter
+
+from Broker.tick_recorder import TickReader
+from benchmarks.common import make_offline_broker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorded tick replay")
+    parser.add_argument("file", help="Record file written by the tick recorder")
+    parser.add_argument("--speed", type=float, default=0, help="1 for original pace, 10 for ten times faster, 0 for as fast as possible")
+    parser.add_argument("--tokens", type=int, default=1000)
+    args = parser.parse_args()
+
+    broker = make_offline_broker(args.tokens)
+    reader = TickReader(args.file, broker.logger)
+    start = perf_counter()
+    replayed = reader.replay(broker.feed_data, speed=args.speed)
+    elapsed = perf_counter() - start
+    print(json.dumps({
+        "messages": replayed,
+        "tokens": len(broker.tick_store.slots),
+        "elapsed_sec": round(elapsed, 3),
+        "messages_per_sec": round(replayed / elapsed, 1) if elapsed > 0 else 0
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Repo root on sys.path so the tests import Broker, ExcelManager and settings as main.py does
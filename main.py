@@ -1,5 +1,4 @@
 import settings
-from ExcelManager.manager import ExcelManager
 
 # from googleapiclient.discovery import build
 # from google_auth_oauthlib.flow import InstalledAppFlow
@@ -9,11 +8,14 @@ import sys
 import signal
 
 excel_object = None
+headless_object = None
 
 def signal_handler(sig, frame):
-    global excel_object
+    global excel_object, headless_object
     if excel_object != None:
         excel_object.close_excel()
+    if headless_object != None:
+        headless_object.close()
     print("APPLICATION STOPPED")
     sys.exit(1)
 
@@ -66,5 +68,12 @@ signal.signal(signal.SIGINT, signal_handler)
 #     print("ERROR : ", values_input[0][1])
 #     print("\n\nAPPLICATION STOPPED\n\n")
 
-# CREATES OBJECT OF EXCEL MANAGER WHICH RUNS THE EXCEL OPERATIONS
-excel_object = ExcelManager()
+if "--headless" in sys.argv or settings.RUN_MODE == "HEADLESS":
+    # RUNS THE ENGINE WITHOUT EXCEL, ORDER ROWS FROM A WATCHED FILE OR THE LOCAL SOCKET API
+    from Headless.manager import HeadlessManager
+    headless_object = HeadlessManager()
+    headless_object.run()
+else:
+    # CREATES OBJECT OF EXCEL MANAGER WHICH RUNS THE EXCEL OPERATIONS
+    from ExcelManager.manager import ExcelManager
+    excel_object = ExcelManager()
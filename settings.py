@@ -4,31 +4,78 @@ import json
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BROKER_DIR = os.path.join(BASE_DIR, "Broker")
 BROKER_CREDENTIALS_FILE = os.path.join(BROKER_DIR, "credentials.json")
+BROKER_ACCOUNTS_FILE = os.path.join(BROKER_DIR, "accounts.json")    # [{"user_id", "api_key"}] of the accounts traded next to the main one
 BROKER_LOGS_FOLDER = os.path.join(BROKER_DIR, "logs")
 EXCEL_DIR = os.path.join(BASE_DIR, "ExcelManager")
 EXCEL_LOGS_FOLDER = os.path.join(EXCEL_DIR, "logs")
 EXCEL_FILE = os.path.join(BASE_DIR, "RTP_ALGO.xlsx")
 MASTER_CONTRACTS_DIR = os.path.join(BROKER_DIR, "master_contracts")
+TICK_RECORDS_DIR = os.path.join(BROKER_DIR, "tick_records")
+LATENCY_METRICS_FILE = os.path.join(BROKER_LOGS_FOLDER, "latency_metrics.txt")
 KEYS_FILE = os.path.join(EXCEL_DIR, "newkeys.json")
+HEADLESS_ORDERS_FILE = os.path.join(BASE_DIR, "orders.csv")
+HEADLESS_OUTPUT_FILE = os.path.join(BASE_DIR, "marketwatch.json")
 
 
 spreadsheetidfile=os.path.join(EXCEL_DIR,"spreadsheetid.json")
 # ===========================================================
 # BROKER SETTINGS
+BROKER_CONNECTION = "ALICEBLUE"  # ALICEBLUE for the live account, SIMULATOR for the offline simulated exchange
+SIMULATOR_INSTRUMENTS_PER_SEGMENT = 2000    # Synthetic instruments generated per exchange segment
+SIMULATOR_TICK_RATE = 5000  # Websocket messages per second sent by the simulator
+SIMULATOR_FILL_LATENCY = 0.05   # Time (in sec) after which the simulator fills an order
 MAX_BROKER_LOGIN_ATTEMPT_COUNT = 3  # Maximum login attempts made for the broker
 SLEEP_TIME_BETWEEN_ATTEMPTS = 1   # Time (in sec) for which the process will sleep before retrying
 PAPER_TRADE = 0
-ABOVE_BELOW_SLEEP_TIME = 1  # Time (in sec) for which the process will sleep after checking above below field
-STOPLOSS_TARGET_SLEEP_TIME = 1
 MAX_ORDER_PLACEMENT_RETRIES = 5
+ORDER_DISPATCH_WORKERS = 4  # Threads placing orders in parallel
+MULTI_ACCOUNT = 0   # Set to 1 to also trade the accounts of BROKER_ACCOUNTS_FILE, all sharing the feed of the main account
+ACCOUNT_DISPATCH_WORKERS = 4    # Threads handing a marketwatch row to its accounts in parallel
+ORDER_RETRY_BASE_DELAY = 0.5    # Time (in sec) before the first retry of a failed order, doubled on every retry
+ORDER_RETRY_MAX_DELAY = 8   # Maximum time (in sec) between two retries of a failed order
+ORDER_STATUS_REFRESH_TIME = 2  # Time (in sec) between order book fetches for the status of open orders
+RECORD_TICKS = 0    # Set to 1 to record every tick in TICK_RECORDS_DIR (one file per trading day)
+TICK_RECORDER_FLUSH_TIME = 1    # Time (in sec) between two batch writes of recorded ticks
+FEED_TOKENS_PER_CONNECTION = 500    # Instruments subscribed on one websocket before another connection is opened
+FEED_MAX_CONNECTIONS = 3    # Websocket connections opened at most, the least loaded one takes the overflow. SIMULATOR only, the live feed uses one (one socket session per login)
+MARGIN_REFRESH_TIME = 30   # Time (in sec) for which margins are cached, refreshed earlier after an order fill or cancel
+ACCOUNT_ERROR_RETRY_TIME = 5    # Time (in sec) before margins or profile are fetched again after a failed fetch
+MASTER_CONTRACTS_CACHE = 1  # Load master contracts from the local cache if downloaded on the same day
+FORCE_MASTER_CONTRACTS_REFRESH = 0  # Set to 1 to re-download master contracts even if the cache is fresh
+MASTER_CONTRACTS_DOWNLOAD_WORKERS = 4  # Number of segments downloaded in parallel
+LATENCY_METRICS_WINDOW = 1000   # Latest samples per stage the latency percentiles are computed over
+LATENCY_METRICS_PUBLISH_TIME = 5    # Time (in sec) between two updates of the metrics file and the Metrics sheet
+BAR_TIMEFRAMES = [1, 5, 15]     # Candle sizes (in min) built from the ticks
+BAR_HISTORY_LENGTH = 100    # Candles kept per token and timeframe
+INDICATOR_TIMEFRAME = 1     # Candle size (in min, one of BAR_TIMEFRAMES) the indicators are computed on
+INDICATOR_COLUMNS = ["EMA_9", "EMA_21", "RSI_14", "ATR_14", "VWAP_UPPER_2", "VWAP_LOWER_2"]   # Written next to the marketwatch block, [] to disable. EMA / RSI / ATR_<period>, VWAP_UPPER / VWAP_LOWER_<std devs>
 
 # EXCEL SETTINGS
-MAX_TOKENS_IN_MARKETWATCH = 250
-MARKETWATCH_REFRESH_TIME = 0.1   # Seconds
-ORDER_PLACING_REFRESH_TIME = 3  # Seconds
+MARKETWATCH_SHEETS = [["Marketwatch", 250, 0.1]]   # [Sheet name, rows, refresh time (sec)] of every marketwatch block. Blocks of the same sheet are placed one below the other, rows are numbered across all the blocks
+MAX_TOKENS_IN_MARKETWATCH = sum(x[1] for x in MARKETWATCH_SHEETS)
+MARKETWATCH_REFRESH_TIME = 0.1   # Seconds, block refresh times are rounded up to a multiple of it
+SUBSCRIPTION_DEBOUNCE_TIME = 0.5    # Time (in sec) the marketwatch symbols must stay unchanged before subscriptions are updated
+MARKETWATCH_RANGE_WRITE_CELLS = 40    # Cost of one range write (call overhead) in cells, changed rows are written as ranges while cheaper than the whole block
+MARKETWATCH_FULL_REFRESH_CYCLES = 100   # Whole block is rewritten every these many cycles
+BARS_IN_SHEET = 5   # Candles per marketwatch row shown on the Bars sheet (current one first)
+BARS_REFRESH_TIME = 1   # Time (in sec) between two updates of the Bars sheet
+OPTION_CHAIN_STRIKES = 10   # Strikes shown on each side of the ATM strike on the OptionChain sheet
+OPTION_CHAIN_REFRESH_TIME = 1   # Time (in sec) between two updates of the OptionChain sheet
+OPTION_RISK_FREE_RATE = 0.07    # Annual rate used for implied volatility and greeks
+INSTRUMENTS_PAGE_SIZE = 100     # Rows of the master contracts shown per page on the Instruments sheet
+INSTRUMENTS_REFRESH_TIME = 1    # Time (in sec) between two reads of the Instruments sheet filter
+SYMBOL_SUGGESTIONS = 3  # Trading symbols suggested next to a marketwatch row whose symbol cannot be found
+SYMBOL_MAX_TYPOS = 2    # Edits (insert / delete / replace / swap of two characters) tolerated in suggestions
+
+# HEADLESS SETTINGS
+RUN_MODE = "EXCEL"  # EXCEL for the excel front end, HEADLESS to run without excel (same as python main.py --headless)
+HEADLESS_SOURCE = "FILE"    # FILE to read order rows from HEADLESS_ORDERS_FILE (CSV or JSON), SOCKET for the local socket API
+HEADLESS_SOCKET_HOST = "127.0.0.1"
+HEADLESS_SOCKET_PORT = 8765
+HEADLESS_PUBLISH_TIME = 0.5     # Time (in sec) between two snapshots written to HEADLESS_OUTPUT_FILE
 
 # CREATE DIRECTORIES
-for d in [BROKER_DIR, BROKER_LOGS_FOLDER, EXCEL_DIR, EXCEL_LOGS_FOLDER, MASTER_CONTRACTS_DIR]:
+for d in [BROKER_DIR, BROKER_LOGS_FOLDER, EXCEL_DIR, EXCEL_LOGS_FOLDER, MASTER_CONTRACTS_DIR, TICK_RECORDS_DIR]:
     print(d)
     if not os.path.exists(d):
         print(d)
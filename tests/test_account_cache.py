@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from Broker.account_cache import AccountCache
+
+
+class FakeBroker:
+    """
+    Balance and profile endpoints counting their calls, failing while down is set
+    """
+    def __init__(self):
+        self.down = False
+        self.calls = 0
+
+    def get_balance(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("broker down")
+        return [{"net": self.calls}]
+
+    def get_profile(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("broker down")
+        return {"accountId": "AB1234"}
+
+
+def test_margins_cached_until_ttl_or_invalidate():
+    broker = FakeBroker()
+    cache = AccountCache(broker.get_balance, broker.get_profile, ttl=60, error_ttl=1)
+    assert cache.get_margins() == {"net": 1}
+    assert cache.get_margins() == {"net": 1}
+    cache.invalidate()
+    assert cache.get_margins() == {"net": 2}
+    assert cache.get_account_id() == "AB1234"
+    assert cache.get_account_id() == "AB1234"
+    assert broker.calls == 3
+
+
+def test_failed_fetch_not_retried_before_error_ttl():
+    broker = FakeBroker()
+    broker.down = True
+    cache = AccountCache(broker.get_balance, broker.get_profile, ttl=60, error_ttl=0.2)
+    for i in range(5):
+        with pytest.raises(ConnectionError):
+            cache.get_margins()
+        with pytest.raises(ConnectionError):
+            cache.get_account_id()
+    assert broker.calls == 1    # Only the first read reached the broker
+
+    broker.down = False
+    time.sleep(0.25)
+    assert cache.get_margins() == {"net": 2}
+    assert cache.get_account_id() == "AB1234"
+    assert broker.calls == 3
+
+
+def test_invalidate_does_not_skip_error_backoff():
+    broker = FakeBroker()
+    cache = AccountCache(broker.get_balance, broker.get_profile, ttl=60, error_ttl=60)
+    cache.get_margins()
+    broker.down = True
+    cache.invalidate()
+    with pytest.raises(ConnectionError):
+        cache.get_margins()
+    cache.invalidate()
+    with pytest.raises(ConnectionError):
+        cache.get_margins()
+    assert broker.calls == 2
@@ -0,0 +1,94 @@
+import threading
+
+from Broker.alice_blue import StoplossTargetWaitingQueueElement
+from Broker.bracket_book import BracketBook
+
+
+def make_element(row_id, transaction_type, stoploss, target):
+    return StoplossTargetWaitingQueueElement(row_id, "NSE RELIANCE-EQ", transaction_type, "MIS", None, 1, stoploss, target)
+
+
+def test_buy_exits_below_stoploss_above_target():
+    book = BracketBook()
+    book.add(1, make_element(0, "BUY", 95, 110))
+    book.add(1, make_element(1, "BUY", 90, 105))
+
+    assert book.check(1, 100) == []
+    assert [(x.row_id, reason) for x, reason in book.check(1, 94)] == [(0, "STOPLOSS")]
+    assert [(x.row_id, reason) for x, reason in book.check(1, 106)] == [(1, "TARGET")]
+    assert len(book) == 0
+    assert not book.is_watching(1)
+
+
+def test_sell_exits_above_stoploss_below_target():
+    book = BracketBook()
+    book.add(1, make_element(0, "SELL", 105, 90))
+
+    assert book.check(1, 91) == []
+    assert [(x.row_id, reason) for x, reason in book.check(1, 90)] == [(0, "TARGET")]
+
+
+def test_single_leg_bracket():
+    book = BracketBook()
+    book.add(1, make_element(0, "BUY", None, 110))
+
+    assert book.check(1, 1) == []
+    assert [reason for _, reason in book.check(1, 110)] == ["TARGET"]
+
+
+def test_both_legs_crossed_on_one_tick_fire_once():
+    book = BracketBook()
+    book.add(1, make_element(0, "BUY", 100, 100))     # Stoploss and target at the same price, both crossed by 100
+
+    fired = book.check(1, 100)
+    assert len(fired) == 1
+    assert book.check(1, 100) == []
+    assert len(book) == 0
+
+
+def test_add_replaces_both_legs():
+    book = BracketBook()
+    book.add(1, make_element(0, "BUY", 95, 110))
+    book.add(1, make_element(0, "BUY", 80, 120))
+
+    assert book.check(1, 94) == []
+    assert book.check(1, 111) == []
+    assert [reason for _, reason in book.check(1, 121)] == ["TARGET"]
+
+
+def test_removed_bracket_never_fires():
+    book = BracketBook()
+    element = make_element(0, "BUY", 95, 110)
+    book.add(1, element)
+
+    assert book.remove(0) is element
+    assert book.remove(0) == None
+    assert book.check(1, 50) == []
+    assert book.check(1, 150) == []
+
+
+def test_concurrent_ticks_on_both_legs_fire_every_bracket_once():
+    book = BracketBook()
+    brackets = 2000
+    for row_id in range(brackets):
+        book.add(1, make_element(row_id, "BUY" if row_id % 2 else "SELL", 100 - (row_id % 20) * 0.05, 100 + (row_id % 20) * 0.05))
+
+    fired = []
+    fired_lock = threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def ticks(ltp):     # Half of the threads cross every stoploss, the other half every target
+        barrier.wait()
+        result = book.check(1, ltp)
+        with fired_lock:
+            fired.extend(x.row_id for x, _ in result)
+
+    threads = [threading.Thread(target=ticks, args=(90 if i % 2 else 110,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(fired) == list(range(brackets))
+    assert len(book) == 0
+    assert not book.is_watching(1)
@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+
+import settings
+from ExcelManager.diff_writer import DiffWriter
+
+
+class FakeSheet:
+    """
+    Sheet recording every range write, cells kept in a 1 based grid
+    """
+    def __init__(self, rows=300, columns=30):
+        self.cells = np.full((rows + 1, columns + 1), np.nan)
+        self.writes = []
+
+    def range(self, top_left, bottom_right):
+        sheet = self
+
+        class Range:
+            @property
+            def value(self):
+                return sheet.cells[top_left[0]:bottom_right[0] + 1, top_left[1]:bottom_right[1] + 1]
+
+            @value.setter
+            def value(self, values):
+                sheet.writes.append((top_left, bottom_right))
+                sheet.cells[top_left[0]:bottom_right[0] + 1, top_left[1]:bottom_right[1] + 1] = values
+
+        return Range()
+
+
+@pytest.fixture(autouse=True)
+def write_settings(monkeypatch):
+    monkeypatch.setattr(settings, "MARKETWATCH_RANGE_WRITE_CELLS", 40)
+    monkeypatch.setattr(settings, "MARKETWATCH_FULL_REFRESH_CYCLES", 1000)
+
+
+def make_writer(rows=250, columns=16):
+    sheet = FakeSheet()
+    writer = DiffWriter(sheet, top_row=2, left_column=3)
+    values = np.arange(rows * columns, dtype=np.float64).reshape(rows, columns)
+    writer.write(values)
+    return sheet, writer, values
+
+
+def assert_sheet_matches(sheet, values):
+    np.testing.assert_array_equal(sheet.cells[2:2 + values.shape[0], 3:3 + values.shape[1]], values)
+
+
+def test_first_write_is_full():
+    sheet, writer, values = make_writer()
+    assert sheet.writes == [((2, 3), (251, 18))]
+    assert writer.last_cells_written == values.size
+    assert_sheet_matches(sheet, values)
+
+
+def test_unchanged_values_not_written():
+    sheet, writer, values = make_writer()
+    sheet.writes.clear()
+    values[5, 5] = np.nan
+    writer.write(values)
+    sheet.writes.clear()
+
+    assert writer.write(values.copy()) == 0     # NaN equal to NaN
+    assert sheet.writes == []
+
+
+def test_single_change_writes_one_cell():
+    sheet, writer, values = make_writer()
+    sheet.writes.clear()
+    values[10, 4] = -1
+
+    assert writer.write(values) == 1
+    assert sheet.writes == [((12, 7), (12, 7))]
+    assert_sheet_matches(sheet, values)
+
+
+def test_nearby_rows_merged_far_rows_split():
+    sheet, writer, values = make_writer(columns=16)   # 40 // 16 : rows up to 2 unchanged rows apart are merged
+    sheet.writes.clear()
+    values[10, 1] = -1
+    values[13, 2] = -1
+    values[100, 1] = -1
+    values[200, 1] = -1
+
+    writer.write(values)
+    assert sheet.writes == [((12, 4), (15, 5)), ((102, 4), (102, 4)), ((202, 4), (202, 4))]
+    assert_sheet_matches(sheet, values)
+
+
+def test_get_changed_runs_union_of_columns():
+    writer = DiffWriter(FakeSheet(), 1, 1)
+    changed = np.zeros((10, 5), dtype=bool)
+    changed[2, 1] = changed[3, 4] = changed[8, 0] = True
+
+    assert writer.get_changed_runs(changed) == [(2, 3, 1, 4), (8, 8, 0, 0)]
+    assert writer.get_changed_runs(changed, max_gap=4) == [(2, 8, 0, 4)]
+    assert writer.get_changed_runs(np.zeros((10, 5), dtype=bool)) == []
+
+
+def test_scattered_changes_written_as_runs():
+    sheet, writer, values = make_writer(columns=16)
+    sheet.writes.clear()
+    values[::4, 0] += 1     # 63 runs of one cell, 63 * 41 cells cheaper than the 4000 + 40 of the block
+
+    assert writer.write(values) == 63
+    assert len(sheet.writes) == 63
+    assert writer.fallback_writes == 0
+    assert_sheet_matches(sheet, values)
+
+
+def test_changes_over_whole_block_fall_back_to_full_write():
+    sheet, writer, values = make_writer(columns=16)
+    sheet.writes.clear()
+    values[:, ::3] += 1  # One run over every row and column
+
+    assert writer.write(values) == values.size
+    assert sheet.writes == [((2, 3), (251, 18))]
+    assert writer.fallback_writes == 1
+    assert_sheet_matches(sheet, values)
+
+
+def test_shape_change_and_refresh_cycle_write_full(monkeypatch):
+    sheet, writer, values = make_writer(rows=20)
+    monkeypatch.setattr(settings, "MARKETWATCH_FULL_REFRESH_CYCLES", 3)
+    sheet.writes.clear()
+
+    assert writer.write(values) == 0    # Cycle 2
+    assert writer.write(values) == values.size  # Cycle 3 repaints the block
+    grown = np.vstack([values, values[:1]])
+    assert writer.write(grown) == grown.size
+    assert writer.fallback_writes == 0
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from Broker.bar_engine import BarEngine
+from Broker.indicator_engine import IndicatorEngine, parse_column, VWAP_COLUMN
+from Broker.tick_store import TICK_MESSAGE_KEYS, LTP_COLUMN
+
+COLUMNS = ["EMA_5", "RSI_14", "ATR_14", "VWAP_UPPER_2", "VWAP_LOWER_2"]
+DAY_START = 1700006400 - time.localtime(1700006400).tm_gmtoff + 10 * 3600   # 10:00 local time
+
+
+def make_candles(count):
+    """
+    Returns (open, close, volume) of count one minute candles
+    """
+    rng = np.random.default_rng(7)
+    closes = 100 + np.cumsum(rng.normal(0, 1, count))
+    opens = closes + rng.normal(0, 0.5, count)
+    volumes = rng.integers(100, 1000, count).astype(float)
+    return opens, closes, volumes
+
+
+def feed(engine, indicators, opens, closes, volumes):
+    """
+    Ticks every candle at its open then its close, advancing the indicators once per candle
+    """
+    day_volume = 0.0
+    for minute, (open_price, close, volume) in enumerate(zip(opens, closes, volumes)):
+        timestamp = DAY_START + 60 * minute
+        engine.update(2885, open_price, day_volume, timestamp)
+        day_volume += volume
+        engine.update(2885, close, day_volume, timestamp + 30)
+        indicators.update()
+
+
+def get_live_values(indicators, ltp):
+    ticker_values = np.zeros((2, len(TICK_MESSAGE_KEYS)))
+    ticker_values[0, LTP_COLUMN] = ltp
+    return indicators.get_values([2885, None], ticker_values)
+
+
+def test_parse_column():
+    assert parse_column("ema_20") == ("EMA", 20.0)
+    assert parse_column("VWAP_UPPER_1.5") == ("VWAP_UPPER", 1.5)
+    with pytest.raises(ValueError):
+        parse_column("MACD_12")
+
+
+def test_indicators_match_reference():
+    engine = BarEngine([1], 50, 4)
+    indicators = IndicatorEngine(engine, 1, COLUMNS)
+    opens, closes, volumes = make_candles(40)
+    feed(engine, indicators, opens, closes, volumes)
+    values = get_live_values(indicators, closes[-1])
+
+    highs, lows = np.maximum(opens, closes), np.minimum(opens, closes)
+    ema = closes[0]
+    avg_gain = avg_loss = atr = None
+    for i in range(len(closes)):    # Last candle is the live one
+        prev_close = closes[i - 1] if i else closes[0]
+        change = closes[i] - prev_close
+        true_range = max(highs[i] - lows[i], abs(highs[i] - prev_close), abs(lows[i] - prev_close))
+        if i:
+            ema += 2 / 6 * (closes[i] - ema)
+        if avg_gain == None:
+            avg_gain, avg_loss, atr = max(change, 0), max(-change, 0), true_range
+        else:
+            avg_gain = (avg_gain * 13 + max(change, 0)) / 14
+            avg_loss = (avg_loss * 13 + max(-change, 0)) / 14
+            atr = (atr * 13 + true_range) / 14
+    typical = ((highs + lows + closes) / 3)[:-1]
+    weights = volumes[:-1]
+    vwap = np.sum(typical * weights) / np.sum(weights)
+    deviation = np.sqrt(np.sum(weights * typical ** 2) / np.sum(weights) - vwap ** 2)
+
+    expected = [ema, 100 * avg_gain / (avg_gain + avg_loss), atr, vwap + 2 * deviation, vwap - 2 * deviation]
+    assert values[0] == pytest.approx(np.round(expected, 2), abs=0.011)
+    assert np.isnan(values[1]).all()    # Row of no instrument
+
+
+def test_feed_vwap_used_for_bands():
+    engine = BarEngine([1], 50, 4)
+    indicators = IndicatorEngine(engine, 1, COLUMNS)
+    feed(engine, indicators, *make_candles(10))
+
+    ticker_values = np.zeros((1, len(TICK_MESSAGE_KEYS)))
+    ticker_values[0, LTP_COLUMN] = 100
+    ticker_values[0, VWAP_COLUMN] = 250
+    upper, lower = indicators.get_values([2885], ticker_values)[0, 3:]
+    assert upper - 250 == pytest.approx(250 - lower, abs=0.011)
+    assert upper > 250
+
+
+def test_not_ticked_token_is_nan():
+    engine = BarEngine([1], 50, 4)
+    indicators = IndicatorEngine(engine, 1, COLUMNS)
+    values = get_live_values(indicators, 0)
+    assert np.isnan(values).all()
+
+
+def test_state_grows_with_bar_engine():
+    engine = BarEngine([1], 10, 1)
+    indicators = IndicatorEngine(engine, 1, ["EMA_3"])
+    for token in range(20):
+        engine.update(token, 100 + token, None, DAY_START)
+        engine.update(token, 101 + token, None, DAY_START + 60)
+    indicators.update()
+
+    ticker_values = np.zeros((20, len(TICK_MESSAGE_KEYS)))
+    ticker_values[:, LTP_COLUMN] = 101 + np.arange(20)
+    values = indicators.get_values(list(range(20)), ticker_values)
+    np.testing.assert_allclose(values[:, 0], np.round(100 + np.arange(20) + 0.5, 2))
+
+
+def test_get_values_while_state_grows():
+    engine = BarEngine([1], 10, 1)
+    indicators = IndicatorEngine(engine, 1, COLUMNS)
+    errors = []
+    done = threading.Event()
+
+    def ticks():    # New tokens keep regrowing the bar engine and the indicator state
+        for token in range(2000):
+            engine.update(token, 100.0, None, DAY_START)
+            engine.update(token, 101.0, None, DAY_START + 60)
+            if token % 50 == 0:
+                indicators.update()
+        done.set()
+
+    def reads():
+        ticker_values = np.zeros((50, len(TICK_MESSAGE_KEYS)))
+        ticker_values[:, LTP_COLUMN] = 101
+        while not done.is_set():
+            try:
+                tokens = list(range(max(0, engine.next_slot - 60), max(50, engine.next_slot - 10)))[:50]
+                assert indicators.get_values(tokens, ticker_values[:len(tokens)]).shape == (len(tokens), len(COLUMNS))
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=ticks), threading.Thread(target=reads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,36 @@
+import pandas as pd
+
+from Broker.instrument_search import InstrumentSearch
+
+
+def make_search():
+    instruments = pd.DataFrame({
+        'Exch': ["NSE", "NSE", "NFO", "NFO", "NSE"],
+        'Trading Symbol': ["RELIANCE-EQ", "TCS-EQ", "RELIANCE24OCTFUT", "RELIANCE24OCT2500CE", "INFY-EQ"],
+        'Instrument Name': ["RELIANCE", "TCS", "RELIANCE", "RELIANCE", "INFY"],
+        'Expiry Date': [None, None, "2024-10-31", "2024-10-31", None],
+    })
+    return InstrumentSearch(instruments, max_typos=2)
+
+
+def test_prefix_suggestions():
+    search = make_search()
+    assert search.suggest("reliance2", limit=2) == ["RELIANCE24OCT2500CE", "RELIANCE24OCTFUT"]
+    assert search.suggest("reliance2") == ["RELIANCE24OCT2500CE", "RELIANCE24OCTFUT", "RELIANCE-EQ"]     # Then close names
+    assert search.suggest("INF") == ["INFY-EQ"]
+
+
+def test_typo_in_trading_symbol():
+    assert make_search().suggest("RELIANCE-QE") == ["RELIANCE-EQ"]
+
+
+def test_typo_in_instrument_name_suggests_its_trading_symbol():
+    search = make_search()
+    assert search.suggest("RELAINCE") == ["RELIANCE-EQ"]
+    assert search.suggest("TSC") == ["TCS-EQ"]
+
+
+def test_nothing_close():
+    search = make_search()
+    assert search.suggest("XYZXYZ") == []
+    assert search.suggest("  ") == []
@@ -0,0 +1,116 @@
+import logging
+import threading
+from time import monotonic
+
+import pytest
+
+from Broker.order_dispatcher import OrderDispatcher
+
+logger = logging.getLogger("test_order_dispatcher")
+
+
+def make_dispatcher(send_order, workers=2, max_retries=3, base_delay=0.05, max_delay=1):
+    dispatcher = OrderDispatcher(send_order, logger, workers, max_retries, base_delay, max_delay)
+    dispatcher.start()
+    return dispatcher
+
+
+def test_retry_delay_doubles_up_to_max():
+    dispatcher = OrderDispatcher(None, logger, 1, 10, 0.5, 3)
+    assert [dispatcher.get_retry_delay(x) for x in range(1, 6)] == [0.5, 1, 2, 3, 3]
+
+
+def test_future_resolves_to_order_id():
+    dispatcher = make_dispatcher(lambda **order: f"{order['symbol']}-1")
+    future = dispatcher.submit(symbol="RELIANCE")
+    assert future.result(timeout=5) == "RELIANCE-1"
+    assert future.order == {"symbol": "RELIANCE"}
+
+
+def test_failed_attempts_retried_with_backoff():
+    attempts = []
+
+    def send_order(**order):
+        attempts.append(monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("broker down")
+        return "42"
+
+    dispatcher = make_dispatcher(send_order, max_retries=3, base_delay=0.1)
+    assert dispatcher.submit(symbol="RELIANCE").result(timeout=5) == "42"
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.1
+    assert attempts[2] - attempts[1] >= 0.2
+
+
+def test_future_fails_after_max_retries():
+    attempts = []
+
+    def send_order(**order):
+        attempts.append(order)
+        raise ValueError(f"rejected {len(attempts)}")
+
+    dispatcher = make_dispatcher(send_order, max_retries=3, base_delay=0.01)
+    future = dispatcher.submit(symbol="RELIANCE")
+    with pytest.raises(ValueError, match="rejected 3"):
+        future.result(timeout=5)
+    assert len(attempts) == 3
+
+
+def test_backoff_does_not_block_other_orders():
+    def send_order(**order):
+        if order['symbol'] == "FAILING":
+            raise ConnectionError("broker down")
+        return order['symbol']
+
+    dispatcher = make_dispatcher(send_order, workers=1, max_retries=2, base_delay=1)
+    failing = dispatcher.submit(symbol="FAILING")
+    start = monotonic()
+    assert dispatcher.submit(symbol="RELIANCE").result(timeout=5) == "RELIANCE"
+    assert monotonic() - start < 0.5    # The single worker is not sleeping through the retry delay
+    with pytest.raises(ConnectionError):
+        failing.result(timeout=5)
+
+
+def test_cancelled_order_not_sent():
+    sent = []
+    dispatcher = OrderDispatcher(lambda **order: sent.append(order), logger, 1, 1, 0.01, 0.01)
+    future = dispatcher.submit(symbol="RELIANCE")
+    assert future.cancel()
+    dispatcher.start()
+    assert dispatcher.submit(symbol="TCS").result(timeout=5) == None
+    assert sent == [{"symbol": "TCS"}]
+
+
+def test_concurrent_submissions_all_resolve():
+    dispatcher = make_dispatcher(lambda **order: order['row_id'], workers=4)
+    futures = []
+    futures_lock = threading.Lock()
+
+    def submit(rows):
+        for row_id in rows:
+            future = dispatcher.submit(row_id=row_id)
+            with futures_lock:
+                futures.append(future)
+
+    threads = [threading.Thread(target=submit, args=(range(i, 400, 4),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(x.result(timeout=5) for x in futures) == list(range(400))
+
+
+def test_request_with_own_send_function_retried():
+    attempts = []
+
+    def send_cancel(order_id):
+        attempts.append(order_id)
+        if len(attempts) < 2:
+            raise ConnectionError("broker down")
+        return order_id
+
+    dispatcher = make_dispatcher(lambda **order: "placed", base_delay=0.01)
+    assert dispatcher.submit(send=send_cancel, order_id="7").result(timeout=5) == "7"
+    assert dispatcher.submit(order_id="8").result(timeout=5) == "placed"
+    assert attempts == ["7", "7"]
@@ -0,0 +1,68 @@
+from Broker.order_status_cache import OrderStatusCache
+
+
+class FakeOrderBook:
+    """
+    Order book returning the given entries, counting the calls
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.entries
+
+
+def test_refresh_updates_all_open_orders_in_one_fetch():
+    cache = OrderStatusCache()
+    order_book = FakeOrderBook([
+        {"Nstordno": "1", "Status": "open"},
+        {"Nstordno": "2", "Status": "complete"},
+        {"Nstordno": "3", "Status": "rejected", "RejReason": "margin"},
+    ])
+
+    finished = cache.refresh(["1", "2", "3"], order_book)
+    assert order_book.calls == 1
+    assert finished == [("2", "complete"), ("3", "rejected")]
+    assert cache.get("1") == "open"
+    assert cache.get("2") == "complete"
+    assert cache.get("3") == "Rejected due to - margin"
+
+
+def test_terminal_orders_not_polled_again():
+    cache = OrderStatusCache()
+    cache.refresh(["1", "2"], FakeOrderBook([{"Nstordno": "1", "Status": "open"}, {"Nstordno": "2", "Status": "cancelled"}]))
+
+    assert cache.get_open_orders(["1", "2"]) == ["1"]
+    order_book = FakeOrderBook([{"Nstordno": "1", "Status": "complete"}, {"Nstordno": "2", "Status": "open"}])
+    assert cache.refresh(["1", "2"], order_book) == [("1", "complete")]
+    assert cache.get("2") == "cancelled"
+
+    order_book = FakeOrderBook([])
+    assert cache.refresh(["1", "2"], order_book) == []
+    assert order_book.calls == 0    # Nothing left to poll, order book not fetched
+
+
+def test_untracked_order_ids_not_polled():
+    cache = OrderStatusCache()
+    order_book = FakeOrderBook([])
+    assert cache.refresh(["PAPER TRADE", "", None, -1], order_book) == []
+    assert order_book.calls == 0
+    assert cache.get("PAPER TRADE") == ""
+
+
+def test_integer_order_ids_matched_to_order_book():
+    cache = OrderStatusCache()
+    assert cache.refresh([7], FakeOrderBook([{"Nstordno": 7, "Status": "complete"}])) == [(7, "complete")]
+    assert cache.get(7) == "complete"
+
+
+def test_order_book_error_keeps_statuses():
+    cache = OrderStatusCache()
+    cache.refresh(["1"], FakeOrderBook([{"Nstordno": "1", "Status": "open"}]))
+
+    assert cache.refresh(["1"], FakeOrderBook({"stat": "Not_Ok", "Emsg": "No Data"})) == []
+    assert cache.refresh(["1"], FakeOrderBook([{"Nstordno": "1"}, "bad entry"])) == []
+    assert cache.get("1") == "open"
+    assert cache.get("unknown") == ""
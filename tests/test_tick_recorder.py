@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+from datetime import date
+
+import numpy as np
+
+from Broker.tick_recorder import TickRecorder, TickReader, get_record_file, LEGACY_TICK_RECORD_DTYPE
+
+
+def test_round_trip(tmp_path):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    recorder.record("2885", "dk", {"t": "dk", "tk": "2885", "lp": "2450.5", "v": "1200", "o": "2440", "oi": 0})
+    recorder.record("2885", "df", {"t": "df", "tk": "2885", "lp": "2451", "bp1": "2450.95"})
+    recorder.record("11536", "df", {"t": "df", "tk": "11536", "lp": "3510.05"})
+    recorder.flush()
+
+    path = get_record_file(str(tmp_path), date.today())
+    reader = TickReader(path)
+    assert len(reader) == 3 and recorder.recorded_count == 3
+
+    replayed = []
+    assert reader.replay(lambda message: replayed.append(json.loads(message)), speed=0) == 3
+    assert replayed == [
+        {"t": "dk", "tk": "2885", "o": 2440.0, "lp": 2450.5, "v": 1200.0, "oi": 0.0},
+        {"t": "df", "tk": "2885", "lp": 2451.0, "bp1": 2450.95},
+        {"t": "df", "tk": "11536", "lp": 3510.05},
+    ]
+
+
+def test_bad_token_and_values_skipped(tmp_path):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    recorder.record(None, "df", {"lp": "1"})
+    recorder.record("2885", "df", {"lp": "", "v": "10"})
+    recorder.flush()
+
+    replayed = []
+    TickReader(get_record_file(str(tmp_path), date.today())).replay(lambda message: replayed.append(json.loads(message)), speed=0)
+    assert replayed == [{"t": "df", "tk": "2885", "v": 10.0}]
+
+
+def test_flushes_append_to_the_day_file(tmp_path):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    for i in range(3):
+        recorder.record("2885", "df", {"lp": str(100 + i)})
+        recorder.flush()
+    recorder.flush()    # Nothing buffered, nothing written
+
+    reader = TickReader(get_record_file(str(tmp_path), date.today()))
+    assert [float(x['values'][4]) for x in reader.records] == [100, 101, 102]
+
+
+def test_concurrent_record_and_flush_lose_no_tick(tmp_path):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    ticks_per_thread = 5000
+    done = threading.Event()
+
+    def feed(token):
+        for i in range(ticks_per_thread):
+            recorder.record(token, "df", {"lp": str(i)})
+
+    def flush():
+        while not done.is_set():
+            recorder.flush()
+
+    flushers = [threading.Thread(target=flush) for i in range(2)]
+    feeders = [threading.Thread(target=feed, args=(str(token),)) for token in range(4)]
+    for thread in flushers + feeders:
+        thread.start()
+    for thread in feeders:
+        thread.join()
+    done.set()
+    for thread in flushers:
+        thread.join()
+    recorder.flush()
+
+    reader = TickReader(get_record_file(str(tmp_path), date.today()))
+    assert len(reader) == recorder.recorded_count == 4 * ticks_per_thread
+
+
+def test_empty_file_replays_nothing(tmp_path):
+    path = tmp_path / "ticks_empty.bin"
+    path.write_bytes(b"")
+    assert TickReader(str(path)).replay(lambda message: None) == 0
+
+
+def test_feed_time_replayed(tmp_path):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    recorder.record("2885", "df", {"lp": "2451", "ft": "1718000000"})
+    recorder.record("2885", "df", {"lp": "2452", "ft": "not a time"})
+    recorder.flush()
+
+    replayed = []
+    TickReader(get_record_file(str(tmp_path), date.today())).replay(lambda message: replayed.append(json.loads(message)), speed=0)
+    assert replayed == [{"t": "df", "tk": "2885", "lp": 2451.0, "ft": "1718000000"}, {"t": "df", "tk": "2885", "lp": 2452.0}]
+
+
+def test_partial_last_record_dropped(tmp_path, caplog):
+    recorder = TickRecorder(str(tmp_path), flush_time=1)
+    for i in range(3):
+        recorder.record("2885", "df", {"lp": str(100 + i)})
+    recorder.flush()
+    path = get_record_file(str(tmp_path), date.today())
+    os.truncate(path, os.path.getsize(path) - 5)    # Process killed in the middle of a write
+
+    with caplog.at_level(logging.WARNING):
+        reader = TickReader(path, logging.getLogger("test_tick_recorder"))
+    assert len(reader) == 2
+    assert reader.truncated_bytes == reader.records.dtype.itemsize - 5
+    assert "partial record" in caplog.text
+    assert reader.replay(lambda message: None) == 2
+
+
+def test_legacy_file_read_and_not_appended(tmp_path):
+    legacy = np.zeros(2, dtype=LEGACY_TICK_RECORD_DTYPE)
+    legacy['token'] = 2885
+    legacy['type'] = 1
+    legacy['mask'] = 1 << 4
+    legacy['values'][:, 4] = [100, 101]
+    path = get_record_file(str(tmp_path), date.today())
+    with open(path, 'wb') as file:
+        file.write(legacy.tobytes())
+
+    replayed = []
+    TickReader(path).replay(lambda message: replayed.append(json.loads(message)), speed=0)
+    assert replayed == [{"t": "df", "tk": "2885", "lp": 100.0}, {"t": "df", "tk": "2885", "lp": 101.0}]
+
+    recorder = TickRecorder(str(tmp_path), flush_time=1)     # Same day recorded again after an upgrade
+    recorder.record("2885", "df", {"lp": "102", "ft": "1718000000"})
+    recorder.flush()
+    assert os.path.getsize(path) == legacy.nbytes
+    reader = TickReader(path[:-len(".bin")] + "_ft.bin")
+    assert len(reader) == 1 and reader.records[0]['feed_time'] == 1718000000
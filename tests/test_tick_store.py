@@ -0,0 +1,97 @@
+import threading
+
+import numpy as np
+
+import Broker.tick_store as tick_store
+from Broker.tick_store import TickStore, LTP_COLUMN, RESERVED_SLOTS
+
+
+def test_update_and_read():
+    store = TickStore(4)
+    store.update("2885", {"t": "df", "lp": "2450.5", "v": "10", "bad": "x", "ap": ""})
+    assert store.get_ltp("2885") == 2450.5
+    assert store.get_values("2885")[5] == 10
+    assert store.get_ltp("11536") == None
+    block = store.get_block([None, "2885", "11536"])
+    assert np.isnan(block[0]).all()
+    assert block[1, LTP_COLUMN] == 2450.5
+    assert (block[2] == 0).all()    # Not ticked yet
+
+
+def test_released_slot_reused_after_delay(monkeypatch):
+    store = TickStore(4)
+    store.get_slot("1")
+    slot = store.get_slot("2")
+    store.update("2", {"lp": "100"})
+    store.release(["2", "unknown"])
+    assert store.get_ltp("2") == None
+
+    store.update("2", {"lp": "101"})    # Late tick of the released token dropped
+    assert "2" not in store.slots
+    assert store.get_slot("3") != slot  # Still within the reuse delay
+
+    monkeypatch.setattr(tick_store, "SLOT_REUSE_DELAY", 0)
+    assert store.get_slot("4") == slot
+    assert (store.values[slot] == 0).all()
+    assert store.next_slot == RESERVED_SLOTS + 3
+
+
+def test_resubscribed_token_ticks_again():
+    store = TickStore(4)
+    store.update("2", {"lp": "100"})
+    store.release(["2"])
+    store.get_slot("2")
+    store.update("2", {"lp": "102"})
+    assert store.get_ltp("2") == 102
+
+
+def test_subscription_churn_does_not_grow_table(monkeypatch):
+    monkeypatch.setattr(tick_store, "SLOT_REUSE_DELAY", 0)
+    store = TickStore(10)
+    for cycle in range(100):
+        tokens = [str(cycle * 10 + i) for i in range(10)]
+        for token in tokens:
+            store.get_slot(token)
+            store.update(token, {"lp": "1"})
+        store.release(tokens)
+    assert len(store.values) == RESERVED_SLOTS + 10
+
+
+def test_concurrent_writes_kept_across_grows():
+    store = TickStore(1)    # Grown many times while the writers run
+    writers, tokens_per_writer, rounds = 4, 200, 5
+    barrier = threading.Barrier(writers)
+
+    def write(writer):
+        barrier.wait()
+        for i in range(rounds):
+            for token in range(tokens_per_writer):
+                store.update(f"{writer}-{token}", {"lp": str(i + 1), "v": str(token)})
+
+    threads = [threading.Thread(target=write, args=(x,)) for x in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for writer in range(writers):
+        for token in range(tokens_per_writer):
+            values = store.get_values(f"{writer}-{token}")
+            assert values[LTP_COLUMN] == rounds and values[5] == token
+
+
+def test_write_racing_a_grow_is_redone():
+    store = TickStore(1)
+    store.update("1", {"lp": "1"})  # Table full, the next new token grows it
+    grown = []
+
+    class GrowOnWrite(np.ndarray):
+        def __setitem__(self, key, value):
+            if not grown:   # Another feed thread grows the table between the read of values and the write
+                grown.append(True)
+                store.get_slot("2")
+            super().__setitem__(key, value)
+
+    store.values = store.values.view(GrowOnWrite)
+    store.update("1", {"lp": "5"})
+    assert grown and store.get_ltp("1") == 5
@@ -0,0 +1,88 @@
+import threading
+
+from Broker.alice_blue import AboveBelowWaitingQueueElement
+from Broker.trigger_book import TriggerBook
+
+
+def make_element(row_id, below_or_above, future_price):
+    return AboveBelowWaitingQueueElement(row_id, "NSE RELIANCE-EQ", "BUY", "MIS", None, 1, None, None, below_or_above, future_price)
+
+
+def test_above_fires_at_and_over_level():
+    book = TriggerBook()
+    book.add(1, make_element(0, "ABOVE", 100))
+    book.add(1, make_element(1, "ABOVE", 105))
+
+    assert book.check(1, 99.95) == []
+    assert [x.row_id for x in book.check(1, 100)] == [0]
+    assert [x.row_id for x in book.check(1, 110)] == [1]
+    assert len(book) == 0
+    assert not book.is_watching(1)
+
+
+def test_below_fires_at_and_under_level():
+    book = TriggerBook()
+    book.add(1, make_element(0, "BELOW", 100))
+    book.add(1, make_element(1, "BELOW", 95))
+
+    assert book.check(1, 100.05) == []
+    assert [x.row_id for x in book.check(1, 90)] == [0, 1]
+    assert len(book) == 0
+
+
+def test_only_the_ticked_token_is_checked():
+    book = TriggerBook()
+    book.add(1, make_element(0, "ABOVE", 100))
+    book.add(2, make_element(1, "ABOVE", 100))
+
+    assert [x.row_id for x in book.check(2, 101)] == [1]
+    assert book.is_watching(1)
+    assert not book.is_watching(2)
+
+
+def test_add_replaces_row():
+    book = TriggerBook()
+    book.add(1, make_element(0, "ABOVE", 100))
+    book.add(1, make_element(0, "BELOW", 90))
+
+    assert len(book) == 1
+    assert book.check(1, 101) == []
+    assert book.get(0).below_or_above == "BELOW"
+
+
+def test_removed_element_never_fires():
+    book = TriggerBook()
+    element = make_element(0, "ABOVE", 100)
+    book.add(1, element)
+
+    assert book.remove(0) is element
+    assert book.remove(0) == None
+    assert book.check(1, 200) == []
+
+
+def test_concurrent_checks_fire_every_element_once():
+    book = TriggerBook()
+    elements = 2000
+    for row_id in range(elements):
+        book.add(1, make_element(row_id, "ABOVE" if row_id % 2 else "BELOW", 100 + (row_id % 50) * 0.05 * (1 if row_id % 2 else -1)))
+
+    fired = []
+    fired_lock = threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def ticks(ltps):
+        barrier.wait()
+        for ltp in ltps:
+            result = book.check(1, ltp)
+            with fired_lock:
+                fired.extend(x.row_id for x in result)
+
+    ltps = [100 + ((i * 7) % 61 - 30) * 0.1 for i in range(500)]
+    threads = [threading.Thread(target=ticks, args=(ltps[i::8],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(fired) == list(range(elements))
+    assert len(book) == 0